@@ -1,39 +1,43 @@
+import time
+STARTED = time.perf_counter() # When the program started, for the startup time
+
 from graphics import *
+import engine
+import levels
+import metrics
+import os
 import physics
+import placement
+import random
+import replay
 import shapeGen
+import sys
+
+IMPORTED = time.perf_counter() # When everything was imported
 
 # Below are some constants that are globabaly visible to make the code simpler
 # Note that in Python, a tuple is a list that cannot be modified
 
-# Tuple of the description text for each menu option
-MENU_STRINGS = (
-                "Number of targets",
-                "Number of obstacles",
-                "Ammo",
-                "Ticks per second",
-                "Force multiplier",
-                "Surface friction",
-                "Projectile elasticity",
-                "Gravity",
-                "Min obstacle width",
-                "Max obstacle width",
-                "Min obstacle length",
-                "Max obstacle length")
-
-# Tuple of default values for each menu option
-MENU_DEFAULTS = (
-                 "3", "10", "10",
-                 "90", "10", "0.15", "0.5", "9.8",
-                 "10", "30", "70", "300")
+# The menu's options, their description text and default values
+from menuOptions import MENU_DEFAULTS, MENU_STRINGS
 
 # Number of columns in the menu (must be even)
 MENU_COLUMN_NUMBER = 4
 
+# Seconds from the program starting to the menu first being on screen, once
+# it has been
+startupTime = None
+
 
 
 # Program entry point, opens window and displays options menu
 def main(width, height):
 
+    # Record game loop metrics if ANGRYPYTHONS_METRICS names a file
+    metrics.enableFromEnvironment()
+    # Record games for replaying if ANGRYPYTHONS_RECORDINGS names a directory
+    replay.enableFromEnvironment()
+
     win = GraphWin("PyBirds", width, height, autoflush=False)
     menuInputs = intialiseMenuInputs()
     while True:
@@ -49,6 +53,7 @@ def play(win, options):
     ammo = options[2]
     physicsConstants = options[3:8]
     obstacleDimensionRanges = options[8:12]
+    projectiles = max(int(options[12]), 1)
 
     # Coordinate of top of catapult
     topOfCatapult = Point(win.getWidth() / 10, win.getHeight() * 4 / 5)
@@ -60,13 +65,36 @@ def play(win, options):
     ammoDisplay = Text(Point(100, 10), ammo)
     ammoDisplay.draw(win)
 
-    # Generate level
-    obstacles = shapeGen.genRandomObstacles(win, obstacleNumber, obstacleDimensionRanges)
-    targets = shapeGen.genRandomTargets(win, targetNumber, obstacles)
+    # Generate level, going back to the menu if it can't fit everything in
+    # The seed is kept so the level can be made again (e.g. from a recording)
+    seed = random.randrange(2 ** 32)
+    rng = random.Random(seed)
+    obstacles = []
+    try:
+        obstacles = shapeGen.genRandomObstacles(win, obstacleNumber,
+                                                obstacleDimensionRanges, rng)
+        targets = shapeGen.genRandomTargets(win, targetNumber, obstacles, rng)
+    except placement.PlacementError:
+        with win.batch():
+            undrawAll(obstacles)
+        showMessage(win, "Level too crowded", "red", "orange")
+        return
     # Uncomment below for hard-coded level layout
     #obstacles = shapeGen.setObstacles(win)
     #targets = shapeGen.setTargets(win)
 
+    # The level, with the shapes just drawn hanging off it
+    world = physics.worldFromShapes(win, obstacles, targets)
+
+    # Record the game if recording is on (see replay.py)
+    recording = replay.startRecording(levels.levelFromWorld(world, seed),
+                                      physicsConstants,
+                                      (topOfCatapult.getX(), topOfCatapult.getY()),
+                                      projectiles)
+
+    # Show where a shot would go while the mouse is over the firing area
+    preview = physics.TrajectoryPreview(win, world, topOfCatapult, physicsConstants)
+
     won = False
     lost = False
 
@@ -74,10 +102,15 @@ def play(win, options):
     while not won and not lost:
 
         # Listen for user interaction
+        win.setMotionHandler(preview.onMotion)
         clickPos = getUserInput(win)
+        clickTime = time.monotonic()
+        win.setMotionHandler(None)
+        preview.hide()
 
         # Check if user clicked the menu button
         if mouseOverrectangle(clickPos, menuButton):
+            preview.undraw()
             return # End game and return to menu
 
         # Update ammo
@@ -85,10 +118,17 @@ def play(win, options):
         ammoDisplay.setText(ammo)
 
         drawCrosshair(win,clickPos)
-        physics.simulateProjectile(win, topOfCatapult, clickPos, obstacles, targets, physicsConstants)
+        # Fire a burst of projectiles, fanned out around the click
+        launches = engine.burstClicks(topOfCatapult.getX(), topOfCatapult.getY(),
+                                      clickPos.getX(), clickPos.getY(), projectiles)
+        results = physics.simulateProjectiles(win, topOfCatapult,
+                                              [Point(x, y) for x, y in launches],
+                                              world, physicsConstants)
+        if recording:
+            recording.addShot(clickPos.getX(), clickPos.getY(), results, clickTime)
 
         # win when no targets are left
-        won = len(targets) == 0
+        won = len(world.targets) == 0
         # lose when ammo runs out
         lost = ammo == 0
 
@@ -98,8 +138,9 @@ def play(win, options):
         showMessage(win, "Out of ammo", "red", "orange")
 
     # Clean up these objects, then return to the menu
-    undrawAll(targets)
-    undrawAll(obstacles)
+    with win.batch():
+        undrawAll(world.sprites())
+        preview.undraw()
     return
 
 
@@ -138,6 +179,10 @@ def menu(win, menuInputs):
     # Draw the labels for each menu option
     drawMenuItemLabels(win)
 
+    # The first menu drawn is the game's first frame
+    if startupTime is None:
+        recordStartup(win)
+
     # Listen for click of Play or Defaults button by checking the mouse position
     # each time the user clicks until it's within one of the buttons
     clickPos = win.getMouse()
@@ -173,6 +218,21 @@ def menu(win, menuInputs):
     return menuInputs # Return new values
 
 
+# Called once the first menu is drawn, shows it and notes how long it took
+# to appear: the time to first frame, which is recorded in the metrics (see
+# metrics.py). If ANGRYPYTHONS_STARTUP_ONLY is set the game quits there,
+# for timing startup (see bench.py).
+def recordStartup(win):
+    global startupTime
+    win.update()
+    startupTime = time.perf_counter() - STARTED
+    if metrics.recorder:
+        metrics.recorder.startup(IMPORTED - STARTED, startupTime)
+    if os.environ.get("ANGRYPYTHONS_STARTUP_ONLY"):
+        win.close()
+        sys.exit()
+
+
 # Determines whether a point is inside a rectangle
 def mouseOverrectangle(mousePosition, rectangle):
     top, bottom, left, right = physics.determineRectangleBounds(rectangle)
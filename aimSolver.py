@@ -0,0 +1,171 @@
+import concurrent.futures
+import os
+import numpy as np
+import batch
+import engine
+
+# Aim solver
+#
+# Finds the launch point (click position) that destroys the most targets in
+# one shot, and plans a whole level as a series of such shots. Candidate
+# launch points are searched coarse-to-fine: a grid over the firing region is
+# simulated first, then finer grids are tried around the best points found.
+# Each grid is split into chunks that are simulated with batch.simulateShots
+# on a pool of worker processes.
+#
+# Used for QA ("can this level be cleared with the ammo available?") and for
+# in-game hints.
+
+_pool = None # Shared worker pool, created the first time it is needed
+
+
+
+# The best launch point found, and what it does
+class Aim:
+
+    def __init__(self, clickX, clickY, targetsHit, obstaclesDestroyed, ticks):
+        self.clickX = clickX
+        self.clickY = clickY
+        self.targetsHit = targetsHit
+        self.obstaclesDestroyed = obstaclesDestroyed
+        self.ticks = ticks
+
+
+# A sequence of shots planned for a level
+class Plan:
+
+    def __init__(self):
+        self.aims = []
+        self.solved = False
+
+    def __len__(self):
+        return len(self.aims)
+
+
+# Returns a process pool shared by all searches, so repeated searches
+# (e.g. hints) don't pay for starting the workers again
+def sharedPool():
+    global _pool
+    if _pool is None:
+        _pool = concurrent.futures.ProcessPoolExecutor()
+    return _pool
+
+
+# The part of the window a shot can be fired from (top, bottom, left, right)
+# Clicks right of the catapult are ignored by the game
+def firingRegion(world, start):
+    return 0, world.height, 0, start[0]
+
+
+# Plain data version of a level that can be sent to worker processes
+def levelData(world):
+    obstacles = [o.getBounds() + (o.grade,) for o in world.obstacles]
+    targets = [(t.x, t.y, t.radius) for t in world.targets]
+    return world.width, world.height, obstacles, targets
+
+
+# Rebuilds a level sent by levelData
+def levelFromData(data):
+    width, height, obstacles, targets = data
+    return engine.World(width, height, obstacles, targets)
+
+
+# Worker process task: simulates a chunk of launch offsets
+# Returns targets hit, obstacles destroyed and ticks for each shot
+def simulateChunk(data, start, offsets, physicsConstants, maxTicks):
+    world = levelFromData(data)
+    result = batch.simulateShots(world, start, offsets, physicsConstants, maxTicks)
+    return result.targetsHit(), result.destroyedObstacles.sum(axis=1), result.ticks
+
+
+# Simulates every launch offset, split across the pool (or in this process
+# if pool is None) and returns targets hit, obstacles destroyed and ticks
+def evaluate(world, start, offsets, physicsConstants, pool, maxTicks):
+    data = levelData(world)
+    if pool is None:
+        return simulateChunk(data, start, offsets, physicsConstants, maxTicks)
+
+    chunks = np.array_split(offsets, os.cpu_count() or 1)
+    futures = [pool.submit(simulateChunk, data, start, chunk, physicsConstants, maxTicks)
+               for chunk in chunks if len(chunk)]
+    results = [future.result() for future in futures]
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+# Grid of launch offsets covering a box (top, bottom, left, right) given in
+# window coordinates, clipped to the firing region
+def offsetGrid(world, start, box, columns, rows):
+    top, bottom, left, right = box
+    regionTop, regionBottom, regionLeft, regionRight = firingRegion(world, start)
+    xs = np.linspace(max(left, regionLeft), min(right, regionRight), columns)
+    ys = np.linspace(max(top, regionTop), min(bottom, regionBottom), rows)
+    gx, gy = np.meshgrid(xs - start[0], ys - start[1])
+    return np.column_stack((gx.ravel(), gy.ravel()))
+
+
+# Finds the launch point that destroys the most targets with one shot
+# Ties go to the shot destroying more obstacles (to open up the level), then
+# to the quicker shot. start is the top of the catapult as an (x, y) pair.
+# Searches use the shared pool unless given another pool, or parallel=False
+# to search in this process only.
+def findBestShot(world, start, physicsConstants, parallel=True, pool=None,
+                 columns=24, rows=60, refinements=2, keep=8, maxTicks=2000):
+    if not parallel:
+        pool = None
+    elif pool is None:
+        pool = sharedPool()
+
+    regionTop, regionBottom, regionLeft, regionRight = firingRegion(world, start)
+    stepX = (regionRight - regionLeft) / (columns - 1)
+    stepY = (regionBottom - regionTop) / (rows - 1)
+    offsets = offsetGrid(world, start, firingRegion(world, start), columns, rows)
+
+    tried = []
+    for level in range(refinements + 1):
+        targetsHit, obstaclesDestroyed, ticks = \
+            evaluate(world, start, offsets, physicsConstants, pool, maxTicks)
+        tried.append((offsets, targetsHit, obstaclesDestroyed, ticks))
+
+        # Stop as soon as a shot clears the level
+        if targetsHit.max(initial=0) == len(world.targets) and len(world.targets):
+            break
+        if level == refinements:
+            break
+
+        # Search a finer grid around each of the best points so far
+        order = np.lexsort((ticks, -obstaclesDestroyed, -targetsHit))[:keep]
+        boxes = []
+        for dx, dy in offsets[order]:
+            x = start[0] + dx
+            y = start[1] + dy
+            boxes.append(offsetGrid(world, start, (y - stepY, y + stepY,
+                                                   x - stepX, x + stepX), 5, 5))
+        offsets = np.concatenate(boxes)
+        stepX = stepX / 2
+        stepY = stepY / 2
+
+    # => Pick the best of everything tried
+    offsets, targetsHit, obstaclesDestroyed, ticks = \
+        (np.concatenate(parts) for parts in zip(*tried))
+    best = np.lexsort((ticks, -obstaclesDestroyed, -targetsHit))[0]
+    return Aim(start[0] + offsets[best, 0], start[1] + offsets[best, 1],
+               int(targetsHit[best]), int(obstaclesDestroyed[best]),
+               int(ticks[best]))
+
+
+# Plans shots to clear a level, greedily taking the best single shot each time
+# Returns a Plan whose solved is True if every target is destroyed within
+# ammo shots. Being greedy, an unsolved plan does not prove the level can't
+# be cleared. The world is not changed.
+# searchOptions are passed on to findBestShot.
+def planLevel(world, start, physicsConstants, ammo, **searchOptions):
+    maxTicks = searchOptions.get("maxTicks", 2000)
+    world = world.copy()
+    plan = Plan()
+    while len(plan) < ammo and len(world.targets) > 0:
+        aim = findBestShot(world, start, physicsConstants, **searchOptions)
+        plan.aims.append(aim)
+        engine.runShot(world, start[0], start[1], aim.clickX, aim.clickY,
+                       physicsConstants, maxTicks)
+    plan.solved = len(world.targets) == 0
+    return plan
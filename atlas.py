@@ -0,0 +1,237 @@
+import argparse
+import concurrent.futures
+import json
+import sys
+import time
+import numpy as np
+import batch
+import levels
+
+# Shot outcome atlas
+#
+# For one level and set of physics constants, the outcome of a shot from
+# every point of a fine grid over the firing region, worked out in advance
+# so "what happens if I click here" is an array lookup (Atlas.lookup) rather
+# than a simulation. For hints, difficulty heatmaps and bot players.
+#
+# An atlas is two files:
+#   path        a .npy array (see numpy.lib.format) of OUTCOME records, one
+#               per grid point, rows top to bottom then columns left to
+#               right, opened memory-mapped so only what is looked at is read
+#   path.json   what it was made from: the level (levels.Level.toDict), the
+#               physics constants, the top of the catapult, the grid size
+#               and maxTicks
+#
+# Generation fills in chunks of rows on a pool of worker processes
+# (simulated with batch.simulateShots), each writing its rows straight into
+# the memory-mapped file and marking them done. Running generateAtlas again
+# with the same arguments after an interruption only simulates the rows not
+# yet done.
+
+FORMAT_VERSION = 1
+
+# What a shot does: the first shape it hits (hitKind, then the shape's index
+# in the level's obstacles or targets), the targets it destroys and the
+# number of times it bounces. done is set once the point has been simulated.
+OUTCOME = np.dtype([("done", "u1"), ("hitKind", "u1"), ("hitIndex", "<u4"),
+                    ("targets", "<u2"), ("bounces", "<u2")])
+NOTHING = 0 # hitKind values
+TARGET = 1
+OBSTACLE = 2
+
+CHUNK_ROWS = 8 # Grid rows simulated by a worker at a time
+
+_level = None # The level being mapped, in each worker process
+
+
+
+# An atlas opened for reading (or being generated)
+class Atlas:
+
+    def __init__(self, path, info, outcomes):
+        self.path = path
+        self.info = info
+        self.outcomes = outcomes # rows x columns array of OUTCOME
+        self.columns = info["columns"]
+        self.rows = info["rows"]
+        self.start = tuple(info["start"])
+        self.height = info["level"]["height"]
+
+    # Index (row, column) of the grid point nearest the click x,y
+    def gridPoint(self, x, y):
+        startX = self.start[0]
+        column = round(min(max(x, 0), startX) / startX * (self.columns - 1))
+        row = round(min(max(y, 0), self.height) / self.height * (self.rows - 1))
+        return row, column
+
+    # Click position of a grid point
+    def clickPosition(self, row, column):
+        return (column * self.start[0] / (self.columns - 1),
+                row * self.height / (self.rows - 1))
+
+    # The outcome of clicking at x,y (the nearest grid point's), as a
+    # record with done, hitKind, hitIndex, targets and bounces
+    def lookup(self, x, y):
+        return self.outcomes[self.gridPoint(x, y)]
+
+    # Whether every grid point has been simulated
+    def complete(self):
+        return bool(self.outcomes["done"].all())
+
+    def close(self):
+        self.outcomes = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+# What an atlas for these arguments would be made from
+def atlasInfo(level, start, physicsConstants, columns, rows, maxTicks):
+    return {"version": FORMAT_VERSION, "level": level.toDict(),
+            "physicsConstants": list(physicsConstants), "start": list(start),
+            "columns": columns, "rows": rows, "maxTicks": maxTicks}
+
+
+# Opens an atlas file for lookups
+def openAtlas(path, mode="r"):
+    with open(path + ".json") as file:
+        info = json.load(file)
+    if info["version"] != FORMAT_VERSION:
+        raise ValueError("Unsupported atlas version %d" % info["version"])
+    outcomes = np.load(path, mmap_mode=mode)
+    if outcomes.dtype != OUTCOME or outcomes.shape != (info["rows"], info["columns"]):
+        raise ValueError("%s doesn't match its description" % path)
+    return Atlas(path, info, outcomes)
+
+
+# Worker process initialiser: rebuilds the level once per worker
+def initWorker(levelDict):
+    global _level
+    _level = levels.levelFromDict(levelDict).toWorld()
+
+
+# Worker process task: simulates rows first to last - 1 of the grid and
+# writes them into the atlas file
+def simulateRows(path, info, first, last):
+    columns = info["columns"]
+    start = info["start"]
+    height = info["level"]["height"]
+    xs = np.linspace(0, start[0], columns) - start[0]
+    ys = np.linspace(0, height, info["rows"])[first:last] - start[1]
+    gx, gy = np.meshgrid(xs, ys)
+    offsets = np.column_stack((gx.ravel(), gy.ravel()))
+    result = batch.simulateShots(_level, start, offsets,
+                                 info["physicsConstants"], info["maxTicks"])
+
+    targetNumber = result.hitTargets.shape[1]
+    hit = result.firstHit
+    outcomes = np.zeros(len(offsets), dtype=OUTCOME)
+    outcomes["hitKind"] = np.where(hit < 0, NOTHING,
+                                   np.where(hit < targetNumber, TARGET, OBSTACLE))
+    outcomes["hitIndex"] = np.where(hit < targetNumber, np.maximum(hit, 0),
+                                    hit - targetNumber)
+    outcomes["targets"] = result.targetsHit()
+    outcomes["bounces"] = np.minimum(result.bounces, np.iinfo(np.uint16).max)
+    outcomes["done"] = 1
+
+    atlas = np.load(path, mmap_mode="r+")
+    atlas[first:last] = outcomes.reshape(last - first, columns)
+    atlas.flush()
+    return last - first
+
+
+# Creates (or finishes) the atlas at path for a level (a levels.Level) fired
+# at from start, the top of the catapult as (x, y), on a grid of columns x
+# rows points over the firing region
+# An existing atlas for the same level and arguments is resumed, anything
+# else at path is replaced. progress, if given, is called with the rows done
+# and the total after each chunk. Returns the Atlas, opened for reading.
+def generateAtlas(path, level, start, physicsConstants, columns=None, rows=None,
+                  maxTicks=2000, processes=None, progress=None):
+    # A point per pixel by default
+    columns = columns or int(start[0]) + 1
+    rows = rows or level.height + 1
+    info = atlasInfo(level, start, physicsConstants, columns, rows, maxTicks)
+
+    try:
+        existing = openAtlas(path)
+        if existing.info != info:
+            existing = None
+    except (OSError, ValueError):
+        existing = None
+    if existing is None:
+        outcomes = np.lib.format.open_memmap(path, mode="w+", dtype=OUTCOME,
+                                             shape=(rows, columns))
+        outcomes.flush()
+        del outcomes
+        with open(path + ".json", "w") as file:
+            json.dump(info, file)
+        done = np.zeros(rows, dtype=bool)
+    else:
+        done = existing.outcomes["done"].all(axis=1)
+        existing.close()
+
+    # Chunks of rows still to do
+    todo = np.flatnonzero(~done)
+    chunks = []
+    for row in todo.tolist():
+        if chunks and chunks[-1][1] == row and chunks[-1][1] - chunks[-1][0] < CHUNK_ROWS:
+            chunks[-1][1] = row + 1
+        else:
+            chunks.append([row, row + 1])
+
+    rowsDone = rows - len(todo)
+    if chunks:
+        with concurrent.futures.ProcessPoolExecutor(processes, initializer=initWorker,
+                                                    initargs=(info["level"],)) as pool:
+            futures = [pool.submit(simulateRows, path, info, first, last)
+                       for first, last in chunks]
+            for future in concurrent.futures.as_completed(futures):
+                rowsDone = rowsDone + future.result()
+                if progress:
+                    progress(rowsDone, rows)
+    return openAtlas(path)
+
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Precompute the outcome of a shot "
+                                     "from every point of the firing region")
+    parser.add_argument("pack", help="level pack file")
+    parser.add_argument("index", type=int, help="level number in the pack")
+    parser.add_argument("output", help="atlas file to write (or resume)")
+    parser.add_argument("--columns", type=int, help="grid columns (default a "
+                        "point per pixel)")
+    parser.add_argument("--rows", type=int, help="grid rows (default a point "
+                        "per pixel)")
+    parser.add_argument("--constants", type=float, nargs=5,
+                        default=(90, 10, 0.15, 0.5, 9.8),
+                        metavar=("TPS", "FORCE", "FRICTION", "ELASTICITY", "GRAVITY"),
+                        help="physics constants (default the game's)")
+    parser.add_argument("--jobs", type=int, help="worker processes "
+                        "(default one per CPU)")
+    options = parser.parse_args(arguments)
+
+    with levels.LevelPack(options.pack) as pack:
+        level = pack[options.index]
+    # The game's catapult position
+    start = (level.width / 10, level.height * 4 / 5)
+
+    started = time.perf_counter()
+    def progress(done, total):
+        print("\r%d/%d rows, %.1fs" % (done, total, time.perf_counter() - started),
+              end="", flush=True)
+    atlas = generateAtlas(options.output, level, start, options.constants,
+                          options.columns, options.rows,
+                          processes=options.jobs, progress=progress)
+    print()
+    print("%d points, %d hit a target first" % (atlas.outcomes.size,
+          np.count_nonzero(atlas.outcomes["hitKind"] == TARGET)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
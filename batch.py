@@ -0,0 +1,254 @@
+import numpy as np
+import engine
+
+# Batch shot simulation with NumPy
+#
+# Runs the same physics as engine.stepShot for many shots at once. Every shot
+# starts from the same level, and the state of all the projectiles still in
+# flight is held in arrays so a tick is a handful of array operations instead
+# of one Python loop per shot. Used for aim searches and level analysis where
+# thousands of candidate shots are tried against one level.
+# Requires NumPy, which the game itself does not need.
+
+CELL_SIZE = 8 # Pixels per side of the cells shots are looked up in before testing shapes
+
+
+# Per-shot outcomes of simulateShots, each attribute is an array with one
+# entry (or row) per shot
+class BatchResult:
+
+    def __init__(self, shotNumber, targetNumber, obstacleNumber):
+        self.hitTargets = np.zeros((shotNumber, targetNumber), dtype=bool)
+        self.destroyedObstacles = np.zeros((shotNumber, obstacleNumber), dtype=bool) # Lost a grade
+        self.ticks = np.zeros(shotNumber, dtype=np.int64)
+        self.bounces = np.zeros(shotNumber, dtype=np.int64)
+        # First shape hit: target i is i, obstacle i is targetNumber + i and
+        # -1 is nothing (indices are of the shapes standing at the start)
+        self.firstHit = np.full(shotNumber, -1, dtype=np.int64)
+        self.stopped = np.zeros(shotNumber, dtype=bool)
+        self.outOfBounds = np.zeros(shotNumber, dtype=bool)
+        self.finalX = np.zeros(shotNumber)
+        self.finalY = np.zeros(shotNumber)
+
+    # Number of targets destroyed by each shot
+    def targetsHit(self):
+        return self.hitTargets.sum(axis=1)
+
+    def __len__(self):
+        return len(self.ticks)
+
+
+# Simulates one shot per launch point, all starting from the same level
+# start is the top of the catapult as an (x, y) pair and launchOffsets is an
+# N x 2 array of click positions relative to it. The world is not changed.
+# Shots still in flight after maxTicks are left with neither stopped nor
+# outOfBounds set.
+def simulateShots(world, start, launchOffsets, physicsConstants, maxTicks=10000):
+
+    # Load constants
+    tps, forceMetric, friction, elasticity, g = physicsConstants
+    ppm = engine.PIXELS_PER_METER
+    startX, startY = start
+    offsets = np.asarray(launchOffsets, dtype=float).reshape(-1, 2)
+    shotNumber = len(offsets)
+
+    # Level as arrays of the shapes still standing, in the same order the
+    # engine checks them
+    targetAlive = np.frombuffer(world.targetAlive, dtype=np.uint8).astype(bool)
+    tx = np.frombuffer(world.targetX)[targetAlive]
+    ty = np.frombuffer(world.targetY)[targetAlive]
+    tr2 = np.frombuffer(world.targetRadius)[targetAlive] ** 2
+    obstacleAlive = np.frombuffer(world.obstacleAlive, dtype=np.uint8).astype(bool)
+    oTop = np.frombuffer(world.obstacleTop)[obstacleAlive]
+    oBottom = np.frombuffer(world.obstacleBottom)[obstacleAlive]
+    oLeft = np.frombuffer(world.obstacleLeft)[obstacleAlive]
+    oRight = np.frombuffer(world.obstacleRight)[obstacleAlive]
+    oGrade = np.frombuffer(world.obstacleGrade, dtype=np.uint8)[obstacleAlive]
+    targetNumber = len(tx)
+    obstacleNumber = len(oTop)
+
+    # Box around every shape in the level
+    tRadius = np.sqrt(tr2)
+    levelTop = np.concatenate((ty - tRadius, oTop)).min(initial=np.inf)
+    levelBottom = np.concatenate((ty + tRadius, oBottom)).max(initial=-np.inf)
+    levelLeft = np.concatenate((tx - tRadius, oLeft)).min(initial=np.inf)
+    levelRight = np.concatenate((tx + tRadius, oRight)).max(initial=-np.inf)
+
+    # Cells of a grid over that box that some shape's bounding box touches
+    # (padded a pixel), only shots in one of these need testing against the
+    # shapes. Lookups use the same floor division as spatialIndex.
+    occupied = np.zeros((0, 0), dtype=bool)
+    if targetNumber + obstacleNumber:
+        occupied = np.zeros((int((levelBottom - levelTop) // CELL_SIZE) + 1,
+                             int((levelRight - levelLeft) // CELL_SIZE) + 1), dtype=bool)
+        for top, bottom, left, right in zip(np.concatenate((ty - tRadius, oTop)),
+                                            np.concatenate((ty + tRadius, oBottom)),
+                                            np.concatenate((tx - tRadius, oLeft)),
+                                            np.concatenate((tx + tRadius, oRight))):
+            occupied[max(int((top - 1 - levelTop) // CELL_SIZE), 0)
+                     :int((bottom + 1 - levelTop) // CELL_SIZE) + 1,
+                     max(int((left - 1 - levelLeft) // CELL_SIZE), 0)
+                     :int((right + 1 - levelLeft) // CELL_SIZE) + 1] = True
+
+    result = BatchResult(shotNumber, targetNumber, obstacleNumber)
+
+    # State of the shots in the arrays, shot holds their index in result and
+    # live is cleared once a shot's outcome is stored. Finished shots stay in
+    # the arrays (and are skipped) until enough build up to be worth removing,
+    # as compacting every array each tick costs more than carrying them.
+    # Every shot starts on the same tick, so one tick count serves them all.
+    shot = np.arange(shotNumber)
+    live = np.ones(shotNumber, dtype=bool)
+    liveNumber = shotNumber
+    Ux = np.abs(offsets[:, 0]) * forceMetric
+    Uy = np.abs(offsets[:, 1]) * forceMetric
+    Uy = np.where(offsets[:, 1] < 0, -Uy, Uy) # Released above catapult
+    arcX = np.full(shotNumber, float(startX))
+    arcY = np.full(shotNumber, float(startY))
+    t = np.zeros(shotNumber)
+    x = arcX.copy()
+    y = arcY.copy()
+    canBreak = np.ones(shotNumber, dtype=bool)
+    stopped = np.zeros(shotNumber, dtype=bool)
+    ticks = 0
+    bounces = np.zeros(shotNumber, dtype=np.int64)
+    firstHit = np.full(shotNumber, -1, dtype=np.int64)
+    targetsAlive = np.ones((shotNumber, targetNumber), dtype=bool)
+    obstaclesAlive = np.ones((shotNumber, obstacleNumber), dtype=bool)
+    obstaclesBroken = np.zeros((shotNumber, obstacleNumber), dtype=bool)
+
+    while liveNumber > 0:
+
+        # Store the outcomes of shots that are finished or out of time
+        outOfBounds = (x >= world.width) | (x <= 0) | (y >= world.height)
+        if ticks >= maxTicks:
+            finished = live
+        else:
+            finished = (outOfBounds | stopped) & live
+        done = np.flatnonzero(finished)
+        if len(done) > 0:
+            index = shot[done]
+            result.stopped[index] = stopped[done]
+            result.outOfBounds[index] = outOfBounds[done] & ~stopped[done]
+            result.ticks[index] = ticks
+            result.bounces[index] = bounces[done]
+            result.firstHit[index] = firstHit[done]
+            result.finalX[index] = x[done]
+            result.finalY[index] = y[done]
+            result.hitTargets[index] = ~targetsAlive[done]
+            result.destroyedObstacles[index] = obstaclesBroken[done]
+            live[done] = False
+            liveNumber = liveNumber - len(done)
+            if liveNumber == 0:
+                break
+
+            # Drop finished shots once they are a quarter of the arrays
+            if liveNumber * 4 <= len(shot) * 3:
+                keep = np.flatnonzero(live)
+                shot, live = shot[keep], live[keep]
+                Ux, Uy, arcX, arcY, t = Ux[keep], Uy[keep], arcX[keep], arcY[keep], t[keep]
+                x, y, canBreak = x[keep], y[keep], canBreak[keep]
+                bounces, stopped = bounces[keep], stopped[keep]
+                firstHit = firstHit[keep]
+                targetsAlive = targetsAlive[keep]
+                obstaclesAlive = obstaclesAlive[keep]
+                obstaclesBroken = obstaclesBroken[keep]
+
+        previousX = x
+        previousY = y
+
+        # Run SUVAT to calculate new positions
+        Sx = Ux * t
+        Sy = Uy * t + 0.5 * -g * t ** 2
+        y = arcY - Sy / ppm
+        x = arcX + Sx / ppm
+        t = t + 1
+        ticks = ticks + 1
+
+        # Only shots inside the box around the whole level can hit anything
+        near = np.flatnonzero((x >= levelLeft) & (x <= levelRight)
+                              & (y >= levelTop) & (y <= levelBottom) & live)
+        if len(near) == 0:
+            continue
+        near = near[occupied[((y[near] - levelTop) // CELL_SIZE).astype(np.intp),
+                             ((x[near] - levelLeft) // CELL_SIZE).astype(np.intp)]]
+        if len(near) == 0:
+            continue
+        nx = x[near, None]
+        ny = y[near, None]
+
+        # Find the first target and the topmost obstacle each shot is inside
+        inTarget = ((nx - tx) ** 2 + (ny - ty) ** 2 <= tr2) & targetsAlive[near]
+        inObstacle = (nx >= oLeft) & (nx <= oRight) \
+                     & (ny >= oTop) & (ny <= oBottom) & obstaclesAlive[near]
+        hitTarget = inTarget.any(axis=1)
+        hitObstacle = inObstacle.any(axis=1) & ~hitTarget # Targets first
+        hit = np.flatnonzero(hitTarget | hitObstacle)
+        if len(hit) == 0:
+            continue
+
+        collided = near[hit]
+        isTarget = hitTarget[hit]
+        targetIndex = inTarget[hit].argmax(axis=1)
+        obstacleIndex = obstacleNumber - 1 - inObstacle[hit, ::-1].argmax(axis=1)
+
+        # Determine direction of collision by re-testing x-only and y-only moves
+        cx, cy = x[collided], y[collided]
+        px, py = previousX[collided], previousY[collided]
+        if targetNumber:
+            j = np.where(isTarget, targetIndex, 0)
+            sideTarget = (cx - tx[j]) ** 2 + (py - ty[j]) ** 2 <= tr2[j]
+            verticalTarget = (px - tx[j]) ** 2 + (cy - ty[j]) ** 2 <= tr2[j]
+        else:
+            sideTarget = verticalTarget = np.zeros(len(collided), dtype=bool)
+        if obstacleNumber:
+            k = np.where(isTarget, 0, obstacleIndex)
+            sideObstacle = (cx >= oLeft[k]) & (cx <= oRight[k]) \
+                           & (py >= oTop[k]) & (py <= oBottom[k])
+            verticalObstacle = (px >= oLeft[k]) & (px <= oRight[k]) \
+                               & (cy >= oTop[k]) & (cy <= oBottom[k])
+        else:
+            sideObstacle = verticalObstacle = np.zeros(len(collided), dtype=bool)
+        sideImpact = np.where(isTarget, sideTarget, sideObstacle)
+        verticalImpact = np.where(isTarget, verticalTarget, verticalObstacle)
+
+        # Bounce or apply friction
+        Ux[collided] = Ux[collided] \
+                       * np.where(sideImpact, -elasticity, 1 - friction)
+        Uy[collided] = (Uy[collided] + -g * t[collided]) \
+                       * np.where(verticalImpact, -elasticity, 1 - friction)
+        first = firstHit[collided] < 0 # Nothing hit before
+        firstHit[collided[first]] = np.where(isTarget, targetIndex,
+                                             targetNumber + obstacleIndex)[first]
+        bounces[collided] += 1
+
+        # Targets are always destroyed, obstacles lose a grade on the first
+        # collision (so at most one per shot) and go when none are left
+        targetShots = collided[isTarget]
+        targetsAlive[targetShots, targetIndex[isTarget]] = False
+        breaks = ~isTarget & canBreak[collided]
+        broken = obstacleIndex[breaks]
+        obstaclesBroken[collided[breaks], broken] = True
+        obstaclesAlive[collided[breaks], broken] = oGrade[broken] > 1
+
+        # Stop if no movement, otherwise prepare a new arc
+        still = (Ux[collided] ** 2 < engine.MIN_VELOCITY) \
+                & (Uy[collided] ** 2 < engine.MIN_VELOCITY)
+        stopped[collided[still]] = True
+        moving = collided[~still]
+        t[moving] = 1
+        arcX[moving] = previousX[moving]
+        arcY[moving] = previousY[moving]
+        canBreak[moving] = False
+
+    return result
+
+
+# Launch offsets (relative to the top of the catapult) for every point of an
+# evenly spaced grid over the firing region, which is left of the catapult
+def firingGrid(start, height, columns, rows):
+    startX, startY = start
+    xs = np.linspace(0, startX, columns) - startX
+    ys = np.linspace(0, height, rows) - startY
+    gx, gy = np.meshgrid(xs, ys)
+    return np.column_stack((gx.ravel(), gy.ravel()))
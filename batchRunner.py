@@ -0,0 +1,277 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import random
+import sys
+import time
+import engine
+import levels
+import menuOptions
+import placement
+
+# Headless games in bulk
+#
+# Plays whole games without a window, for tuning the menu's defaults and
+# spotting settings that make the game slow. Each menu option can be given
+# several values, and every combination of them (the matrix) is played a
+# number of times, on a pool of worker processes:
+#
+#   python batchRunner.py --obstacles 10 50 100 --gravity 5 9.8 \
+#       --games 200 --policy aimed --output games.jsonl
+#
+# A game is played as the game plays it: a level generated from the
+# options (levels.generateLevel, as the game does), then a shot at a time
+# until the targets are gone or the ammo runs out. Where each shot is aimed
+# comes from a shot policy (see POLICIES). Levels too crowded to generate
+# are counted as such, the game would go back to the menu. Shots are flown
+# with the game's SUVAT arcs unless another integrator is picked, with air
+# drag and wind if wanted (see engine's Integrators). The aimed policy
+# still aims for SUVAT arcs.
+#
+# Each game is written as a line of JSON as soon as it finishes (in the
+# order they finish), with the options, the game's seed, whether it was won,
+# the shots used, the ticks simulated and the game time that is (ticks /
+# ticks per second), and the seconds it took to play. A summary of each
+# combination is printed at the end.
+
+WIDTH = 1200 # Window size the game uses
+HEIGHT = 500
+MAX_TICKS = 10000 # Longest a shot is simulated for
+
+
+
+# A menu option value, a whole number if it is one (as the game's eval of
+# the menu gives)
+def number(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+# The game's menu options (see menuOptions), in the same order, as
+# (name, default)
+OPTIONS = tuple(zip(menuOptions.MENU_NAMES,
+                    (number(default) for default in menuOptions.MENU_DEFAULTS)))
+
+
+# Every combination of option values, as dicts of option name to value
+# values has a list of values for each option
+def optionMatrix(values):
+    names = [name for name, default in OPTIONS]
+    for combination in itertools.product(*(values[name] for name in names)):
+        yield dict(zip(names, combination))
+
+
+
+################################################################################
+# Shot policies
+#
+# Where a player clicks next. Each is called with the world as it is now,
+# the top of the catapult as (x, y), the physics constants, a random.Random
+# and the aiming noise (pixels), and returns a click (x, y) in the firing
+# region (left of the catapult).
+################################################################################
+
+# Clicks anywhere in the firing region
+def randomShot(world, start, physicsConstants, rng, noise):
+    return rng.uniform(0, start[0]), rng.uniform(0, world.height)
+
+
+# Clicks where aimSolver finds the shot destroying the most targets, off by
+# a normally distributed error of noise pixels
+def aimedShot(world, start, physicsConstants, rng, noise):
+    import aimSolver # Needs numpy, which the other policies don't
+    aim = aimSolver.findBestShot(world, start, physicsConstants, parallel=False)
+    x = aim.clickX
+    y = aim.clickY
+    if noise:
+        x = min(max(rng.gauss(x, noise), 0), start[0])
+        y = min(max(rng.gauss(y, noise), 0), world.height)
+    return x, y
+
+
+POLICIES = {"random": randomShot, "aimed": aimedShot}
+
+
+
+################################################################################
+# Playing games
+################################################################################
+
+# Worker process task: plays one game
+# game is (number, options, policy name, noise, seed, maxTicks, integrator),
+# where integrator is engine.makeIntegrator's arguments as (name, drag,
+# wind, maxStep), and returns the game's record
+def playGame(game):
+    gameNumber, options, policyName, noise, seed, maxTicks, integratorArguments = game
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    levelSeed = rng.randrange(2 ** 32)
+    record = {"game": gameNumber, "options": options, "policy": policyName,
+              "integrator": integratorArguments[0], "seed": seed,
+              "levelSeed": levelSeed}
+    integrator = engine.makeIntegrator(*integratorArguments)
+
+    physicsConstants = tuple(options[name] for name in
+                             ("tps", "force", "friction", "elasticity", "gravity"))
+    ranges = tuple(options[name] for name in
+                   ("minObstacleWidth", "maxObstacleWidth",
+                    "minObstacleLength", "maxObstacleLength"))
+    try:
+        level = levels.generateLevel(WIDTH, HEIGHT, options["targets"],
+                                     options["obstacles"], ranges, levelSeed)
+    except placement.PlacementError:
+        record.update(crowded=True, won=False, shots=0, ticks=0, simSeconds=0,
+                      seconds=time.perf_counter() - started)
+        return record
+
+    world = level.toWorld()
+    startX, startY = WIDTH / 10, HEIGHT * 4 / 5
+    policy = POLICIES[policyName]
+    projectiles = max(int(options["projectiles"]), 1)
+    shots = 0
+    ticks = 0
+    while shots < options["ammo"] and len(world.targets) > 0:
+        clickX, clickY = policy(world, (startX, startY), physicsConstants, rng, noise)
+        results = engine.runShots(world, startX, startY,
+                                  engine.burstClicks(startX, startY, clickX, clickY,
+                                                     projectiles),
+                                  physicsConstants, maxTicks, integrator)
+        shots = shots + 1
+        ticks = ticks + max(result.ticks for result in results)
+
+    record.update(crowded=False, won=len(world.targets) == 0, shots=shots,
+                  targetsLeft=len(world.targets), ticks=ticks,
+                  simSeconds=ticks / options["tps"],
+                  seconds=time.perf_counter() - started)
+    return record
+
+
+# The games to play: repeats of every combination of option values, each
+# with its own seed drawn from seed
+# integrator is (name, drag, wind, maxStep), see playGame
+def matrixGames(values, repeats, policy, noise=0, seed=None, maxTicks=MAX_TICKS,
+                integrator=("analytic", 0, (0, 0), None)):
+    rng = random.Random(seed)
+    gameNumber = 0
+    for options in optionMatrix(values):
+        for i in range(repeats):
+            yield gameNumber, options, policy, noise, rng.randrange(2 ** 32), \
+                  maxTicks, integrator
+            gameNumber = gameNumber + 1
+
+
+# Plays games (any iterable of playGame's tasks) across worker processes
+# Yields each game's record as it finishes
+def playGames(games, processes=None):
+    if processes == 1:
+        for game in games:
+            yield playGame(game)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        for record in pool.imap_unordered(playGame, games, chunksize=4):
+            yield record
+
+
+# Running totals for one combination of options
+class Summary:
+
+    def __init__(self, options):
+        self.options = options
+        self.games = 0
+        self.wins = 0
+        self.crowded = 0
+        self.shots = 0
+        self.seconds = 0
+        self.slowest = 0
+
+    def add(self, record):
+        self.games = self.games + 1
+        self.wins = self.wins + record["won"]
+        self.crowded = self.crowded + record["crowded"]
+        self.shots = self.shots + record["shots"]
+        self.seconds = self.seconds + record["seconds"]
+        self.slowest = max(self.slowest, record["seconds"])
+
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Play games headless for every "
+                                     "combination of menu option values")
+    for name, default in OPTIONS:
+        flag = "--" + "".join("-" + c.lower() if c.isupper() else c for c in name)
+        parser.add_argument(flag, dest=name, type=number, nargs="+",
+                            default=[default], metavar="VALUE",
+                            help="values to try (default %s)" % default)
+    parser.add_argument("--games", type=int, default=10,
+                        help="games played for each combination")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="random",
+                        help="where shots are aimed")
+    parser.add_argument("--noise", type=float, default=0,
+                        help="aiming error in pixels, for --policy aimed")
+    parser.add_argument("--seed", type=int, help="seed for the games' seeds")
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS,
+                        help="longest a shot is simulated for")
+    parser.add_argument("--integrator", choices=sorted(engine.INTEGRATORS),
+                        default="analytic", help="how shots are flown "
+                        "(default the game's SUVAT arcs)")
+    parser.add_argument("--drag", type=float, default=0,
+                        help="air drag, speed lost per pixel (not for analytic)")
+    parser.add_argument("--wind", type=float, nargs=2, default=(0, 0),
+                        metavar=("X", "Y"), help="wind velocity")
+    parser.add_argument("--max-step", type=float,
+                        help="most pixels moved per substep (not for analytic)")
+    parser.add_argument("--output", default="-",
+                        help="JSON lines file to write games to (default stdout)")
+    parser.add_argument("--jobs", type=int,
+                        help="worker processes (default one per CPU)")
+    options = parser.parse_args(arguments)
+
+    values = {name: getattr(options, name) for name, default in OPTIONS}
+    integrator = (options.integrator, options.drag, tuple(options.wind),
+                  options.max_step)
+    try:
+        engine.makeIntegrator(*integrator)
+    except ValueError as error:
+        parser.error(str(error))
+    games = matrixGames(values, options.games, options.policy, options.noise,
+                        options.seed, options.max_ticks, integrator)
+    output = sys.stdout if options.output == "-" else open(options.output, "w")
+    summaries = {}
+    started = time.perf_counter()
+    try:
+        for record in playGames(games, options.jobs):
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            key = tuple(record["options"][name] for name, default in OPTIONS)
+            if key not in summaries:
+                summaries[key] = Summary(record["options"])
+            summaries[key].add(record)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    seconds = time.perf_counter() - started
+
+    # Only the options given more than one value tell combinations apart
+    varied = [name for name, default in OPTIONS if len(values[name]) > 1]
+    report = sys.stderr
+    print("%-50s %6s %6s %8s %8s %10s %10s" % ("options", "games", "won",
+          "crowded", "shots", "mean s", "max s"), file=report)
+    for key in sorted(summaries):
+        summary = summaries[key]
+        label = " ".join("%s=%s" % (name, summary.options[name])
+                         for name in varied) or "defaults"
+        print("%-50s %6d %5.0f%% %8d %8.2f %10.4f %10.4f"
+              % (label, summary.games, 100 * summary.wins / summary.games,
+                 summary.crowded, summary.shots / summary.games,
+                 summary.seconds / summary.games, summary.slowest), file=report)
+    total = sum(summary.games for summary in summaries.values())
+    print("%d games in %.2fs (%.1f games/s)" % (total, seconds,
+          total / seconds if seconds else 0), file=report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
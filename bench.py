@@ -0,0 +1,531 @@
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import engine
+import levels
+import placement
+
+# Benchmarks for the physics and level generation hot paths
+#
+# Runs without a display: nothing is ever drawn to a real window. Shapes are
+# drawn to a HeadlessWindow, which does the same bookkeeping as a GraphWin
+# (using GraphWin's own methods) but whose canvas calls do nothing, and the
+# game loop runs on a physics.SteadyClock so it never sleeps, so the time
+# measured is the game's own Python code.
+#
+# Each benchmark is run at level sizes from 10 to 10,000 obstacles (with 3
+# targets, the game's default), or for graphics with up to 100,000 shapes
+# drawn, or for several projectiles in flight with 1 to 100 of them. The
+# time for each is the best of several
+# repeats, divided by the operations (queries, shots, levels) in one run.
+#
+# Startup is timed in new Python processes, from starting the process to
+# having imported physics, and to AngryPythons.pyw showing its first frame
+# (the menu). The first frame needs a display, so it is skipped without one.
+#
+# Each of engine's integrators is timed flying shots through an empty level,
+# per tick, with a substep of at most 4 or 1 pixels or a single step per
+# tick (size 0), with and without air drag and wind. How far its path
+# strays from the exact one (SUVAT without air, Verlet with tiny substeps
+# with it) is saved with the time, and flagged if it is more than
+# ERROR_BOUND pixels, so the cheapest integrator good enough can be picked.
+#
+# batch.simulateShots is timed per shot for 2,000 to 40,000 shots at the
+# game's default level, and saved with its speedup over engine.runShot
+# firing the same shots one at a time (each at a fresh copy of the world,
+# as the batch leaves the world alone). It is skipped without NumPy. Measured
+# here it was about 5x faster at 2,000 shots, 15x at 10,000 and 25x at
+# 40,000: each tick costs a few dozen array operations however few shots
+# are left, and the last shots fly for hundreds of ticks after most have
+# finished, so only large batches make up for it.
+#
+# Usage:
+#   python bench.py                          run everything, write bench.json
+#   python bench.py --output new.json --baseline bench.json
+#                                            compare against a saved run
+#   python bench.py --filter physics         only benchmarks matching a name
+# Anything more than --threshold (10%) slower than the baseline is reported
+# as a regression and makes the exit status 1.
+
+SIZES = (10, 100, 1000, 10000) # Obstacles in the benchmark levels
+ITEM_SIZES = (10, 1000, 10000, 100000) # Shapes drawn in the window
+PROJECTILE_SIZES = (1, 10, 100) # Projectiles fired at once
+PROJECTILE_LEVEL = 1000 # Obstacles in the level they are fired at
+STARTUP_SIZES = (1,) # Startup is timed once per process
+BATCH_SIZES = (2000, 10000, 40000) # Shots simulated at once
+BATCH_LEVEL = 10 # Obstacles in the level they are fired at
+SCALAR_SHOTS = 200 # Shots fired one at a time to compare against
+STEP_SIZES = (0, 4, 1) # Most pixels per substep, 0 for one step per tick
+TARGETS = 3 # Targets in the benchmark levels
+WIDTH = 1200 # Window size the game uses
+HEIGHT = 500
+PHYSICS_CONSTANTS = (90, 10, 0.15, 0.5, 9.8) # The game's default options
+DRAG = 0.002 # Air for the integrator benchmarks: 2% of speed lost per tick
+WIND = (-200, 0) # at the game's launch speeds, into a headwind
+ERROR_BOUND = 1.0 # Pixels an integrator's path may stray from the exact one
+FLIGHT_TICKS = 500 # Longest an integrator benchmark shot flies
+QUERIES = 1000 # Collision queries per run
+SHOTS = 8 # Shots per run
+UNDRAWS = 100 # Shapes undrawn per run
+MOVES = 400 # Mouse movements per run
+MIN_TIME = 0.2 # Minimum seconds for one repeat
+REPEATS = 5
+THRESHOLD = 0.1 # Fraction slower than the baseline counted as a regression
+
+# Obstacle dimension ranges small enough to fit each size in the window
+DIMENSION_RANGES = {10: (10, 30, 70, 300),
+                    100: (5, 10, 20, 60),
+                    1000: (2, 5, 5, 15),
+                    10000: (1, 2, 2, 4)}
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__)) # Where the game is
+
+_levels = {} # Benchmark levels already generated, by size
+_scalarShot = [] # Seconds per shot for engine.runShot, once measured
+
+
+
+# Imports graphics, physics and shapeGen (which doesn't need a display, Tk
+# only starts when a GraphWin is made)
+def importGame():
+    global graphics, physics, shapeGen
+    import graphics
+    import physics
+    import shapeGen
+
+
+# A window that keeps track of what is drawn on it like a GraphWin, but
+# doesn't draw anything
+class HeadlessWindow:
+
+    def __init__(self, width=WIDTH, height=HEIGHT):
+        self.width = width
+        self.height = height
+        self.items = {}
+        self.autoflush = False
+        self.trans = None
+        self.closed = False
+        self.lastId = 0
+
+    # Bookkeeping is GraphWin's own, so changes to it are measured
+    def addItem(self, item):
+        graphics.GraphWin.addItem(self, item)
+
+    def delItem(self, item):
+        graphics.GraphWin.delItem(self, item)
+
+    def getWidth(self):
+        return self.width
+
+    def getHeight(self):
+        return self.height
+
+    def isClosed(self):
+        return self.closed
+
+    def toScreen(self, x, y):
+        return x, y
+
+    def toWorld(self, x, y):
+        return x, y
+
+    def flush(self):
+        pass
+
+    @contextlib.contextmanager
+    def batch(self):
+        yield
+
+    # Canvas calls
+    def newId(self, *args, **options):
+        self.lastId = self.lastId + 1
+        return self.lastId
+
+    create_rectangle = create_oval = create_line = create_polygon = newId
+    create_text = create_image = create_window = newId
+
+    def delete(self, *args):
+        pass
+
+    def move(self, *args):
+        pass
+
+    def itemconfig(self, *args, **options):
+        pass
+
+    def coords(self, *args):
+        pass
+
+    # Idle callbacks are left to the benchmark to run
+    def after_idle(self, func):
+        return self.newId()
+
+    def after_cancel(self, callbackId):
+        pass
+
+
+# Generates the level used for a benchmark size, always the same one
+# Targets are placed first, as the biggest levels leave no room for them
+def benchmarkLevel(size):
+    if size not in _levels:
+        rng = random.Random(size)
+        space = placement.Occupancy(WIDTH, HEIGHT)
+        targets = placement.placeTargets(space, TARGETS, WIDTH // 5, rng)
+        for x, y, radius in targets:
+            space.fill(y - radius, y + radius, x - radius, x + radius)
+        obstacles = placement.placeObstacles(space, size, DIMENSION_RANGES[size],
+                                             WIDTH // 5, rng)
+        _levels[size] = levels.Level(WIDTH, HEIGHT, obstacles, targets, size)
+    return _levels[size]
+
+
+# Draws a benchmark level, returns the window, obstacles and targets
+def drawnLevel(size):
+    win = HeadlessWindow()
+    obstacles, targets = shapeGen.drawLevel(win, benchmarkLevel(size))
+    return win, obstacles, targets
+
+
+# Random points in the level, for collision queries
+def queryPoints(number, seed=0):
+    rng = random.Random(seed)
+    return [(rng.uniform(0, WIDTH), rng.uniform(0, HEIGHT)) for i in range(number)]
+
+
+# Random clicks in the firing region
+def firingClicks(number, seed=0):
+    rng = random.Random(seed)
+    return [graphics.Point(rng.uniform(0, WIDTH / 10), rng.uniform(0, HEIGHT))
+            for i in range(number)]
+
+
+
+################################################################################
+# Benchmarks
+#
+# Each takes a level size and returns (run, reset, operations): run is timed,
+# reset (or None) is called before each run without being timed, and
+# operations is how many operations one run does, or None if it can't be
+# run here. A dict of anything else measured can follow operations, to be
+# saved with the time.
+################################################################################
+
+# Collision queries at random points, through the level's grid index
+def benchCollisionAt(size):
+    world = benchmarkLevel(size).toWorld()
+    points = queryPoints(QUERIES)
+    collisionAt = world.collisionAt
+    def run():
+        for x, y in points:
+            collisionAt(x, y)
+    return run, None, len(points)
+
+
+def benchSimulateProjectile(size):
+    start = graphics.Point(WIDTH / 10, HEIGHT * 4 / 5)
+    clicks = firingClicks(SHOTS)
+    level = {}
+    def reset():
+        win, obstacles, targets = drawnLevel(size)
+        level["win"] = win
+        level["world"] = physics.worldFromShapes(win, obstacles, targets)
+    def run():
+        for click in clicks:
+            physics.simulateProjectile(level["win"], start, click, level["world"],
+                                       PHYSICS_CONSTANTS, clock=physics.SteadyClock())
+    return run, reset, len(clicks)
+
+
+# Fires size projectiles at once, headless. Timed per tick of each
+# projectile, to show how the shared tick loop scales with more of them.
+def benchRunShots(size):
+    level = benchmarkLevel(PROJECTILE_LEVEL)
+    clicks = [(point.getX(), point.getY()) for point in firingClicks(size)]
+    world = {}
+    def reset():
+        world["world"] = level.toWorld()
+    def run():
+        return engine.runShots(world["world"], WIDTH / 10, HEIGHT * 4 / 5,
+                               clicks, PHYSICS_CONSTANTS)
+    reset()
+    ticks = sum(result.ticks for result in run())
+    return run, reset, ticks
+
+
+# Simulates size shots at once with batch.simulateShots, timed per shot
+# Also measures how much faster that is than engine.runShot
+def benchSimulateShots(size):
+    try:
+        import batch
+    except ImportError:
+        return None
+    level = benchmarkLevel(BATCH_LEVEL)
+    world = level.toWorld()
+    startX, startY = WIDTH / 10, HEIGHT * 4 / 5
+    clicks = [(point.getX(), point.getY()) for point in firingClicks(size)]
+    offsets = [(x - startX, y - startY) for x, y in clicks]
+    if not _scalarShot:
+        def runScalar():
+            for x, y in clicks[:SCALAR_SHOTS]:
+                engine.runShot(world.copy(), startX, startY, x, y, PHYSICS_CONSTANTS)
+        _scalarShot.append(bestTime(runScalar) / min(SCALAR_SHOTS, size))
+    def run():
+        batch.simulateShots(world, (startX, startY), offsets, PHYSICS_CONSTANTS)
+    perShot = bestTime(run) / size
+    return run, None, size, {"speedup": _scalarShot[0] / perShot}
+
+
+# Moves the mouse around the firing area with the trajectory preview
+# showing, revisiting positions the way a player's mouse does
+def benchTrajectoryPreview(size):
+    win, obstacles, targets = drawnLevel(size)
+    world = physics.worldFromShapes(win, obstacles, targets)
+    start = graphics.Point(WIDTH / 10, HEIGHT * 4 / 5)
+    positions = firingClicks(MOVES // 4) * 4
+    preview = {}
+    def reset():
+        preview["preview"] = physics.TrajectoryPreview(win, world, start,
+                                                       PHYSICS_CONSTANTS)
+    def run():
+        trajectoryPreview = preview["preview"]
+        for position in positions:
+            trajectoryPreview.onMotion(position)
+            trajectoryPreview.redraw()
+    return run, reset, len(positions)
+
+
+def benchGenRandomObstacles(size):
+    rng = random.Random(size)
+    def run():
+        shapeGen.genRandomObstacles(HeadlessWindow(), size,
+                                    DIMENSION_RANGES[size], rng)
+    return run, None, 1
+
+
+def benchGenRandomTargets(size):
+    win, obstacles, targets = drawnLevel(size)
+    rng = random.Random(size)
+    def run():
+        shapeGen.genRandomTargets(win, TARGETS, obstacles, rng)
+    return run, None, 1
+
+
+# Undraws shapes from a window with size shapes drawn in it. The shapes are
+# drawn again between runs, so they are the most recently drawn.
+def benchUndraw(size):
+    win = HeadlessWindow()
+    shapes = []
+    for i in range(size):
+        shape = graphics.Rectangle(graphics.Point(0, 0), graphics.Point(1, 1))
+        shape.draw(win)
+        shapes.append(shape)
+    undrawn = random.Random(size).sample(shapes, min(UNDRAWS, size))
+    def reset():
+        for shape in undrawn:
+            shape.draw(win)
+    def run():
+        for shape in undrawn:
+            shape.undraw()
+    for shape in undrawn:
+        shape.undraw()
+    return run, reset, len(undrawn)
+
+
+# Starts Python and imports physics, as a tool using the game's maths would
+def benchImportPhysics(size):
+    command = [sys.executable, "-c", "import physics"]
+    def run():
+        subprocess.run(command, cwd=DIRECTORY, check=True)
+    return run, None, 1
+
+
+# Starts the game and times it to the first frame (see
+# AngryPythons.recordStartup), or returns None if there's no display
+def benchFirstFrame(size):
+    command = [sys.executable, os.path.join(DIRECTORY, "AngryPythons.pyw")]
+    environment = dict(os.environ, ANGRYPYTHONS_STARTUP_ONLY="1")
+    environment.pop("ANGRYPYTHONS_METRICS", None)
+    environment.pop("ANGRYPYTHONS_RECORDINGS", None)
+    def run():
+        return subprocess.run(command, cwd=DIRECTORY, env=environment,
+                              stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL).returncode
+    if run() != 0:
+        return None
+    return run, None, 1
+
+
+# Flies SHOTS shots through an empty level with an integrator (see
+# engine.makeIntegrator) taking substeps of at most size pixels, timed per
+# tick, and finds the furthest any of them strays from the exact path
+def integratorBenchmark(name, air):
+    drag, wind = (DRAG, WIND) if air else (0, (0, 0))
+    world = engine.World(WIDTH, HEIGHT)
+    clicks = []
+    startX, startY = WIDTH / 10, HEIGHT * 4 / 5
+    def paths(integrator):
+        return [engine.arcToImpact(world, startX, startY, point.getX(), point.getY(),
+                                   PHYSICS_CONSTANTS, FLIGHT_TICKS, integrator)
+                for point in clicks]
+    def benchmark(size):
+        clicks[:] = firingClicks(SHOTS)
+        integrator = engine.makeIntegrator(name, drag, wind, size)
+        if air:
+            exact = engine.VelocityVerlet(drag, wind, 0.01)
+            exact.maxSubsteps = 10000
+        else:
+            exact = engine.ANALYTIC
+        error = 0
+        for path, exactPath in zip(paths(integrator), paths(exact)):
+            for (x, y), (exactX, exactY) in zip(path, exactPath):
+                error = max(error, math.sqrt((x - exactX) ** 2 + (y - exactY) ** 2))
+        def run():
+            paths(integrator)
+        ticks = sum(len(path) - 1 for path in paths(integrator))
+        return run, None, ticks, {"error": error, "withinBound": error <= ERROR_BOUND}
+    return benchmark
+
+
+# (name, benchmark, sizes to run it at) for everything benchmarked
+BENCHMARKS = (
+    ("engine.World.collisionAt", benchCollisionAt, SIZES),
+    ("physics.simulateProjectile", benchSimulateProjectile, SIZES),
+    ("engine.runShots", benchRunShots, PROJECTILE_SIZES),
+    ("batch.simulateShots", benchSimulateShots, BATCH_SIZES),
+    ("physics.TrajectoryPreview", benchTrajectoryPreview, SIZES),
+    ("shapeGen.genRandomObstacles", benchGenRandomObstacles, SIZES),
+    ("shapeGen.genRandomTargets", benchGenRandomTargets, SIZES),
+    ("graphics.undraw", benchUndraw, ITEM_SIZES),
+    ("startup.importPhysics", benchImportPhysics, STARTUP_SIZES),
+    ("startup.firstFrame", benchFirstFrame, STARTUP_SIZES),
+    ("engine.integrator.analytic", integratorBenchmark("analytic", False), (0,)),
+    ("engine.integrator.euler", integratorBenchmark("euler", False), STEP_SIZES),
+    ("engine.integrator.verlet", integratorBenchmark("verlet", False), STEP_SIZES),
+    ("engine.integrator.euler+air", integratorBenchmark("euler", True), STEP_SIZES),
+    ("engine.integrator.verlet+air", integratorBenchmark("verlet", True), STEP_SIZES))
+
+
+
+################################################################################
+# Running and comparing
+################################################################################
+
+# Best time for one run out of repeats, each repeat lasting at least minTime
+def bestTime(run, reset=None, minTime=MIN_TIME, repeats=REPEATS):
+    best = None
+    for i in range(repeats):
+        runs = 0
+        elapsed = 0
+        while elapsed < minTime or runs == 0:
+            if reset:
+                reset()
+            started = time.perf_counter()
+            run()
+            elapsed = elapsed + time.perf_counter() - started
+            runs = runs + 1
+        if best is None or elapsed / runs < best:
+            best = elapsed / runs
+    return best
+
+
+# Runs the benchmarks whose names contain pattern, at each of their sizes
+# (or only those in sizes, if given)
+# Returns {name/size: {"seconds": per operation, "operations": per run}}
+def runBenchmarks(pattern="", sizes=None, minTime=MIN_TIME, repeats=REPEATS):
+    results = {}
+    for name, benchmark, benchmarkSizes in BENCHMARKS:
+        for size in benchmarkSizes:
+            if sizes and size not in sizes:
+                continue
+            key = "%s/%d" % (name, size)
+            if pattern not in key:
+                continue
+            prepared = benchmark(size)
+            if prepared is None:
+                print("%-40s %15s" % (key, "skipped"))
+                continue
+            run, reset, operations = prepared[:3]
+            seconds = bestTime(run, reset, minTime, repeats) / operations
+            results[key] = {"seconds": seconds, "operations": operations}
+            if len(prepared) > 3:
+                # Anything else measured, e.g. an integrator's error
+                results[key].update(prepared[3])
+            line = "%-40s %12.3f us" % (key, seconds * 1e6)
+            if "error" in results[key]:
+                line = line + "  error %.3g px" % results[key]["error"]
+                if not results[key]["withinBound"]:
+                    line = line + "  OVER BOUND"
+            if "speedup" in results[key]:
+                line = line + "  %.1fx engine.runShot" % results[key]["speedup"]
+            print(line)
+    return results
+
+
+# Compares results against a baseline
+# Returns {name: current time / baseline time} for names in both
+def compare(results, baseline):
+    ratios = {}
+    for key, result in results.items():
+        if key in baseline and baseline[key]["seconds"] > 0:
+            ratios[key] = result["seconds"] / baseline[key]["seconds"]
+    return ratios
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Benchmark the game's hot paths")
+    parser.add_argument("--output", default="bench.json",
+                        help="file to write the results to")
+    parser.add_argument("--baseline", help="saved results to compare against")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="fraction slower than the baseline that counts "
+                             "as a regression")
+    parser.add_argument("--filter", default="",
+                        help="only run benchmarks whose name contains this")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        help="only run at these sizes")
+    parser.add_argument("--quick", action="store_true",
+                        help="one short repeat of each, for checking it works")
+    options = parser.parse_args(arguments)
+
+    importGame()
+    if options.quick:
+        results = runBenchmarks(options.filter, options.sizes, 0, 1)
+    else:
+        results = runBenchmarks(options.filter, options.sizes)
+    report = {"python": platform.python_version(),
+              "machine": platform.machine(),
+              "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "results": results}
+
+    regressions = []
+    if options.baseline:
+        with open(options.baseline) as file:
+            baseline = json.load(file)["results"]
+        ratios = compare(results, baseline)
+        report["baseline"] = options.baseline
+        report["comparison"] = ratios
+        print()
+        print("%-40s %12s" % ("Compared to " + options.baseline, "time ratio"))
+        for key, ratio in ratios.items():
+            flag = ""
+            if ratio > 1 + options.threshold:
+                flag = "  REGRESSION"
+                regressions.append(key)
+            elif ratio < 1 - options.threshold:
+                flag = "  faster"
+            print("%-40s %12.3f%s" % (key, ratio, flag))
+
+    with open(options.output, "w") as file:
+        json.dump(report, file, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import random
+import sys
+import time
+import numpy as np
+import aimSolver
+import levels
+import placement
+
+# Level datasets
+#
+# Generates large numbers of levels for testing and content, keeping only
+# those that can be cleared. Levels are generated by worker processes with
+# levels.generateLevel (the placement rules the game's shapeGen uses), then
+# checked headless: aimSolver.planLevel has to find shots that destroy every
+# target within the ammo. Being greedy, the check can turn down a level
+# that could be cleared, but never lets through one that can't.
+#
+# Work is done in tasks of BATCH_LEVELS candidate levels. Task n gets its own
+# seed, made from the dataset's seed and n (numpy's SeedSequence), and each
+# candidate gets a seed drawn from that, which is saved with the level. So
+# the same seed always gives the same levels in the same order, however
+# many workers there are, in whatever order they finish and however many
+# runs it takes.
+#
+# A dataset is a directory:
+#   dataset.json      what the levels are generated from (see datasetInfo)
+#   chunk-000000.aplk ...
+#                     the accepted levels, as level packs of about
+#                     chunkLevels levels each
+#   manifest.jsonl    a line of JSON per chunk: its file, the levels in it,
+#                     the tasks they came from, the candidates tried and
+#                     how many of those were too crowded or unsolvable
+#
+# Chunks are only ever added. Each is written to a temporary file and
+# renamed, and listed in the manifest after that, so an interrupted run
+# leaves whole chunks only. Running again with the same settings carries on
+# after the last task in the manifest. Only the chunk being filled and a few
+# tasks per worker are held in memory, however big the dataset gets.
+
+BATCH_LEVELS = 50 # Candidate levels per task
+CHUNK_LEVELS = 10000 # Levels per chunk (a chunk ends on a task boundary)
+TASKS_PER_WORKER = 2 # Tasks queued ahead for each worker
+INFO_NAME = "dataset.json"
+MANIFEST_NAME = "manifest.jsonl"
+CHUNK_NAME = "chunk-%06d.aplk"
+
+_info = None # The dataset being generated, in each worker process
+
+
+
+# What a dataset's levels are generated from
+# seed is an int, or None for a random one (which is then saved)
+def datasetInfo(width, height, targets, obstacles, obstacleDimensionRanges, ammo,
+                physicsConstants, check=True, seed=None, batchLevels=BATCH_LEVELS):
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    return {"width": width, "height": height, "targets": targets,
+            "obstacles": obstacles,
+            "obstacleDimensionRanges": list(obstacleDimensionRanges),
+            "ammo": ammo, "physicsConstants": list(physicsConstants),
+            "check": check, "seed": seed, "batchLevels": batchLevels}
+
+
+# The seed of task n of a dataset
+def taskSeed(seed, n):
+    return int(np.random.SeedSequence(seed, spawn_key=(n,)).generate_state(1)[0])
+
+
+# Whether a level can be cleared within ammo shots, fired from the game's
+# catapult position (see aimSolver.planLevel)
+def solvable(level, physicsConstants, ammo):
+    start = (level.width / 10, level.height * 4 / 5)
+    plan = aimSolver.planLevel(level.toWorld(), start, physicsConstants, ammo,
+                               parallel=False)
+    return plan.solved
+
+
+# Runs in each worker process when it starts
+def initWorker(info):
+    global _info
+    _info = info
+
+
+# Worker process task: generates and checks task n's candidate levels
+# Returns n, the accepted levels, and the number of candidates that were too
+# crowded to place and that couldn't be cleared
+def generateTask(n):
+    info = _info
+    rng = random.Random(taskSeed(info["seed"], n))
+    accepted = []
+    crowded = unsolvable = 0
+    for i in range(info["batchLevels"]):
+        seed = rng.randrange(2 ** 32)
+        try:
+            level = levels.generateLevel(info["width"], info["height"],
+                                         info["targets"], info["obstacles"],
+                                         info["obstacleDimensionRanges"], seed)
+        except placement.PlacementError:
+            crowded = crowded + 1
+            continue
+        if info["check"] and not solvable(level, info["physicsConstants"], info["ammo"]):
+            unsolvable = unsolvable + 1
+            continue
+        accepted.append(level)
+    return n, accepted, crowded, unsolvable
+
+
+# The manifest of a dataset, a list of a dict per chunk
+def readManifest(directory):
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+# Generates a dataset in directory (see the top of the file) until it holds
+# at least count levels (whole tasks are kept), carrying on from where an earlier run with the same info
+# (see datasetInfo) stopped. progress, if given, is called after each task
+# with the levels accepted, candidates tried and seconds taken by this run.
+# Returns the number of levels in the dataset.
+def generateDataset(directory, count, info, processes=None,
+                    chunkLevels=CHUNK_LEVELS, progress=None):
+    os.makedirs(directory, exist_ok=True)
+    infoPath = os.path.join(directory, INFO_NAME)
+    if os.path.exists(infoPath):
+        with open(infoPath) as file:
+            existing = json.load(file)
+        if existing != info:
+            raise ValueError("%s was generated with other settings" % directory)
+    else:
+        with open(infoPath, "w") as file:
+            json.dump(info, file)
+
+    manifest = readManifest(directory)
+    total = sum(chunk["levels"] for chunk in manifest)
+    nextTask = manifest[-1]["lastTask"] + 1 if manifest else 0
+    chunkNumber = len(manifest)
+    if total >= count:
+        return total
+
+    started = time.perf_counter()
+    accepted = tried = 0
+    chunk = [] # Levels of the chunk being filled
+    chunkTried = chunkCrowded = chunkUnsolvable = 0
+    firstTask = nextTask
+    processes = processes or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(processes, initializer=initWorker,
+                                                initargs=(info,)) as pool:
+        pending = collections.deque()
+        try:
+            while total + len(chunk) < count:
+                # Keep every worker busy, taking results in task order
+                while len(pending) < processes * TASKS_PER_WORKER:
+                    pending.append(pool.submit(generateTask, nextTask))
+                    nextTask = nextTask + 1
+                task, levelsAccepted, crowded, unsolvable = pending.popleft().result()
+                chunk.extend(levelsAccepted)
+                accepted = accepted + len(levelsAccepted)
+                tried = tried + info["batchLevels"]
+                chunkTried = chunkTried + info["batchLevels"]
+                chunkCrowded = chunkCrowded + crowded
+                chunkUnsolvable = chunkUnsolvable + unsolvable
+                if progress:
+                    progress(accepted, tried, time.perf_counter() - started)
+
+                if len(chunk) >= chunkLevels or total + len(chunk) >= count:
+                    writeChunk(directory, chunkNumber, chunk, {
+                        "firstTask": firstTask, "lastTask": task, "tried": chunkTried,
+                        "crowded": chunkCrowded, "unsolvable": chunkUnsolvable})
+                    total = total + len(chunk)
+                    chunkNumber = chunkNumber + 1
+                    chunk = []
+                    chunkTried = chunkCrowded = chunkUnsolvable = 0
+                    firstTask = task + 1
+        finally:
+            for future in pending:
+                future.cancel()
+    return total
+
+
+# Writes a chunk of levels, then lists it in the manifest along with
+# details (the tasks it came from and the candidates tried)
+def writeChunk(directory, number, chunk, details):
+    name = CHUNK_NAME % number
+    path = os.path.join(directory, name)
+    levels.writeLevelPack(path + ".tmp", chunk)
+    os.replace(path + ".tmp", path)
+    entry = {"chunk": name, "levels": len(chunk)}
+    entry.update(details)
+    entry["time"] = time.time()
+    with open(os.path.join(directory, MANIFEST_NAME), "a") as file:
+        file.write(json.dumps(entry) + "\n")
+
+
+# Every level in a dataset, read a chunk at a time
+def datasetLevels(directory):
+    for chunk in readManifest(directory):
+        with levels.LevelPack(os.path.join(directory, chunk["chunk"])) as pack:
+            for level in pack:
+                yield level
+
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Generate a dataset of levels "
+                                     "that can be cleared")
+    parser.add_argument("output", help="dataset directory (carried on if it exists)")
+    parser.add_argument("count", type=int, help="levels wanted in the dataset")
+    parser.add_argument("--targets", type=int, default=3)
+    parser.add_argument("--obstacles", type=int, default=10)
+    parser.add_argument("--ranges", type=int, nargs=4, default=(10, 30, 70, 300),
+                        metavar=("MIN_WIDTH", "MAX_WIDTH", "MIN_LENGTH", "MAX_LENGTH"),
+                        help="obstacle dimension ranges (default the game's)")
+    parser.add_argument("--ammo", type=int, default=10)
+    parser.add_argument("--constants", type=float, nargs=5,
+                        default=(90, 10, 0.15, 0.5, 9.8),
+                        metavar=("TPS", "FORCE", "FRICTION", "ELASTICITY", "GRAVITY"),
+                        help="physics constants (default the game's)")
+    parser.add_argument("--size", type=int, nargs=2, default=(1200, 500),
+                        metavar=("WIDTH", "HEIGHT"), help="window size")
+    parser.add_argument("--no-check", action="store_true",
+                        help="keep every level that could be placed")
+    parser.add_argument("--seed", type=int, help="dataset seed (default random)")
+    parser.add_argument("--batch", type=int, default=BATCH_LEVELS,
+                        help="candidate levels per task")
+    parser.add_argument("--chunk", type=int, default=CHUNK_LEVELS,
+                        help="levels per chunk file")
+    parser.add_argument("--jobs", type=int, help="worker processes "
+                        "(default one per CPU)")
+    options = parser.parse_args(arguments)
+
+    info = datasetInfo(options.size[0], options.size[1], options.targets,
+                       options.obstacles, options.ranges, options.ammo,
+                       options.constants, not options.no_check, options.seed,
+                       options.batch)
+    # Carry on with the seed the dataset was started with
+    infoPath = os.path.join(options.output, INFO_NAME)
+    if options.seed is None and os.path.exists(infoPath):
+        with open(infoPath) as file:
+            info["seed"] = json.load(file)["seed"]
+
+    lastReport = [0]
+    def progress(accepted, tried, seconds):
+        if seconds - lastReport[0] >= 1:
+            lastReport[0] = seconds
+            print("\r%d accepted of %d tried (%.0f%%), %.1f levels/s, %.1f tried/s"
+                  % (accepted, tried, 100 * accepted / tried, accepted / seconds,
+                     tried / seconds), end="", file=sys.stderr, flush=True)
+    started = time.perf_counter()
+    try:
+        total = generateDataset(options.output, options.count, info, options.jobs,
+                                options.chunk, progress)
+    except ValueError as error:
+        parser.error(str(error))
+    print(file=sys.stderr)
+    print("%d levels in %s (%.1fs)" % (total, options.output,
+                                       time.perf_counter() - started))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
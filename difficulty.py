@@ -0,0 +1,177 @@
+import concurrent.futures
+import math
+import os
+import numpy as np
+import aimSolver
+import batch
+import engine
+
+# Monte Carlo level difficulty
+#
+# Estimates how hard a level is by simulating lots of shots from a model
+# player and measuring:
+#   - the probability that one shot destroys at least one target
+#   - the probability of clearing the level within the ammo available
+#   - the expected number of shots needed to clear it (when it is cleared)
+# The model player either clicks uniformly at random in the firing region,
+# or (when noise is given) aims at the aimSolver's plan for the level with
+# normally distributed error of noise pixels.
+#
+# Work is sharded across worker processes, each of which is given its own
+# read-only copy of the level once when it starts. Sampling continues in
+# rounds until the confidence intervals are narrower than the tolerance.
+
+Z_95 = 1.959964 # Normal quantile for 95% confidence intervals
+
+_level = None # The level being estimated, in each worker process
+
+
+
+# Estimates of a level's difficulty, each with a 95% confidence interval
+class Difficulty:
+
+    def __init__(self):
+        self.shots = 0
+        self.hits = 0
+        self.episodes = 0
+        self.clears = 0
+        self.shotsToClear = [] # For each episode that cleared the level
+        self.converged = False
+
+    # Probability that one shot destroys at least one target
+    def hitProbability(self):
+        return proportionInterval(self.hits, self.shots)
+
+    # Probability of clearing the level within the ammo available
+    def clearProbability(self):
+        return proportionInterval(self.clears, self.episodes)
+
+    # Expected shots to clear the level, given that it is cleared
+    def expectedShots(self):
+        return meanInterval(self.shotsToClear)
+
+
+# Wilson score interval for a proportion, returns (estimate, low, high)
+def proportionInterval(successes, trials):
+    if trials == 0:
+        return 0.0, 0.0, 1.0
+    p = successes / trials
+    z2 = Z_95 ** 2
+    centre = (p + z2 / (2 * trials)) / (1 + z2 / trials)
+    halfWidth = Z_95 * math.sqrt(p * (1 - p) / trials + z2 / (4 * trials ** 2)) \
+                / (1 + z2 / trials)
+    return p, max(centre - halfWidth, 0.0), min(centre + halfWidth, 1.0)
+
+
+# Normal interval for a mean, returns (estimate, low, high)
+def meanInterval(values):
+    if len(values) == 0:
+        return math.nan, math.nan, math.nan
+    mean = sum(values) / len(values)
+    if len(values) == 1:
+        return mean, math.nan, math.nan
+    variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+    halfWidth = Z_95 * math.sqrt(variance / len(values))
+    return mean, mean - halfWidth, mean + halfWidth
+
+
+# Runs in each worker process when it starts, keeps its copy of the level
+def initWorker(data):
+    global _level
+    _level = aimSolver.levelFromData(data)
+
+
+# Picks click positions for a model player
+# aim is an (x, y) click to aim at, or None to click uniformly at random
+def modelClicks(rng, world, start, aim, noise, number):
+    top, bottom, left, right = aimSolver.firingRegion(world, start)
+    if aim is None:
+        xs = rng.uniform(left, right, number)
+        ys = rng.uniform(top, bottom, number)
+    else:
+        xs = np.clip(rng.normal(aim[0], noise, number), left, right)
+        ys = np.clip(rng.normal(aim[1], noise, number), top, bottom)
+    return xs, ys
+
+
+# Worker process task: simulates single shots and whole games (episodes)
+# Returns shots that hit a target and the shots each episode needed to clear
+# the level (0 if it wasn't cleared)
+def sampleChunk(start, physicsConstants, ammo, aims, noise, shots, episodes,
+                seed, maxTicks):
+    rng = np.random.default_rng(seed)
+    world = _level
+    aim = aims[0] if aims else None
+
+    # Single shots at the untouched level, simulated together
+    xs, ys = modelClicks(rng, world, start, aim, noise, shots)
+    offsets = np.column_stack((xs - start[0], ys - start[1]))
+    result = batch.simulateShots(world, start, offsets, physicsConstants, maxTicks)
+    hits = int((result.targetsHit() > 0).sum())
+
+    # Whole games, shot by shot
+    shotsToClear = []
+    for i in range(episodes):
+        episodeWorld = world.copy()
+        used = 0
+        while used < ammo and len(episodeWorld.targets) > 0:
+            aim = aims[used] if used < len(aims) else None
+            xs, ys = modelClicks(rng, world, start, aim, noise, 1)
+            engine.runShot(episodeWorld, start[0], start[1], xs[0], ys[0],
+                           physicsConstants, maxTicks)
+            used = used + 1
+        shotsToClear.append(used if len(episodeWorld.targets) == 0 else 0)
+    return hits, shotsToClear
+
+
+# Estimates the difficulty of a level (see the top of this file)
+# start is the top of the catapult as an (x, y) pair. Sampling stops once
+# both probabilities are known to within +/- tolerance, or after maxShots
+# single shots. Each round every worker simulates roundShots single shots
+# and roundShots // episodeRatio games.
+def estimateDifficulty(world, start, physicsConstants, ammo, noise=None,
+                       tolerance=0.01, maxShots=100000, roundShots=2000,
+                       episodeRatio=10, processes=None, seed=None, maxTicks=2000):
+    processes = processes or os.cpu_count() or 1
+    seeds = np.random.SeedSequence(seed)
+
+    # A noisy player aims at the solver's plan
+    aims = []
+    if noise is not None:
+        plan = aimSolver.planLevel(world, start, physicsConstants, ammo,
+                                   parallel=False, maxTicks=maxTicks)
+        aims = [(aim.clickX, aim.clickY) for aim in plan.aims]
+
+    difficulty = Difficulty()
+    data = aimSolver.levelData(world)
+    with concurrent.futures.ProcessPoolExecutor(processes, initializer=initWorker,
+                                                initargs=(data,)) as pool:
+        while difficulty.shots < maxShots:
+            futures = [pool.submit(sampleChunk, start, physicsConstants, ammo,
+                                   aims, noise, roundShots,
+                                   max(roundShots // episodeRatio, 1),
+                                   child, maxTicks)
+                       for child in seeds.spawn(processes)]
+            for future in futures:
+                hits, shotsToClear = future.result()
+                difficulty.shots = difficulty.shots + roundShots
+                difficulty.hits = difficulty.hits + hits
+                difficulty.episodes = difficulty.episodes + len(shotsToClear)
+                for used in shotsToClear:
+                    if used:
+                        difficulty.clears = difficulty.clears + 1
+                        difficulty.shotsToClear.append(used)
+
+            # Stop early once the estimates have converged
+            if converged(difficulty.hitProbability(), tolerance) \
+            and converged(difficulty.clearProbability(), tolerance):
+                difficulty.converged = True
+                break
+
+    return difficulty
+
+
+# Whether a confidence interval is within +/- tolerance
+def converged(interval, tolerance):
+    estimate, low, high = interval
+    return (high - low) / 2 <= tolerance
@@ -0,0 +1,759 @@
+import array
+import math
+import spatialIndex
+import time
+
+# Headless projectile simulation
+#
+# This is the game's physics with all of the drawing taken out. The level is
+# held as plain data (a World of obstacles and targets) and a Shot is advanced
+# one tick at a time by stepShot. Nothing in here imports graphics (and so
+# Tk), so shots can be simulated on a machine without a display and as fast
+# as the CPU allows. physics.simulateProjectile draws the game on top of this.
+#
+# How a projectile moves between collisions is up to its integrator (see
+# Integrators below). The game uses Analytic, the original SUVAT arcs, and
+# the others add air drag and wind.
+
+PIXELS_PER_METER = 100 # For unit conversion
+MIN_VELOCITY = PIXELS_PER_METER ** 2 # Threshold for checking if stationary
+PROJECTILE_RADIUS = 5 # As drawn, for projectiles hitting each other
+BURST_SPREAD = 8 # Degrees between the projectiles of a burst
+
+
+
+################################################################################
+# Level data
+################################################################################
+
+# Shapes are filed in the collision grid by id, lowest id first. Targets
+# come first, in the order they were added, then obstacles, last added
+# (drawn on top) first.
+MAX_SHAPES = 1 << 29 # Of each kind, keeps ids small ints
+LAST_ID = 2 * MAX_SHAPES - 1
+
+def targetId(index):
+    return index
+
+def obstacleId(index):
+    return LAST_ID - index
+
+
+# Makes a property reading and writing entry index of one of a world's arrays
+def column(name):
+    def get(view):
+        return getattr(view.world, name)[view.index]
+    def set(view, value):
+        getattr(view.world, name)[view.index] = value
+    return property(get, set)
+
+
+# View of one obstacle in a World: a rectangle, stored as its bounds, whose
+# grade is the number of hits it takes to destroy (the layers drawn)
+# Views are made when asked for, the World's arrays hold the data
+class Obstacle:
+    __slots__ = ("world", "index")
+
+    top = column("obstacleTop")
+    bottom = column("obstacleBottom")
+    left = column("obstacleLeft")
+    right = column("obstacleRight")
+    grade = column("obstacleGrade")
+    sprites = column("obstacleSprites") # Drawn layers, bottom first
+
+    def __init__(self, world, index):
+        self.world = world
+        self.index = index
+
+    @property
+    def alive(self):
+        return bool(self.world.obstacleAlive[self.index])
+
+    # Point in rectangle
+    def contains(self, x, y):
+        return self.world.obstacleContains(self.index, x, y)
+
+    def getBounds(self):
+        world = self.world
+        i = self.index
+        return world.obstacleTop[i], world.obstacleBottom[i], \
+               world.obstacleLeft[i], world.obstacleRight[i]
+
+    def __eq__(self, other):
+        return type(other) == Obstacle and other.world is self.world \
+               and other.index == self.index
+
+    def __hash__(self):
+        return hash((id(self.world), obstacleId(self.index)))
+
+
+# View of one target in a World: a circle, stored as its centre and radius
+class Target:
+    __slots__ = ("world", "index")
+
+    x = column("targetX")
+    y = column("targetY")
+    radius = column("targetRadius")
+    sprite = column("targetSprites")
+
+    def __init__(self, world, index):
+        self.world = world
+        self.index = index
+
+    @property
+    def alive(self):
+        return bool(self.world.targetAlive[self.index])
+
+    # Point in circle
+    def contains(self, x, y):
+        return self.world.targetContains(self.index, x, y)
+
+    def getBounds(self):
+        world = self.world
+        i = self.index
+        return world.targetY[i] - world.targetRadius[i], \
+               world.targetY[i] + world.targetRadius[i], \
+               world.targetX[i] - world.targetRadius[i], \
+               world.targetX[i] + world.targetRadius[i]
+
+    def __eq__(self, other):
+        return type(other) == Target and other.world is self.world \
+               and other.index == self.index
+
+    def __hash__(self):
+        return hash((id(self.world), targetId(self.index)))
+
+
+# Everything a projectile can hit, plus the size of the play area
+#
+# Shapes are stored column by column in typed arrays (obstacleTop,
+# obstacleBottom, ..., targetX, targetY, ...), one entry per shape ever
+# added, with alive flags for the ones not yet destroyed. Obstacle and Target
+# views are made for shapes when they are asked for. Whatever is drawn for a
+# shape (its sprites) is kept by index alongside, the arrays are the level.
+#
+# Shapes are also kept in a CollisionGrid, by id (see targetId and
+# obstacleId), so finding what is at a point only tests nearby shapes.
+#
+# obstacles are (top, bottom, left, right) or (top, bottom, left, right,
+# grade) and targets are (x, y, radius).
+class World:
+
+    def __init__(self, width, height, obstacles=None, targets=None):
+        self.width = width
+        self.height = height
+        self.obstacleTop = array.array("d")
+        self.obstacleBottom = array.array("d")
+        self.obstacleLeft = array.array("d")
+        self.obstacleRight = array.array("d")
+        self.obstacleGrade = array.array("B")
+        self.obstacleAlive = bytearray()
+        self.obstacleSprites = []
+        self.targetX = array.array("d")
+        self.targetY = array.array("d")
+        self.targetRadius = array.array("d")
+        self.targetAlive = bytearray()
+        self.targetSprites = []
+        self.grid = spatialIndex.CollisionGrid()
+        self.version = 0 # Changes whenever a shape is added or damaged
+        for target in targets or []:
+            self.addTarget(*target)
+        for obstacle in obstacles or []:
+            self.addObstacle(*obstacle)
+
+    # Adds an obstacle on top of those already added and returns its view
+    # Obstacles added last (drawn on top) take priority over those below
+    # sprites is a list of what is drawn for each grade, bottom first
+    def addObstacle(self, top, bottom, left, right, grade=1, sprites=None):
+        index = len(self.obstacleTop)
+        self.obstacleTop.append(top)
+        self.obstacleBottom.append(bottom)
+        self.obstacleLeft.append(left)
+        self.obstacleRight.append(right)
+        self.obstacleGrade.append(grade)
+        self.obstacleAlive.append(1)
+        self.obstacleSprites.append(sprites)
+        self.grid.add(obstacleId(index), (top, bottom, left, right))
+        self.version = self.version + 1
+        return Obstacle(self, index)
+
+    # Adds a target and returns its view
+    # Targets take priority over obstacles, and earlier targets over later
+    def addTarget(self, x, y, radius, sprite=None):
+        index = len(self.targetX)
+        self.targetX.append(x)
+        self.targetY.append(y)
+        self.targetRadius.append(radius)
+        self.targetAlive.append(1)
+        self.targetSprites.append(sprite)
+        self.grid.add(targetId(index), (y - radius, y + radius, x - radius, x + radius))
+        self.version = self.version + 1
+        return Target(self, index)
+
+    # Views of the obstacles not yet destroyed, in the order they were added
+    @property
+    def obstacles(self):
+        alive = self.obstacleAlive
+        return [Obstacle(self, i) for i in range(len(alive)) if alive[i]]
+
+    # Views of the targets not yet destroyed, in the order they were added
+    @property
+    def targets(self):
+        alive = self.targetAlive
+        return [Target(self, i) for i in range(len(alive)) if alive[i]]
+
+    def obstacleContains(self, i, x, y):
+        return x >= self.obstacleLeft[i] and x <= self.obstacleRight[i] \
+        and y >= self.obstacleTop[i] and y <= self.obstacleBottom[i]
+
+    def targetContains(self, i, x, y):
+        return (x - self.targetX[i]) ** 2 + (y - self.targetY[i]) ** 2 \
+               <= self.targetRadius[i] ** 2
+
+    # Finds the shape at x,y, using the same priority order as the grid
+    def collisionAt(self, x, y):
+        for shapeId in self.grid.candidates(x, y):
+            if shapeId >= MAX_SHAPES:
+                i = LAST_ID - shapeId
+                if x >= self.obstacleLeft[i] and x <= self.obstacleRight[i] \
+                and y >= self.obstacleTop[i] and y <= self.obstacleBottom[i]:
+                    return Obstacle(self, i)
+            elif (x - self.targetX[shapeId]) ** 2 + (y - self.targetY[shapeId]) ** 2 \
+                 <= self.targetRadius[shapeId] ** 2:
+                return Target(self, shapeId)
+        return None
+
+    # Views of every shape whose grid cells overlap a box, in priority order
+    def shapesInBox(self, top, bottom, left, right):
+        return [self.shape(shapeId)
+                for shapeId in self.grid.idsInBox(top, bottom, left, right)]
+
+    # View of the shape with a grid id
+    def shape(self, shapeId):
+        if shapeId >= MAX_SHAPES:
+            return Obstacle(self, LAST_ID - shapeId)
+        return Target(self, shapeId)
+
+    # Whether the point x,y has left the play area
+    # (the top is open so projectiles can fly above the window)
+    def outOfBounds(self, x, y):
+        return x >= self.width or x <= 0 or y >= self.height
+
+    # Hits a shape: a target is destroyed, an obstacle loses one grade and
+    # is destroyed when none are left. Returns True if it was destroyed.
+    def damage(self, shape):
+        i = shape.index
+        self.version = self.version + 1
+        if type(shape) == Target:
+            self.targetAlive[i] = 0
+            self.grid.remove(targetId(i), shape.getBounds())
+            return True
+        self.obstacleGrade[i] = self.obstacleGrade[i] - 1
+        if self.obstacleGrade[i] > 0:
+            return False
+        self.obstacleAlive[i] = 0
+        self.grid.remove(obstacleId(i), shape.getBounds())
+        return True
+
+    # Everything drawn for the shapes not yet destroyed
+    def sprites(self):
+        drawn = []
+        for i in range(len(self.obstacleAlive)):
+            if self.obstacleAlive[i] and self.obstacleSprites[i]:
+                drawn.extend(self.obstacleSprites[i])
+        for i in range(len(self.targetAlive)):
+            if self.targetAlive[i] and self.targetSprites[i] is not None:
+                drawn.append(self.targetSprites[i])
+        return drawn
+
+    # Returns an independent copy of the level, so shots can be tried
+    # without changing the original (sprites are left out)
+    def copy(self):
+        world = World(self.width, self.height)
+        for i in range(len(self.targetAlive)):
+            if self.targetAlive[i]:
+                world.addTarget(self.targetX[i], self.targetY[i],
+                                self.targetRadius[i])
+        for i in range(len(self.obstacleAlive)):
+            if self.obstacleAlive[i]:
+                world.addObstacle(self.obstacleTop[i], self.obstacleBottom[i],
+                                  self.obstacleLeft[i], self.obstacleRight[i],
+                                  self.obstacleGrade[i])
+        return world
+
+
+
+################################################################################
+# Shot simulation
+################################################################################
+
+# The state of a projectile in flight
+# Motion is simulated as a series of arcs that restart at each collision,
+# moved along by the shot's integrator (ANALYTIC, SUVAT, unless given). t is
+# the number of ticks since the current arc started.
+class Shot:
+
+    def __init__(self, startX, startY, clickX, clickY, physicsConstants,
+                 integrator=None):
+
+        # Load constants (tps only matters when drawing)
+        tps, forceMetric, friction, elasticity, g = physicsConstants
+        self.friction = friction
+        self.elasticity = elasticity
+        self.g = g
+        self.integrator = integrator or ANALYTIC
+
+        # Start velocity
+        self.Ux = abs(clickX - startX) * forceMetric
+        self.Uy = abs(clickY - startY) * forceMetric
+        # If released above catapult, shoot downwards
+        if clickY < startY:
+            self.Uy = -self.Uy
+
+        # Start of the current arc
+        self.startX = startX
+        self.startY = startY
+        self.t = 0
+
+        # Current and previous positions
+        self.x = startX
+        self.y = startY
+        self.previousX = startX
+        self.previousY = startY
+
+        self.canBreak = True # Ability to damage/destroy obstacles
+        self.stopped = False # Projectile has come to rest
+        self.ticks = 0
+        self.bounces = 0
+        self.hitTargets = []
+        self.destroyedObstacles = [] # One entry per grade broken
+        self.damaged = None # Shape damaged by the last tick, if any
+
+
+# The outcome of a complete shot
+class ShotResult:
+
+    def __init__(self, shot, outOfBounds):
+        self.hitTargets = shot.hitTargets
+        self.destroyedObstacles = shot.destroyedObstacles
+        self.ticks = shot.ticks
+        self.bounces = shot.bounces
+        self.stopped = shot.stopped
+        self.outOfBounds = outOfBounds
+        self.finalX = shot.x
+        self.finalY = shot.y
+
+
+# Calculates the velocity of a SUVAT arc at tick t (in the same units as
+# Ux, Uy)
+def arcVelocity(shot, t):
+    return shot.Ux, shot.Uy + -shot.g * t
+
+
+# Advances a shot by one tick, bouncing off and destroying whatever it hits
+# Returns the shape collided with this tick, or None
+def stepShot(world, shot):
+    moveShot(shot)
+
+    # Check if new position will put the projectile inside any objects
+    collided = world.collisionAt(shot.x, shot.y)
+    if collided is not None:
+        hitShape(world, shot, collided)
+    return collided
+
+
+# Moves a shot on by one tick along its arc
+def moveShot(shot):
+    shot.previousX = shot.x
+    shot.previousY = shot.y
+    shot.damaged = None
+    shot.integrator.move(shot)
+    shot.t = shot.t + 1
+    shot.ticks = shot.ticks + 1
+
+
+# Bounces a shot off the shape it has moved into, damaging the shape
+# A shape already destroyed (by another shot this tick) is only bounced off
+def hitShape(world, shot, collided):
+
+    # Determine direction of collision
+    # Both may be true if moving diagonally
+    sideImpact = collided.contains(shot.x, shot.previousY)
+    verticalImpact = collided.contains(shot.previousX, shot.y)
+    bounce(shot, sideImpact, verticalImpact)
+
+    # Interact with object hit
+    if not collided.alive:
+        pass
+    elif type(collided) == Target: # If target then destroy
+        world.damage(collided)
+        shot.hitTargets.append(collided)
+        shot.damaged = collided
+    elif shot.canBreak:          # Otherwise try to damage obstacle
+        world.damage(collided)
+        shot.destroyedObstacles.append(collided)
+        shot.damaged = collided
+
+    # End simulation if no movement
+    if shot.Ux ** 2 < MIN_VELOCITY and shot.Uy ** 2 < MIN_VELOCITY:
+        shot.stopped = True
+        return
+
+    # Prepare for new arc
+    shot.t = 1
+    shot.startX = shot.previousX
+    shot.startY = shot.previousY
+    shot.canBreak = False # Can only break on first collision
+
+
+# Updates the velocity of a shot after an impact
+def bounce(shot, sideImpact, verticalImpact):
+    Ux, Uy = shot.integrator.velocity(shot)
+    if sideImpact:
+        shot.Ux = Ux * -shot.elasticity   # Bounce sideways
+    else:
+        shot.Ux = Ux * (1-shot.friction)  # Apply friction
+
+    if verticalImpact:
+        shot.Uy = Uy * -shot.elasticity   # Bounce vertically
+    else:
+        shot.Uy = Uy * (1-shot.friction)  # Apply friction
+    shot.bounces = shot.bounces + 1
+
+
+# Whether a shot has finished (stopped or left the play area)
+def shotFinished(world, shot):
+    return shot.stopped or world.outOfBounds(shot.x, shot.y)
+
+
+
+################################################################################
+# Integrators
+#
+# An integrator moves a shot on by one tick between collisions (move) and
+# gives its velocity for bouncing (velocity), in the same units as Shot.Ux
+# and Uy: PIXELS_PER_METER times pixels per tick, with y upwards. Every
+# integrator leaves a new shot at the catapult for its first tick, as the
+# game always has, and starts a new arc from the shot's previous position
+# after a collision (startX, startY, with t set to 1).
+################################################################################
+
+# The game's integrator: each arc is the exact SUVAT parabola from where it
+# started, so the position is exact however long the arc, and a tick costs
+# the same however fast the shot is going. Can't model air.
+#
+# The velocity used for bouncing is the arc's one tick on from the shot's
+# position (t has already been moved on), which is how the game has always
+# bounced.
+class Analytic:
+    name = "analytic"
+
+    def move(self, shot):
+        t = shot.t
+        Sx = shot.Ux * t
+        Sy = shot.Uy * t + 0.5 * -shot.g * t ** 2
+        shot.y = shot.startY - Sy / PIXELS_PER_METER
+        shot.x = shot.startX + Sx / PIXELS_PER_METER
+
+    def velocity(self, shot):
+        return arcVelocity(shot, shot.t)
+
+
+# Integrators that step the velocity and position through time, so any
+# forces can act: gravity, plus quadratic air drag towards the wind's
+# velocity
+#
+# drag is the fraction of the speed relative to the air lost per pixel
+# travelled through it, and wind is the air's velocity (windX, windY) in the
+# same units as the shot's. Ux and Uy are the shot's velocity now rather
+# than at the start of the arc.
+#
+# Each tick is split into substeps, chosen afresh every tick from how fast
+# the shot is going: enough that no substep moves more than maxStep pixels
+# (if given), and that drag never takes more than half the relative speed
+# in one substep, up to maxSubsteps. So accuracy costs time only where the
+# shot is fast. Collisions are still found once per tick.
+#
+# Each kind defines step(shot, x, y, Ux, Uy, h, substeps), which takes
+# substeps steps of h ticks from x,y moving at Ux,Uy and returns the new
+# (x, y, Ux, Uy).
+class SteppedIntegrator:
+    name = None
+
+    def __init__(self, drag=0, wind=(0, 0), maxStep=None, maxSubsteps=64):
+        self.drag = drag
+        self.windX, self.windY = wind
+        self.maxStep = maxStep
+        self.maxSubsteps = maxSubsteps
+
+    # Acceleration (per tick) of a shot moving at Ux, Uy
+    def acceleration(self, shot, Ux, Uy):
+        if not self.drag:
+            return 0, -shot.g
+        airX = Ux - self.windX
+        airY = Uy - self.windY
+        slowing = self.drag * math.sqrt(airX ** 2 + airY ** 2) / PIXELS_PER_METER
+        return -slowing * airX, -shot.g - slowing * airY
+
+    # Substeps to split the next tick of a shot into
+    def substeps(self, shot):
+        Ux = shot.Ux
+        Uy = shot.Uy
+        substeps = 1
+        if self.maxStep:
+            speed = math.sqrt(Ux ** 2 + Uy ** 2) / PIXELS_PER_METER
+            substeps = math.ceil(speed / self.maxStep)
+        if self.drag:
+            air = math.sqrt((Ux - self.windX) ** 2 + (Uy - self.windY) ** 2)
+            substeps = max(substeps, math.ceil(2 * self.drag * air / PIXELS_PER_METER))
+        return min(max(substeps, 1), self.maxSubsteps)
+
+    def move(self, shot):
+        if shot.t == 0:
+            shot.x = shot.startX
+            shot.y = shot.startY
+            return
+        if shot.t == 1:
+            # New arc, from where it starts rather than where it collided
+            x = shot.startX
+            y = shot.startY
+        else:
+            x = shot.x
+            y = shot.y
+        substeps = self.substeps(shot)
+        shot.x, shot.y, shot.Ux, shot.Uy = self.step(shot, x, y, shot.Ux, shot.Uy,
+                                                     1 / substeps, substeps)
+
+    def velocity(self, shot):
+        return shot.Ux, shot.Uy
+
+
+# Semi-implicit (symplectic) Euler: the velocity is moved on first and the
+# position with the new velocity. One force evaluation per substep, and
+# without drag the arc's energy doesn't drift, but positions are off by
+# about half a substep's fall.
+class SemiImplicitEuler(SteppedIntegrator):
+    name = "euler"
+
+    def step(self, shot, x, y, Ux, Uy, h, substeps):
+        scale = h / PIXELS_PER_METER
+        for i in range(substeps):
+            ax, ay = self.acceleration(shot, Ux, Uy)
+            Ux = Ux + ax * h
+            Uy = Uy + ay * h
+            x = x + Ux * scale
+            y = y - Uy * scale
+        return x, y, Ux, Uy
+
+
+# Velocity Verlet: the position is moved with the acceleration at the start
+# of the substep, the velocity with the average of it and the acceleration
+# at the end (found from a predicted velocity, as drag depends on it). Two
+# force evaluations per substep, exact under gravity alone.
+class VelocityVerlet(SteppedIntegrator):
+    name = "verlet"
+
+    def step(self, shot, x, y, Ux, Uy, h, substeps):
+        scale = h / PIXELS_PER_METER
+        for i in range(substeps):
+            ax, ay = self.acceleration(shot, Ux, Uy)
+            x = x + (Ux + 0.5 * ax * h) * scale
+            y = y - (Uy + 0.5 * ay * h) * scale
+            nextX, nextY = self.acceleration(shot, Ux + ax * h, Uy + ay * h)
+            Ux = Ux + 0.5 * (ax + nextX) * h
+            Uy = Uy + 0.5 * (ay + nextY) * h
+        return x, y, Ux, Uy
+
+
+ANALYTIC = Analytic() # The game's integrator
+INTEGRATORS = {"analytic": Analytic, "euler": SemiImplicitEuler,
+               "verlet": VelocityVerlet}
+
+
+# Makes an integrator by name (see INTEGRATORS), with air drag and wind and
+# a substep length for those that step
+def makeIntegrator(name, drag=0, wind=(0, 0), maxStep=None):
+    if name not in INTEGRATORS:
+        raise ValueError("Unknown integrator %r" % name)
+    if name == "analytic":
+        if drag:
+            raise ValueError("The analytic integrator can't model air drag")
+        return ANALYTIC
+    return INTEGRATORS[name](drag, wind, maxStep)
+
+
+
+################################################################################
+# Several shots at once
+################################################################################
+
+# Advances several shots in flight together by one tick
+# Every shot moves and finds what it hit in the level as it was at the start
+# of the tick, then the hits are applied in shot order. So when two shots hit
+# the same shape in one tick, both bounce off it, a target is destroyed by
+# the first (and counted for it only) and an obstacle loses a grade for each
+# shot still able to break it until it is destroyed. Projectiles that touch
+# then bounce off each other (see collideShots).
+# Finished shots are left alone. Returns the shots still in flight after the
+# tick, to pass in next time.
+# recorder, if given (see metrics.Recorder), is told how long each collision
+# query took and how many shapes it tested.
+def stepShots(world, shots, recorder=None):
+    moving = [shot for shot in shots if not shotFinished(world, shot)]
+    hits = []
+    free = [] # Shots that didn't hit a shape, so can hit each other
+    for shot in moving:
+        moveShot(shot)
+        if recorder:
+            started = time.perf_counter()
+            collided = world.collisionAt(shot.x, shot.y)
+            recorder.query(time.perf_counter() - started,
+                           world.grid.candidateCount(shot.x, shot.y))
+        else:
+            collided = world.collisionAt(shot.x, shot.y)
+        if collided is None:
+            free.append(shot)
+        else:
+            hits.append((shot, collided))
+    for shot, collided in hits:
+        hitShape(world, shot, collided)
+    if len(free) > 1:
+        collideShots(free)
+    return [shot for shot in moving if not shotFinished(world, shot)]
+
+
+# Bounces apart any projectiles that touched during the tick and are moving
+# together. Each pair is tested at its closest over the tick, so fast
+# projectiles can't pass through each other between ticks. Only pairs whose
+# paths over the tick have overlapping bounding boxes are tested (found with
+# spatialIndex.overlappingPairs). Projectiles weigh the same, so the parts
+# of their velocities along the line between them are swapped (then scaled
+# by elasticity, for the loss in the impact).
+def collideShots(shots):
+    radius = PROJECTILE_RADIUS
+    paths = [(min(shot.previousY, shot.y) - radius, max(shot.previousY, shot.y) + radius,
+              min(shot.previousX, shot.x) - radius, max(shot.previousX, shot.x) + radius)
+             for shot in shots]
+    # Shots on arcs that started at the same place and time (e.g. a burst
+    # that hasn't hit anything yet) only move apart, so aren't compared
+    arcs = [(shot.startX, shot.startY, shot.t) for shot in shots]
+    contact = 2 * radius
+    for i, j in spatialIndex.overlappingPairs(paths, 2 * contact, arcs):
+        a = shots[i]
+        b = shots[j]
+
+        # Closest the two got over the tick
+        startX = b.previousX - a.previousX
+        startY = b.previousY - a.previousY
+        moveX = (b.x - a.x) - startX
+        moveY = (b.y - a.y) - startY
+        length = moveX ** 2 + moveY ** 2
+        s = 1
+        if length > 0:
+            s = min(max(-(startX * moveX + startY * moveY) / length, 0), 1)
+        dx = startX + moveX * s
+        dy = startY + moveY * s
+        separation = math.sqrt(dx ** 2 + dy ** 2)
+        if separation >= contact:
+            continue
+        if separation == 0:
+            # Met head on, so push apart along the way they came together
+            dx = startX
+            dy = startY
+            separation = math.sqrt(dx ** 2 + dy ** 2)
+            if separation == 0:
+                continue
+        nx = dx / separation
+        ny = dy / separation
+
+        # Velocities in window coordinates (y down)
+        aUx, aUy = a.integrator.velocity(a)
+        bUx, bUy = b.integrator.velocity(b)
+        aNormal = aUx * nx - aUy * ny
+        bNormal = bUx * nx - bUy * ny
+        if aNormal <= bNormal:
+            continue # Already moving apart
+
+        change = (bNormal - aNormal) * (1 + a.elasticity) / 2
+        restartArc(a, aUx + change * nx, aUy - change * ny)
+        restartArc(b, bUx - change * nx, bUy + change * ny)
+
+
+# Moves a shot back to its previous position and starts a new arc from
+# there with velocity Ux, Uy, as after bouncing off another projectile
+def restartArc(shot, Ux, Uy):
+    shot.x = shot.previousX
+    shot.y = shot.previousY
+    shot.Ux = Ux
+    shot.Uy = Uy
+    shot.bounces = shot.bounces + 1
+    if Ux ** 2 < MIN_VELOCITY and Uy ** 2 < MIN_VELOCITY:
+        shot.stopped = True
+        return
+    shot.t = 1
+    shot.startX = shot.x
+    shot.startY = shot.y
+
+
+# Click positions for a burst of projectiles fired by one click
+# The launch is turned by BURST_SPREAD degrees (or spread) between each
+# projectile, evenly either side of the click. A burst of one is the click.
+def burstClicks(startX, startY, clickX, clickY, number, spread=BURST_SPREAD):
+    if number == 1:
+        return [(clickX, clickY)]
+    dx = clickX - startX
+    dy = clickY - startY
+    clicks = []
+    for i in range(number):
+        angle = math.radians((i - (number - 1) / 2) * spread)
+        clicks.append((startX + dx * math.cos(angle) - dy * math.sin(angle),
+                       startY + dx * math.sin(angle) + dy * math.cos(angle)))
+    return clicks
+
+
+# Simulates several shots fired together as fast as possible
+# Takes a list of clicks as (x, y) and returns a ShotResult for each, like
+# runShot. maxTicks limits how long the shots are simulated for in all.
+def runShots(world, startX, startY, clicks, physicsConstants, maxTicks=None,
+             integrator=None):
+    shots = [Shot(startX, startY, clickX, clickY, physicsConstants, integrator)
+             for clickX, clickY in clicks]
+    moving = shots
+    ticks = 0
+    while moving:
+        if maxTicks is not None and ticks >= maxTicks:
+            break
+        moving = stepShots(world, moving)
+        ticks = ticks + 1
+    return [ShotResult(shot, world.outOfBounds(shot.x, shot.y)) for shot in shots]
+
+
+# The path a shot would take up to the first thing it hits (or until it
+# leaves the play area, or maxTicks), as a list of (x, y) for each tick
+# from the start. The world is not changed.
+def arcToImpact(world, startX, startY, clickX, clickY, physicsConstants,
+                maxTicks=None, integrator=None):
+    shot = Shot(startX, startY, clickX, clickY, physicsConstants, integrator)
+    path = [(shot.x, shot.y)]
+    while maxTicks is None or shot.ticks < maxTicks:
+        moveShot(shot)
+        path.append((shot.x, shot.y))
+        if world.outOfBounds(shot.x, shot.y) \
+        or world.collisionAt(shot.x, shot.y) is not None:
+            break
+    return path
+
+
+# Simulates a whole shot as fast as possible and returns the result
+# The world is changed by the shot, pass world.copy() to keep the original
+# maxTicks guards against projectiles that never settle (e.g. elasticity 1)
+# integrator moves the shot between collisions (see Integrators), SUVAT arcs
+# by default
+def runShot(world, startX, startY, clickX, clickY, physicsConstants,
+            maxTicks=None, integrator=None):
+    shot = Shot(startX, startY, clickX, clickY, physicsConstants, integrator)
+    while not shotFinished(world, shot):
+        if maxTicks is not None and shot.ticks >= maxTicks:
+            break
+        stepShot(world, shot)
+    return ShotResult(shot, world.outOfBounds(shot.x, shot.y))
@@ -0,0 +1,64 @@
+import math
+
+# Geometry
+#
+# Points, rectangle bounds and distances, for code that works out where
+# things are without drawing them. Nothing here uses Tk, so importing it
+# is instant and works without a display. graphics.Point is a Point that
+# can also be drawn, and the functions here take either.
+
+
+
+# A point at x,y
+class Point:
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def getX(self):
+        return self.x
+
+    def getY(self):
+        return self.y
+
+    def clone(self):
+        return Point(self.x, self.y)
+
+    def move(self, dx, dy):
+        self.x = self.x + dx
+        self.y = self.y + dy
+
+
+# The bounds of the rectangle with opposite corners p1 and p2, as
+# (top, bottom, left, right)
+def bounds(p1, p2):
+    x1 = p1.getX()
+    x2 = p2.getX()
+    y1 = p1.getY()
+    y2 = p2.getY()
+    if x1 < x2:
+        left, right = x1, x2
+    else:
+        left, right = x2, x1
+    if y1 < y2:
+        top, bottom = y1, y2
+    else:
+        top, bottom = y2, y1
+    return top, bottom, left, right
+
+
+# Calculates the distance between two points
+def distance(p1, p2):
+    # Pythagoras theorem
+    return math.sqrt((p2.getX() - p1.getX()) ** 2 + (p2.getY() - p1.getY()) ** 2)
+
+
+# Calculates the absolute horizontal distance between two points
+def horizontalDistance(p1, p2):
+    return abs(p2.getX() - p1.getX())
+
+
+# Calculates the absolute vertical distance between two points
+def verticalDistance(p1, p2):
+    return abs(p2.getY() - p1.getY())
@@ -153,12 +153,19 @@ __version__ = "4.3"
 #     Added ability to set text atttributes.
 #     Added Entry boxes.
 
-import time, os, sys
+import os
+from contextlib import contextmanager
+import geometry
 
 try:  # import as appropriate for 2.x vs. 3.x
    import tkinter as tk
-except:
-   import Tkinter as tk
+except ImportError:
+   try:
+      import Tkinter as tk
+   except ImportError:
+      # No Tk (e.g. a build machine without python3-tk): shapes can still be
+      # drawn off-screen (see raster.py), but GraphWins can't be made
+      tk = None
 
 
 ##########################################################################
@@ -173,39 +180,63 @@ UNSUPPORTED_METHOD = "Object doesn't support operation"
 BAD_OPTION = "Illegal option value"
 DEAD_THREAD = "Graphics thread quit unexpectedly"
 
-_root = tk.Tk()
-_root.withdraw()
+# Tk's root window, hidden, made when it is first needed (e.g. by the
+# first GraphWin) so importing the module doesn't start Tk
+_root = None
+
+def _tkRoot():
+    global _root
+    if tk is None:
+        raise GraphicsError("Tk is not installed, so windows can't be opened")
+    if _root is None:
+        _root = tk.Tk()
+        _root.withdraw()
+    return _root
 
 def update():
-    _root.update()
+    if _root is not None:
+        _root.update()
 
 ############################################################################
 # Graphics classes start here
-        
-class GraphWin(tk.Canvas):
+
+# What a GraphWin is drawn with, a plain object when there is no Tk
+_Canvas = tk.Canvas if tk is not None else object
+
+class GraphWin(_Canvas):
 
     """A GraphWin is a toplevel window for displaying graphics."""
 
     def __init__(self, title="Graphics Window",
                  width=200, height=200, autoflush=True):
-        master = tk.Toplevel(_root)
+        root = _tkRoot() # Before touching tk, which may not be there
+        master = tk.Toplevel(root)
         master.protocol("WM_DELETE_WINDOW", self.close)
         tk.Canvas.__init__(self, master, width=width, height=height)
         self.master.title(title)
         self.pack()
         master.resizable(0,0)
         self.foreground = "black"
-        self.items = []
+        self.items = {} # Drawn objects by canvas id, in drawing (z) order
         self.mouseX = None
         self.mouseY = None
         self.bind("<Button-1>", self._onClick)
+        self.bind("<Motion>", self._onMotion)
         self.bind_all("<Key>", self._onKey)
         self.height = height
         self.width = width
         self.autoflush = autoflush
         self._mouseCallback = None
+        self._keyCallback = None
+        self._motionCallback = None
+        # Changed on every click, key press and close, for waiting on input
+        # in the Tk event loop (see _waitForInput)
+        self._inputEvents = tk.IntVar(_root, 0)
         self.trans = None
         self.closed = False
+        self._batch = None # Queued canvas commands while batching
+        self._pending = []
+        self.tk.eval(_BATCH_PROC)
         master.lift()
         self.lastKey = ""
         if autoflush: _root.update()
@@ -216,6 +247,18 @@ class GraphWin(tk.Canvas):
 
     def _onKey(self, evnt):
         self.lastKey = evnt.keysym
+        self._inputEvent()
+        if self._keyCallback:
+            self._keyCallback(evnt.keysym)
+
+    def _inputEvent(self):
+        self._inputEvents.set(self._inputEvents.get() + 1)
+
+    def _waitForInput(self):
+        # Runs the Tk event loop (so the window is redrawn and timers set
+        # with after() go off) until the next click, key press or close.
+        # Tk sleeps until something happens, rather than polling.
+        self.wait_variable(self._inputEvents)
 
 
     def setBackground(self, color):
@@ -235,6 +278,7 @@ class GraphWin(tk.Canvas):
 
         if self.closed: return
         self.closed = True
+        self._inputEvent() # Wake up anything waiting for input
         self.master.destroy()
         self.__autoflush()
 
@@ -270,17 +314,108 @@ class GraphWin(tk.Canvas):
         """Update drawing to the window"""
         self.__checkOpen()
         self.update_idletasks()
+
+    @contextmanager
+    def batch(self):
+        """Context manager that batches drawing. Inside a with
+        win.batch(): block, creating, deleting, moving and reconfiguring
+        canvas items is queued, then sent to Tk in one call when the
+        block ends, followed by a single flush if autoflush is on.
+        Other canvas methods used inside the block (e.g. coords) see the
+        canvas as it was when the block started. Batches can be nested,
+        the outermost one sends everything."""
+        if self._batch is not None:
+            yield
+            return
+        self._batch = []
+        autoflush = self.autoflush
+        self.autoflush = False
+        try:
+            yield
+        finally:
+            try:
+                self._runBatch()
+            finally:
+                self._batch = None
+                self.autoflush = autoflush
+            if autoflush:
+                _root.update()
+
+    def _runBatch(self):
+        # Runs the queued commands in Tk (see _BATCH_PROC) and gives items
+        # created by them their real canvas ids
+        commands = self._batch
+        pending = self._pending
+        if not commands:
+            return
+        self._batch = []
+        self._pending = []
+        ids = self.tk.splitlist(self.tk.call("::graphicsBatch", commands))
+        for p, itemId in zip(pending, ids):
+            # Re-key in creation order, so items stay in z-order
+            item = self.items.pop(p, None)
+            if item is not None:
+                if item.id is p:
+                    item.id = self.tk.getint(itemId)
+                self.items[item.id] = item
+
+    def _queue(self, command, tagOrId):
+        # Queues a canvas command for an item, which may be one created
+        # earlier in the batch
+        if type(tagOrId) is _PendingId:
+            self._batch.append(("p", tagOrId.index, self._w) + command)
+        else:
+            self._batch.append(("", self._w, command[0], tagOrId) + command[1:])
+
+    # Canvas methods used by GraphicsObjects, queued while batching
+
+    def _create(self, itemType, args, kw):
+        if self._batch is None:
+            return tk.Canvas._create(self, itemType, args, kw)
+        args = tk._flatten(args)
+        cnf = args[-1]
+        if isinstance(cnf, (dict, tuple)):
+            args = args[:-1]
+        else:
+            cnf = {}
+        itemId = _PendingId(len(self._pending))
+        self._pending.append(itemId)
+        self._batch.append(("c", self._w, "create", itemType)
+                           + args + self._options(cnf, kw))
+        return itemId
+
+    def delete(self, *args):
+        if self._batch is None:
+            return tk.Canvas.delete(self, *args)
+        for tagOrId in args:
+            self._queue(("delete",), tagOrId)
+
+    def move(self, *args):
+        if self._batch is None or len(args) != 3:
+            return tk.Canvas.move(self, *args)
+        self._queue(("move",) + args[1:], args[0])
+
+    def itemconfigure(self, tagOrId, cnf=None, **kw):
+        if self._batch is not None:
+            if cnf is None and not kw:
+                self._runBatch() # A query, so it needs the canvas up to date
+            else:
+                self._queue(("itemconfigure",) + self._options(cnf, kw), tagOrId)
+                return
+        return tk.Canvas.itemconfigure(self, tagOrId, cnf, **kw)
+
+    itemconfig = itemconfigure
         
     def getMouse(self):
         """Wait for mouse click and return Point object representing
-        the click"""
+        the click. Tk events (including after() timers) are handled
+        while waiting, and the click is returned as soon as it arrives."""
         self.update()      # flush any prior clicks
         self.mouseX = None
         self.mouseY = None
         while self.mouseX == None or self.mouseY == None:
-            self.update()
             if self.isClosed(): raise GraphicsError("getMouse in closed window")
-            time.sleep(.1) # give up thread
+            self._waitForInput()
         x,y = self.toWorld(self.mouseX, self.mouseY)
         self.mouseX = None
         self.mouseY = None
@@ -301,12 +436,12 @@ class GraphWin(tk.Canvas):
             return None
 
     def getKey(self):
-        """Wait for user to press a key and return it as a string."""
+        """Wait for user to press a key and return it as a string.
+        Tk events are handled while waiting, like getMouse."""
         self.lastKey = ""
         while self.lastKey == "":
-            self.update()
             if self.isClosed(): raise GraphicsError("getKey in closed window")
-            time.sleep(.1) # give up thread
+            self._waitForInput()
 
         key = self.lastKey
         self.lastKey = ""
@@ -344,27 +479,78 @@ class GraphWin(tk.Canvas):
             return x,y
         
     def setMouseHandler(self, func):
+        """Call func with a Point (in screen coordinates) on every click,
+        as it happens, or stop if func is None"""
         self._mouseCallback = func
+
+    def setMotionHandler(self, func):
+        """Call func with a Point (in screen coordinates) every time the
+        mouse moves over the window, or stop if func is None"""
+        self._motionCallback = func
+
+    def setKeyHandler(self, func):
+        """Call func with the key (as getKey returns it) on every key
+        press, as it happens, or stop if func is None"""
+        self._keyCallback = func
         
+    def _onMotion(self, e):
+        if self._motionCallback:
+            self._motionCallback(Point(e.x, e.y))
+
     def _onClick(self, e):
         self.mouseX = e.x
         self.mouseY = e.y
+        self._inputEvent()
         if self._mouseCallback:
             self._mouseCallback(Point(e.x, e.y))
 
     def addItem(self, item):
-        self.items.append(item)
+        self.items[item.id] = item
 
     def delItem(self, item):
-        self.items.remove(item)
+        del self.items[item.id]
 
     def redraw(self):
-        for item in self.items[:]:
+        for item in list(self.items.values()):
             item.undraw()
             item.draw(self)
         self.update()
         
                       
+class _PendingId:
+
+    """Internal class standing in for the canvas id of an item created
+    in a batch, until the batch is sent to Tk"""
+
+    def __init__(self, index):
+        self.index = index
+
+
+# Runs a batch of canvas commands, each a list starting with a flag:
+#   c      a create command, whose result is the new item's id
+#   p n    a command for the item made by the n-th create of the batch,
+#          e.g. {p 0 .canvas move 1 1} moves it
+#   {}     any other command
+# Returns the ids of the created items
+_BATCH_PROC = """
+proc ::graphicsBatch {commands} {
+    set ids {}
+    foreach command $commands {
+        switch -- [lindex $command 0] {
+            c {lappend ids [{*}[lrange $command 1 end]]}
+            p {
+                set canvas [lindex $command 2]
+                set rest [lassign [lrange $command 3 end] operation]
+                $canvas $operation [lindex $ids [lindex $command 1]] {*}$rest
+            }
+            default {{*}[lrange $command 1 end]}
+        }
+    }
+    return $ids
+}
+"""
+
+
 class Transform:
 
     """Internal class for 2-D coordinate transformations"""
@@ -401,7 +587,8 @@ DEFAULT_CONFIG = {"fill":"",
       "arrow":"none",
       "text":"",
       "justify":"center",
-                  "font": ("helvetica", 12, "normal")}
+                  "font": ("helvetica", 12, "normal"),
+      "state":"normal"}
 
 class GraphicsObject:
 
@@ -512,12 +699,12 @@ class GraphicsObject:
         pass # must override in subclass
 
          
-class Point(GraphicsObject):
+class Point(GraphicsObject, geometry.Point):
+    # A geometry.Point that can be drawn
     def __init__(self, x, y):
         GraphicsObject.__init__(self, ["outline", "fill"])
+        geometry.Point.__init__(self, x, y)
         self.setFill = self.setOutline
-        self.x = x
-        self.y = y
         
     def _draw(self, canvas, options):
         x,y = canvas.toScreen(self.x,self.y)
@@ -531,9 +718,6 @@ class Point(GraphicsObject):
         other = Point(self.x,self.y)
         other.config = self.config.copy()
         return other
-                
-    def getX(self): return self.x
-    def getY(self): return self.y
 
 class _BBox(GraphicsObject):
     # Internal base class for objects represented by bounding box
@@ -662,7 +846,63 @@ class Polygon(GraphicsObject):
             args.append(x)
             args.append(y)
         args.append(options)
-        return GraphWin.create_polygon(*args) 
+        return canvas.create_polygon(*args[1:])
+
+class Polyline(GraphicsObject):
+
+    """A line through a list of points. The points can be changed with
+    setPoints while it is drawn, which moves the one canvas item rather
+    than drawing a new one."""
+
+    def __init__(self, *points):
+        # if points passed as a list, extract it
+        if len(points) == 1 and type(points[0]) == type([]):
+            points = points[0]
+        self.points = list(map(Point.clone, points))
+        GraphicsObject.__init__(self, ["arrow", "fill", "width", "state"])
+        self.setOutline = self.setFill
+
+    def clone(self):
+        other = Polyline(*self.points)
+        other.config = self.config.copy()
+        return other
+
+    def getPoints(self):
+        return list(map(Point.clone, self.points))
+
+    def setPoints(self, points):
+        """Change the points (at least two) the line goes through. The
+        list is kept, not copied, so don't change it afterwards."""
+        self.points = points
+        canvas = self.canvas
+        if canvas and not canvas.isClosed():
+            canvas.coords(self.id, *self._screenCoords(canvas))
+            if canvas.autoflush:
+                _root.update()
+
+    def setHidden(self, hidden):
+        """Hide the line without undrawing it (or show it again)"""
+        self._reconfig("state", "hidden" if hidden else "normal")
+
+    def setArrow(self, option):
+        if not option in ["first","last","both","none"]:
+            raise GraphicsError(BAD_OPTION)
+        self._reconfig("arrow", option)
+
+    def _move(self, dx, dy):
+        for p in self.points:
+            p.move(dx,dy)
+
+    def _screenCoords(self, canvas):
+        coords = []
+        for p in self.points:
+            x,y = canvas.toScreen(p.x,p.y)
+            coords.append(x)
+            coords.append(y)
+        return coords
+
+    def _draw(self, canvas, options):
+        return canvas.create_line(*self._screenCoords(canvas), options)
 
 class Text(GraphicsObject):
     
@@ -727,8 +967,8 @@ class Entry(GraphicsObject):
         self.anchor = p.clone()
         #print self.anchor
         self.width = width
-        self.text = tk.StringVar(_root)
-        self.text.set("")
+        self.text = None # A StringVar, once drawn in a GraphWin
+        self.value = "" # The text until then
         self.fill = "gray"
         self.color = "black"
         self.font = DEFAULT_CONFIG['font']
@@ -737,6 +977,12 @@ class Entry(GraphicsObject):
     def _draw(self, canvas, options):
         p = self.anchor
         x,y = canvas.toScreen(p.x,p.y)
+        if tk is None or not isinstance(canvas, tk.Canvas):
+            # An off-screen window (see raster.py) draws a placeholder
+            return canvas.create_entry(x, y, self.width, self.getText(),
+                                       self.fill, self.color, self.font)
+        if self.text is None:
+            self.text = tk.StringVar(_tkRoot(), self.value)
         frm = tk.Frame(canvas.master)
         self.entry = tk.Entry(frm,
                               width=self.width,
@@ -749,6 +995,8 @@ class Entry(GraphicsObject):
         return canvas.create_window(x,y,window=frm)
 
     def getText(self):
+        if self.text is None:
+            return self.value
         return self.text.get()
 
     def _move(self, dx, dy):
@@ -760,13 +1008,14 @@ class Entry(GraphicsObject):
     def clone(self):
         other = Entry(self.anchor, self.width)
         other.config = self.config.copy()
-        other.text = tk.StringVar()
-        other.text.set(self.text.get())
+        other.setText(self.getText())
         other.fill = self.fill
         return other
 
     def setText(self, t):
-        self.text.set(t)
+        self.value = str(t)
+        if self.text is not None:
+            self.text.set(t)
 
             
     def setFill(self, color):
@@ -818,10 +1067,10 @@ class Image(GraphicsObject):
         self.imageId = Image.idCount
         Image.idCount = Image.idCount + 1
         if len(pixmap) == 1: # file name provided
-            self.img = tk.PhotoImage(file=pixmap[0], master=_root)
+            self.img = tk.PhotoImage(file=pixmap[0], master=_tkRoot())
         else: # width and height provided
             width, height = pixmap
-            self.img = tk.PhotoImage(master=_root, width=width, height=height)
+            self.img = tk.PhotoImage(master=_tkRoot(), width=width, height=height)
                 
     def _draw(self, canvas, options):
         p = self.anchor
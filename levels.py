@@ -0,0 +1,189 @@
+import array
+import mmap
+import random
+import struct
+import sys
+import engine
+import placement
+
+# Level data and level packs
+#
+# A Level is the plain data needed to rebuild a generated level: the window
+# size, each obstacle's bounds and grade (strength), each target's centre and
+# radius, and the seed it was generated from. Levels can be generated
+# without a window, drawn with shapeGen.drawLevel, or turned into an
+# engine.World for headless simulation.
+#
+# Levels are saved in packs, a compact binary file:
+#
+#   header   magic "APLK", version (u16), spare (u16), level count (u64),
+#            index offset (u64)
+#   levels   one record per level, one after another
+#   index    the file offset of each level record (u64 each)
+#
+# A level record is width, height (u16), seed (i64, -1 if none), number of
+# obstacles, number of targets (u16), then each obstacle as top, bottom,
+# left, right (i16) and grade (u8), then each target as x, y (i16) and
+# radius (u16). Everything is little-endian.
+#
+# A pack is opened by memory-mapping the file and reading the header, so
+# opening it costs the same however many levels it holds, and level N is
+# found by reading entry N of the index.
+
+PACK_MAGIC = b"APLK"
+PACK_VERSION = 1
+PACK_HEADER = struct.Struct("<4sHHQQ")
+PACK_INDEX_ENTRY = struct.Struct("<Q")
+LEVEL_HEADER = struct.Struct("<HHqHH")
+OBSTACLE_RECORD = struct.Struct("<hhhhB")
+TARGET_RECORD = struct.Struct("<hhH")
+
+
+
+# The layout of one level
+# obstacles are (top, bottom, left, right, grade), targets are (x, y, radius)
+class Level:
+
+    def __init__(self, width, height, obstacles, targets, seed=None):
+        self.width = width
+        self.height = height
+        self.obstacles = [tuple(obstacle) for obstacle in obstacles]
+        self.targets = [tuple(target) for target in targets]
+        self.seed = seed
+
+    def __eq__(self, other):
+        return isinstance(other, Level) and self.toDict() == other.toDict()
+
+    # Builds a World for the engine
+    def toWorld(self):
+        return engine.World(self.width, self.height, self.obstacles, self.targets)
+
+    # Plain dict version of the level (e.g. for JSON)
+    def toDict(self):
+        return {"width": self.width, "height": self.height, "seed": self.seed,
+                "obstacles": [list(o) for o in self.obstacles],
+                "targets": [list(t) for t in self.targets]}
+
+
+# Rebuilds a level from Level.toDict
+def levelFromDict(data):
+    return Level(data["width"], data["height"], data["obstacles"],
+                 data["targets"], data.get("seed"))
+
+
+# The layout of the shapes in a world not yet destroyed, as a Level
+# The world holds floats, levels hold whole pixels (as level packs store
+# them), so everything is rounded
+def levelFromWorld(world, seed=None):
+    obstacles = [tuple(round(bound) for bound in o.getBounds()) + (o.grade,)
+                 for o in world.obstacles]
+    targets = [(round(t.x), round(t.y), round(t.radius)) for t in world.targets]
+    return Level(round(world.width), round(world.height), obstacles, targets, seed)
+
+
+# Generates a random level, the same seed always gives the same level
+# Raises placement.PlacementError if the shapes don't fit
+def generateLevel(width, height, targetNumber, obstacleNumber,
+                  obstacleDimensionRanges, seed=None):
+    rng = random.Random(seed)
+    space = placement.Occupancy(width, height)
+    obstacles = placement.placeObstacles(space, obstacleNumber,
+                                         obstacleDimensionRanges, width // 5, rng)
+    targets = placement.placeTargets(space, targetNumber, width // 5, rng)
+    return Level(width, height, obstacles, targets, seed)
+
+
+
+################################################################################
+# Level packs
+################################################################################
+
+# Packs a level into its binary record
+def packLevel(level):
+    seed = -1 if level.seed is None else level.seed
+    parts = [LEVEL_HEADER.pack(level.width, level.height, seed,
+                               len(level.obstacles), len(level.targets))]
+    for obstacle in level.obstacles:
+        parts.append(OBSTACLE_RECORD.pack(*obstacle))
+    for target in level.targets:
+        parts.append(TARGET_RECORD.pack(*target))
+    return b"".join(parts)
+
+
+# Unpacks the level record starting at offset in buffer
+def unpackLevel(buffer, offset):
+    width, height, seed, obstacleNumber, targetNumber = \
+        LEVEL_HEADER.unpack_from(buffer, offset)
+    offset = offset + LEVEL_HEADER.size
+    obstacles = [OBSTACLE_RECORD.unpack_from(buffer, offset + i * OBSTACLE_RECORD.size)
+                 for i in range(obstacleNumber)]
+    offset = offset + obstacleNumber * OBSTACLE_RECORD.size
+    targets = [TARGET_RECORD.unpack_from(buffer, offset + i * TARGET_RECORD.size)
+               for i in range(targetNumber)]
+    return Level(width, height, obstacles, targets, None if seed == -1 else seed)
+
+
+# Writes levels (any iterable, e.g. a generator) to a level pack file
+# Returns the number of levels written
+def writeLevelPack(path, levels):
+    offsets = array.array("Q")
+    with open(path, "wb") as file:
+        file.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, 0, 0, 0))
+        position = PACK_HEADER.size
+        for level in levels:
+            record = packLevel(level)
+            offsets.append(position)
+            file.write(record)
+            position = position + len(record)
+
+        # Write the index then fill in the header
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        file.write(offsets.tobytes())
+        file.seek(0)
+        file.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, 0,
+                                    len(offsets), position))
+    return len(offsets)
+
+
+# A level pack opened for reading, levels are only unpacked when asked for
+# Use like a read-only list: len(pack), pack[n], iteration
+class LevelPack:
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, spare, self.count, self.indexOffset = \
+            PACK_HEADER.unpack_from(self.buffer, 0)
+        if magic != PACK_MAGIC:
+            self.close()
+            raise ValueError("%s is not a level pack" % path)
+        if version != PACK_VERSION:
+            self.close()
+            raise ValueError("Unsupported level pack version %d" % version)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, n):
+        if n < 0:
+            n = n + self.count
+        if n < 0 or n >= self.count:
+            raise IndexError("level pack index out of range")
+        offset, = PACK_INDEX_ENTRY.unpack_from(
+            self.buffer, self.indexOffset + n * PACK_INDEX_ENTRY.size)
+        return unpackLevel(self.buffer, offset)
+
+    def __iter__(self):
+        for n in range(self.count):
+            yield self[n]
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
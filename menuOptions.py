@@ -0,0 +1,36 @@
+# The game's menu options
+#
+# Kept out of AngryPythons.pyw, which starts the game as soon as it is run,
+# so tools that play the game headless (e.g. batchRunner) can use the same
+# options without Tk.
+
+# Tuple of the description text for each menu option
+MENU_STRINGS = (
+                "Number of targets",
+                "Number of obstacles",
+                "Ammo",
+                "Ticks per second",
+                "Force multiplier",
+                "Surface friction",
+                "Projectile elasticity",
+                "Gravity",
+                "Min obstacle width",
+                "Max obstacle width",
+                "Min obstacle length",
+                "Max obstacle length",
+                "Projectiles per shot")
+
+# Tuple of default values for each menu option
+MENU_DEFAULTS = (
+                 "3", "10", "10",
+                 "90", "10", "0.15", "0.5", "9.8",
+                 "10", "30", "70", "300",
+                 "1")
+
+# Tuple of a short name for each menu option, for tools
+MENU_NAMES = (
+              "targets", "obstacles", "ammo",
+              "tps", "force", "friction", "elasticity", "gravity",
+              "minObstacleWidth", "maxObstacleWidth",
+              "minObstacleLength", "maxObstacleLength",
+              "projectiles")
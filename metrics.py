@@ -0,0 +1,233 @@
+import atexit
+import json
+import math
+import os
+import time
+import tracemalloc
+
+# Game loop metrics
+#
+# Records where the time goes in each shot, for finding out why frames are
+# dropped on a slow machine:
+#   integration   stepping the projectile (each tick, less the collision query)
+#   collision     finding what the projectile hit (each tick)
+#   render        drawing and flushing to the window (each frame)
+#   sleep         waiting for the next frame (each frame)
+# along with the shapes tested for collision each tick, the canvas items
+# drawn each frame, and the overshoot of each frame: how much later than
+# planned it started. Memory use is sampled with tracemalloc every
+# memoryInterval seconds.
+#
+# Each shot is summarised (count, mean, p50, p99 and max of everything) and
+# appended to the metrics file as one line of JSON, and a summary of the
+# whole session is added when the program exits. The game also adds how
+# long it took to start: to import everything, and to show its first frame.
+#
+# Metrics are off unless enable is called (or ANGRYPYTHONS_METRICS is set
+# to a file name, see enableFromEnvironment). The game only looks at
+# recorder, which is None when they are off, once per shot, so they cost
+# nothing when disabled.
+
+BUCKETS_PER_DECADE = 50 # Histogram resolution, about 5% per bucket
+
+recorder = None # The active Recorder, or None when metrics are off
+
+
+
+# Histogram of positive values in logarithmic buckets, so it takes the same
+# memory however many values are added. Zero and negative values are
+# counted separately.
+class Histogram:
+
+    def __init__(self):
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+        self.total = 0
+        self.maximum = 0
+
+    def add(self, value):
+        self.count = self.count + 1
+        self.total = self.total + value
+        if value > self.maximum:
+            self.maximum = value
+        if value <= 0:
+            self.zeros = self.zeros + 1
+        else:
+            bucket = math.floor(math.log10(value) * BUCKETS_PER_DECADE)
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    # Adds everything in another histogram
+    def merge(self, other):
+        self.count = self.count + other.count
+        self.total = self.total + other.total
+        self.maximum = max(self.maximum, other.maximum)
+        self.zeros = self.zeros + other.zeros
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+
+    # Approximate value below which fraction of the values lie
+    def percentile(self, fraction):
+        if self.count == 0:
+            return 0
+        rank = fraction * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0
+        for bucket in sorted(self.buckets):
+            seen = seen + self.buckets[bucket]
+            if rank < seen:
+                # Middle of the bucket
+                return min(10 ** ((bucket + 0.5) / BUCKETS_PER_DECADE),
+                           self.maximum)
+        return self.maximum
+
+    def summary(self):
+        return {"count": self.count,
+                "mean": self.total / self.count if self.count else 0,
+                "p50": self.percentile(0.5),
+                "p99": self.percentile(0.99),
+                "max": self.maximum}
+
+
+# Collects metrics for one shot at a time, and for the whole session
+class Recorder:
+
+    PHASES = ("integration", "collision", "render", "sleep")
+    COUNTERS = ("collisionTests", "canvasItems", "overshoot")
+
+    def __init__(self, path, memoryInterval=None):
+        self.path = path
+        self.memoryInterval = memoryInterval
+        self.lastMemorySample = None
+        self.session = self.newHistograms()
+        self.shot = None
+        self.shots = 0
+        self.memory = [] # (time, current, peak) for this shot
+        self.memoryPeak = 0
+        self.startedTracing = False
+        if memoryInterval and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.startedTracing = True
+
+    def newHistograms(self):
+        return {name: Histogram() for name in self.PHASES + self.COUNTERS}
+
+    # Called when a shot starts, before the first tick
+    def startShot(self):
+        self.shot = self.newHistograms()
+        self.memory = []
+        self.queryTime = 0
+        self.queryTests = 0
+        self.sampleMemory()
+
+    # Called by engine.stepShots after each collision query, with how long
+    # it took and the shapes it tested
+    def query(self, seconds, tests):
+        self.queryTime = self.queryTime + seconds
+        self.queryTests = self.queryTests + tests
+
+    # Called after each tick with how long the tick took
+    def tick(self, seconds):
+        self.shot["integration"].add(seconds - self.queryTime)
+        self.shot["collision"].add(self.queryTime)
+        self.shot["collisionTests"].add(self.queryTests)
+        self.queryTime = 0
+        self.queryTests = 0
+
+    # Called after each frame with the time spent drawing it (not counting
+    # ticks), the time slept afterwards, how late it started and how many
+    # canvas items are drawn
+    def frame(self, render, sleep, overshoot, canvasItems):
+        self.shot["render"].add(render)
+        self.shot["sleep"].add(sleep)
+        self.shot["overshoot"].add(overshoot)
+        self.shot["canvasItems"].add(canvasItems)
+        self.sampleMemory()
+
+    # Samples memory use with tracemalloc, if it's time to
+    def sampleMemory(self):
+        if not self.memoryInterval:
+            return
+        now = time.monotonic()
+        if self.lastMemorySample is not None \
+        and now - self.lastMemorySample < self.memoryInterval:
+            return
+        self.lastMemorySample = now
+        current, peak = tracemalloc.get_traced_memory()
+        self.memory.append((now, current, peak))
+        self.memoryPeak = max(self.memoryPeak, peak)
+
+    # Called when a shot ends, writes its summary to the metrics file
+    def endShot(self, ticks):
+        self.shots = self.shots + 1
+        record = {"event": "shot", "time": time.time(), "shot": self.shots,
+                  "ticks": ticks}
+        record.update(self.summarise(self.shot))
+        if self.memory:
+            record["memory"] = {"current": self.memory[-1][1],
+                                "peak": max(sample[2] for sample in self.memory)}
+        self.write(record)
+        for name, histogram in self.shot.items():
+            self.session[name].merge(histogram)
+        self.shot = None
+
+    # Called once the game's first frame is on screen, with the seconds
+    # from the program starting to having imported everything and to the
+    # first frame
+    def startup(self, imports, firstFrame):
+        self.write({"event": "startup", "time": time.time(),
+                    "imports": imports, "firstFrame": firstFrame})
+
+    # Called when the program ends, writes a summary of every shot
+    def endSession(self):
+        record = {"event": "session", "time": time.time(), "shots": self.shots}
+        record.update(self.summarise(self.session))
+        if self.memoryInterval and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            record["memory"] = {
+                "current": current, "peak": max(peak, self.memoryPeak),
+                "top": [str(stat) for stat in snapshot.statistics("lineno")[:10]]}
+        self.write(record)
+
+    def summarise(self, histograms):
+        return {"phases": {name: histograms[name].summary() for name in self.PHASES},
+                "counters": {name: histograms[name].summary()
+                             for name in self.COUNTERS}}
+
+    def write(self, record):
+        with open(self.path, "a") as file:
+            file.write(json.dumps(record) + "\n")
+
+
+# Turns metrics on, recording to the file at path (which is appended to)
+# memoryInterval is the seconds between memory samples, None for none
+# (tracing memory slows everything down, so leave it off unless needed)
+def enable(path, memoryInterval=None):
+    global recorder
+    disable()
+    recorder = Recorder(path, memoryInterval)
+    atexit.register(recorder.endSession)
+    return recorder
+
+
+# Turns metrics off, writing the session summary if they were on
+def disable():
+    global recorder
+    if recorder is not None:
+        atexit.unregister(recorder.endSession)
+        recorder.endSession()
+        if recorder.startedTracing:
+            tracemalloc.stop()
+        recorder = None
+
+
+# Turns metrics on if ANGRYPYTHONS_METRICS is set to a file name
+# ANGRYPYTHONS_METRICS_MEMORY can be set to a memory sample interval
+def enableFromEnvironment():
+    path = os.environ.get("ANGRYPYTHONS_METRICS")
+    if not path:
+        return None
+    memoryInterval = os.environ.get("ANGRYPYTHONS_METRICS_MEMORY")
+    return enable(path, float(memoryInterval) if memoryInterval else None)
@@ -1,101 +1,330 @@
 from graphics import *
-import math
+import collections
+import engine
+import geometry
+import metrics
+import time
+
+FRAME_RATE = 60 # Most frames drawn per second during a shot
+MAX_CATCH_UP = 0.25 # Most time (seconds) simulated at once after a stall
+PREVIEW_QUANTUM = 2 # Launch offsets this close (pixels) share a preview
+PREVIEW_CACHE_SIZE = 4096 # Most preview arcs remembered
+PREVIEW_TICKS = 500 # Longest arc previewed
 
 
 # Simulates projectile motion based on the given parameters using SUVAT
-def simulateProjectile(win, start, clickPos, obstacles, targets, physicsConstants):
+# The simulation itself is done by engine, this draws it in real time
+# world is the level (see worldFromShapes), and is changed by the shot
+#
+# Returns the engine.ShotResult of the shot. See simulateProjectiles.
+def simulateProjectile(win, start, clickPos, world, physicsConstants,
+                       integrator=None, clock=None):
+    return simulateProjectiles(win, start, [clickPos], world, physicsConstants,
+                               integrator, clock)[0]
+
+
+# Simulates several projectiles fired at once, e.g. a burst from one click
+# (see engine.burstClicks), in the same tick loop. clickPositions is a list
+# of Points, and a list of engine.ShotResults is returned in the same order.
+#
+# The shots are stepped together by engine.stepShots at a fixed rate of tps
+# ticks per second, however long drawing takes, and drawn at up to
+# FRAME_RATE frames per second. Each frame shows every projectile part way
+# between its last two ticks, according to how far the clock is through the
+# current tick, so movement stays smooth when the tick rate and frame rate
+# differ. Projectiles leaving the window are undrawn straight away, those
+# coming to rest stay until every shot has finished.
+#
+# integrator moves the shots between collisions (see engine's Integrators),
+# the game's SUVAT arcs by default.
+#
+# clock is what the loop is paced by and waits on (see RealClock), real time
+# by default. A SteadyClock gives every frame without waiting, e.g. to save
+# the frames or time the loop.
+#
+# When metrics are enabled, the time spent in each part of the loop is
+# recorded (see metrics.py).
+def simulateProjectiles(win, start, clickPositions, world, physicsConstants,
+                        integrator=None, clock=None):
 
     # Load constants
-    tps, forceMetric, friction, elasticity, g = physicsConstants
-    tickLength = 1 / tps # Desired time between ticks in milliseconds
-    pixelsPerMeter = 100 # For unit conversion
-    minVelocity = pixelsPerMeter ** 2 # Threshold for checking if stationary
-
-    # Start position
-    x = start.getX()
-    y = start.getY()
-
-    # Start velocity
-    Ux = (horizontalDistance(start, clickPos) * forceMetric)
-    Uy = (verticalDistance(start, clickPos) * forceMetric)
-    #If released above catapult, shoot downwards
-    if clickPos.getY() < start.getY():
-        Uy = -Uy
-
-    t = 0 # Unit time (Number of ticks since arc started)
-    canBreak = True # Determines projectiles ability to damage/destroy obstacles
-    projectile = drawProjectile(win, start) # Draw projectile
-
-    lastTick = time.time()
-
-    while not outOfBounds(win, x, y):
-
-        previousPos = Point(x, y)
-
-        # Run SUVAT to calculate new position
-        Sx = Ux * t
-        Sy = Uy * t + 0.5 * -g * t ** 2
-        y = start.getY() - Sy / pixelsPerMeter
-        x = start.getX() + Sx / pixelsPerMeter
-        t = t + 1
-
-        # Check if new position will put the projectile inside any objects
-        collided = checkForCollisions(x, y, obstacles, targets)
-        if collided:
-
-            # Determine direction of collision
-            # Both may be true if maving diagonally
-
-            # If the change in x results in the collision
-            sideImpact = checkCollision(x, previousPos.getY(), collided)
-
-            # If the change in y results in the collision
-            verticalImpact = checkCollision(previousPos.getX(), y, collided)
-
-            if sideImpact:
-                Ux = Ux * -elasticity   # Bounce sideways
-            else:
-                Ux = Ux * (1-friction)  # Apply friction
-
-            if verticalImpact:
-                Uy = (Uy + -g * t) * -elasticity    # Bounce vertically
-            else:
-                Uy = (Uy + -g * t) * (1-friction)   # Apply friction
-
-            # Interact with object hit
-            if type(collided) == Circle: # If target then destroy
-                collided.undraw()
-                targets.remove(collided)
-            elif canBreak:           # Otherwise try to damage obstacle
-                collided.undraw()
-                obstacles.remove(collided)
-
-            # End simulation if no movement
-            if Ux ** 2 < minVelocity and Uy ** 2 < minVelocity:
-                time.sleep(0.5) # Prevent instant disappearance
-                projectile.undraw()
-                break
-
-            # Prepare for new arc
-            t = 1
-            start = previousPos
-            canBreak = False # Can only break on first collision
-
-        # => movement step complete
-        projectile.undraw()
-        projectile = drawProjectile(win, previousPos)
-
-        # Time for game speed
-        elapsedTime = time.time() - lastTick
-        print(elapsedTime)
-        if elapsedTime < tickLength:
-            sleepTime = tickLength - elapsedTime
-            time.sleep(sleepTime) # Wait before next step
-        lastTick = time.time()
-        win.flush()
+    tps = physicsConstants[0]
+    tickLength = 1 / tps # Time between ticks in seconds
+    frameLength = 1 / FRAME_RATE
+    clock = clock or REAL_CLOCK
+
+    shots = [engine.Shot(start.getX(), start.getY(),
+                         clickPos.getX(), clickPos.getY(), physicsConstants,
+                         integrator)
+             for clickPos in clickPositions]
+    projectiles = [ProjectileSprite(win, start.getX(), start.getY())
+                   for shot in shots]
+
+    # Where each projectile is drawn for the last two ticks
+    before = [(start.getX(), start.getY())] * len(shots)
+    after = list(before)
+
+    recorder = metrics.recorder # None unless metrics are enabled
+    if recorder:
+        recorder.startShot()
+        tickTime = 0 # Time spent in ticks this frame
+    ticks = 0
+
+    lastTime = clock.now()
+    unsimulatedTime = 0 # Time passed that hasn't been simulated yet
+    moving = shots
+
+    while moving:
+
+        now = clock.now()
+        if recorder:
+            frameStarted = time.perf_counter()
+            overshoot = max(now - lastTime - frameLength, 0)
+        # Don't try to catch up after a long pause (e.g. window dragged)
+        unsimulatedTime = min(unsimulatedTime + now - lastTime, MAX_CATCH_UP)
+        lastTime = now
+
+        # Send the frame's drawing to Tk all at once
+        with win.batch():
+            # Simulate every tick that is due
+            while unsimulatedTime >= tickLength and moving:
+                if recorder:
+                    tickStarted = time.perf_counter()
+                moving = engine.stepShots(world, moving, recorder)
+                if recorder:
+                    seconds = time.perf_counter() - tickStarted
+                    recorder.tick(seconds)
+                    tickTime = tickTime + seconds
+                unsimulatedTime = unsimulatedTime - tickLength
+                ticks = ticks + 1
+
+                for i in range(len(shots)):
+                    shot = shots[i]
+                    # Undraw anything the projectile destroyed
+                    damaged = shot.damaged
+                    shot.damaged = None
+                    if type(damaged) == engine.Target:
+                        if damaged.sprite:
+                            damaged.sprite.undraw()
+                    elif damaged is not None and damaged.sprites:
+                        damaged.sprites.pop().undraw() # Top layer
+
+                    before[i] = after[i]
+                    after[i] = shot.previousX, shot.previousY
+
+                # Undraw projectiles that have left the window, keeping
+                # those at rest drawn
+                for i in range(len(shots)):
+                    if projectiles[i] and world.outOfBounds(shots[i].x, shots[i].y):
+                        projectiles[i].undraw()
+                        projectiles[i] = None
+
+            # Draw the projectiles between their last two ticks
+            fraction = min(unsimulatedTime / tickLength, 1)
+            for i in range(len(shots)):
+                if projectiles[i]:
+                    (beforeX, beforeY), (afterX, afterY) = before[i], after[i]
+                    projectiles[i].moveTo(beforeX + (afterX - beforeX) * fraction,
+                                          beforeY + (afterY - beforeY) * fraction)
 
-    # => Projectile out of bounds (off-screen)
-    projectile.undraw()
+        win.flush()
+        if recorder:
+            render = time.perf_counter() - frameStarted - tickTime
+            tickTime = 0
+
+        # End simulation once nothing is moving
+        if not moving:
+            if any(shot.stopped for shot in shots):
+                clock.sleep(0.5) # Prevent instant disappearance
+            break
+
+        # Wait for the next frame
+        sleepTime = lastTime + frameLength - clock.now()
+        if sleepTime > 0:
+            clock.sleep(sleepTime)
+        if recorder:
+            recorder.frame(render, max(sleepTime, 0), overshoot, len(win.items))
+
+    # => Projectiles stopped or out of bounds (off-screen)
+    for projectile in projectiles:
+        if projectile:
+            projectile.undraw()
+    if recorder:
+        recorder.endShot(ticks)
+    return [engine.ShotResult(shot, world.outOfBounds(shot.x, shot.y))
+            for shot in shots]
+
+
+# Real time, for the game: now() is time.monotonic() and sleep really waits
+class RealClock:
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+REAL_CLOCK = RealClock()
+
+
+# A clock of its own, where sleeping takes no time: sleep moves the clock
+# on, and nothing else does. Each user has its own, so nothing else in the
+# process is affected.
+class SteadyClock:
+
+    def __init__(self):
+        self.time = 0
+
+    def now(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.time = self.time + max(seconds, 0)
+
+
+# The projectile as drawn, moved from frame to frame rather than redrawn
+# Shown as an arrow at the top of the window while it is above the window
+class ProjectileSprite:
+
+    def __init__(self, win, x, y):
+        self.win = win
+        self.x = x
+        self.y = y
+        self.shape = drawProjectile(win, Point(x, y))
+
+    # Moves the projectile to x,y, swapping between the projectile and the
+    # indicator only when it goes above or comes back into the window
+    def moveTo(self, x, y):
+        if (y < 0) != (self.y < 0):
+            self.shape.undraw()
+            self.shape = drawProjectile(self.win, Point(x, y))
+        elif y < 0:
+            self.shape.move(x - self.x, 0) # Indicator stays at the top
+        else:
+            self.shape.move(x - self.x, y - self.y)
+        self.x = x
+        self.y = y
+
+    def undraw(self):
+        self.shape.undraw()
+
+
+# Shows the path a shot would take, up to the first thing it would hit,
+# while the mouse is over the firing area (left of the catapult)
+# Use onMotion as the window's motion handler (see GraphWin.setMotionHandler)
+#
+# Mouse movements arrive far faster than arcs can be simulated, so:
+#   - moves are only noted as they arrive, and the preview is redrawn once
+#     Tk has handled every waiting event, for the latest position only
+#   - launch offsets from start are rounded to PREVIEW_QUANTUM pixels, and
+#     the arc for each rounded offset is kept in a least recently used
+#     cache of PREVIEW_CACHE_SIZE arcs, emptied whenever the level changes
+#     (world.version changes when a shape is damaged)
+#   - the arc is drawn as one Polyline whose points are changed, rather than
+#     new shapes for every move
+# integrator should be the one the shots are flown with (see engine's
+# Integrators), so the preview follows the same path.
+class TrajectoryPreview:
+
+    def __init__(self, win, world, start, physicsConstants, integrator=None):
+        self.win = win
+        self.world = world
+        self.start = start
+        self.physicsConstants = physicsConstants
+        self.integrator = integrator
+        self.cache = collections.OrderedDict() # Rounded offset -> arc points
+        self.version = world.version
+        self.position = None # Latest mouse position not yet shown
+        self.redrawPending = None
+        self.hits = 0
+        self.misses = 0
+        self.line = Polyline(start, start)
+        self.line.setFill("blue")
+        self.line.setHidden(True)
+        self.line.draw(win)
+
+    # Motion handler: notes where the mouse is and schedules a redraw
+    def onMotion(self, position):
+        self.position = position
+        if self.redrawPending is None:
+            self.redrawPending = self.win.after_idle(self.redraw)
+
+    # Shows the arc for the latest mouse position, or hides the preview if
+    # the mouse is outside the firing area
+    def redraw(self):
+        self.redrawPending = None
+        position = self.position
+        if position is None or self.win.isClosed():
+            return
+        x, y = self.win.toWorld(position.getX(), position.getY())
+        if x > self.start.getX():
+            self.line.setHidden(True)
+            return
+        self.line.setPoints(self.arc(x - self.start.getX(), y - self.start.getY()))
+        self.line.setHidden(False)
+        self.win.flush()
+
+    # The arc (a list of Points) for a launch offset, from the cache if
+    # possible
+    def arc(self, dx, dy):
+        if self.world.version != self.version:
+            self.cache.clear()
+            self.version = self.world.version
+        key = (round(dx / PREVIEW_QUANTUM), round(dy / PREVIEW_QUANTUM))
+        points = self.cache.get(key)
+        if points is not None:
+            self.hits = self.hits + 1
+            self.cache.move_to_end(key)
+            return points
+
+        self.misses = self.misses + 1
+        startX = self.start.getX()
+        startY = self.start.getY()
+        path = engine.arcToImpact(self.world, startX, startY,
+                                  startX + key[0] * PREVIEW_QUANTUM,
+                                  startY + key[1] * PREVIEW_QUANTUM,
+                                  self.physicsConstants, PREVIEW_TICKS,
+                                  self.integrator)
+        if len(path) < 2:
+            path.append(path[0])
+        points = [Point(x, y) for x, y in path]
+        self.cache[key] = points
+        if len(self.cache) > PREVIEW_CACHE_SIZE:
+            self.cache.popitem(last=False) # Least recently used
+        return points
+
+    # Hides the preview until the mouse next moves
+    def hide(self):
+        if self.redrawPending is not None:
+            self.win.after_cancel(self.redrawPending)
+            self.redrawPending = None
+        self.position = None
+        self.line.setHidden(True)
+
+    def undraw(self):
+        self.hide()
+        self.line.undraw()
+
+
+# Builds the level from the drawn obstacles and targets
+# Walls drawn as a stack of identical rectangles (see shapeGen.addGradedWall)
+# become one obstacle, with a grade for each rectangle. The drawn shapes are
+# kept in the world as its sprites.
+def worldFromShapes(win, obstacles, targets):
+    world = engine.World(win.getWidth(), win.getHeight())
+    for target in targets:
+        center = target.getCenter()
+        world.addTarget(center.getX(), center.getY(), target.getRadius(), target)
+    wall = None
+    for obstacle in obstacles:
+        bounds = determineRectangleBounds(obstacle)
+        if wall is not None and wall.getBounds() == bounds:
+            wall.grade = wall.grade + 1
+            wall.sprites.append(obstacle)
+        else:
+            wall = world.addObstacle(*bounds, sprites=[obstacle])
+    return world
 
 
 # Whether the point x,y is out of bounds
@@ -120,62 +349,13 @@ def drawProjectile(win, position):
     return projectile
 
 
-# Checks if a point collides with any obstacle or target
-def checkForCollisions(x, y, obstacles, targets):
-    for i in range(len(targets)):
-        if checkCollision(x, y, targets[i]):
-            return targets[i]
-    for i in range(len(obstacles)-1, -1, -1):
-        if checkCollision(x, y, obstacles[i]):
-            return obstacles[i]
-    return None
-
-
-# Checks if a point collides with a shape (circle or rectangle)
-def checkCollision(x, y, target):
-    if type(target) == Circle:
-        # Point in circle
-        if distance(Point(x, y), target.getCenter()) <= target.getRadius():
-            return True
-    else:
-        # Point in rectangle
-        top, bottom, left, right = determineRectangleBounds(target)
-        if x >= left and x <= right and y >= top and y <= bottom:
-            return True
-    return False
-
-
 # Calculates the bounds of a rectangle
 def determineRectangleBounds(rectangle):
-    p1 = rectangle.getP1()
-    p2 = rectangle.getP2()
-    if p1.getX() < p2.getX():
-        left = p1.getX()
-        right = p2.getX()
-    else:
-        left = p2.getX()
-        right = p1.getX()
-    if p1.getY() < p2.getY():
-        top = p1.getY()
-        bottom = p2.getY()
-    else:
-        top = p2.getY()
-        bottom = p1.getY()
-    return top, bottom, left, right
-
-
-# Calculates the distance between two points
-def distance(p1, p2):
-    # Pythagoras theorem
-    return(math.sqrt(((p2.getX() - p1.getX()) ** 2) \
-           + ((p2.getY() - p1.getY()) ** 2)))
-
-
-# Calculates the absolute horizontal distance between two points
-def horizontalDistance(p1, p2):
-    return abs(p2.getX() - p1.getX())
+    # The corners themselves, rather than copies from getP1 and getP2
+    return geometry.bounds(rectangle.p1, rectangle.p2)
 
 
-# Calculates the absolute vertical distance between two points
-def verticalDistance(p1, p2):
-    return abs((p2.getY() - p1.getY()))
\ No newline at end of file
+# Distances between points, kept here for code that uses them from physics
+distance = geometry.distance
+horizontalDistance = geometry.horizontalDistance
+verticalDistance = geometry.verticalDistance
@@ -0,0 +1,279 @@
+import math
+import random
+
+# Shape placement for level generation
+#
+# Keeps track of the free space in the level with an occupancy bitmap: a
+# single Python int with one bit per pixel, set where an obstacle is. Row y
+# of the level is held in bits y * stride to y * stride + width, with a
+# spare bit at the end of each row that is never free, so runs of free
+# pixels can't wrap from one row onto the next.
+#
+# Checking whether a rectangle is free is one AND, and when random guesses
+# keep failing every free position for a shape is found at once by ANDing
+# the free bitmap with shifted copies of itself. So each placement takes a
+# bounded amount of time however crowded the level is, and a level that is
+# too full is reported with a PlacementError instead of searching forever.
+#
+# Nothing in here draws anything (see shapeGen for that).
+
+ATTEMPTS = 10 # Random guesses before searching every position
+RESIZES = 5 # Times to pick new dimensions when a shape doesn't fit anywhere
+TARGET_SIZE_RANGE = (20, 40) # Min and max target radius
+
+
+
+# Raised when there is no room left in the level for a shape
+class PlacementError(Exception):
+
+    def __init__(self, message, placed):
+        Exception.__init__(self, message)
+        self.placed = placed # Shapes that were placed before running out
+
+
+# Occupancy bitmap of the level, covering pixels 0..width and 0..height
+# Rectangles are given as (top, bottom, left, right) and include their edges,
+# so shapes that would touch count as overlapping
+class Occupancy:
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.stride = width + 2
+        self.used = 0
+        self.discs = {} # Cache of disc masks by radius, see discMask
+        self.everything = self.rectangleMask(0, height, 0, width)
+
+    # Bits for a rectangle, clipped to the bitmap
+    def rectangleMask(self, top, bottom, left, right):
+        top, bottom, left, right = self.clip(top, bottom, left, right)
+        if top > bottom or left > right:
+            return 0
+        # Copy one row down, doubling the rows covered each time
+        bits = (1 << (right - left + 1)) - 1
+        rows = 1
+        height = bottom - top + 1
+        while rows < height:
+            step = min(rows, height - rows)
+            bits = bits | (bits << (step * self.stride))
+            rows = rows + step
+        return bits << (top * self.stride + left)
+
+    # Limits a rectangle to the bitmap, rounding outwards to whole pixels
+    def clip(self, top, bottom, left, right):
+        return max(math.floor(top), 0), min(math.ceil(bottom), self.height), \
+               max(math.floor(left), 0), min(math.ceil(right), self.width)
+
+    # Marks a rectangle as used
+    def fill(self, top, bottom, left, right):
+        self.used = self.used | self.rectangleMask(top, bottom, left, right)
+
+    # Whether no part of a rectangle is used
+    def isFree(self, top, bottom, left, right):
+        return not self.used & self.rectangleMask(top, bottom, left, right)
+
+    # Finds every free position for a rectangle w pixels wide and h high
+    # with its top left corner in the region (top, bottom, left, right)
+    # Returns an int with a bit set (at top * stride + left) for each one
+    def freePositions(self, w, h, region):
+        regionTop, regionBottom, regionLeft, regionRight = region
+        regionMask = self.rectangleMask(regionTop, min(regionBottom, self.height - h),
+                                        regionLeft, min(regionRight, self.width - w))
+        if not regionMask:
+            return 0
+        free = self.everything & ~self.used
+        # Positions with w+1 free pixels to their right ...
+        free = runStarts(free, w + 1, 1)
+        # ... in each of h+1 rows
+        free = runStarts(free, h + 1, self.stride)
+        return free & regionMask
+
+    # Picks a random free position for a rectangle w wide and h high, with
+    # its top left corner in region. Returns (top, left) or None if it can't
+    # fit anywhere
+    def randomFreePosition(self, rng, w, h, region):
+        regionTop, regionBottom, regionLeft, regionRight = region
+
+        # Guess first, which is usually quicker
+        for i in range(ATTEMPTS):
+            if regionLeft > regionRight or regionTop > regionBottom:
+                break
+            left = rng.randint(regionLeft, regionRight)
+            top = rng.randint(regionTop, regionBottom)
+            if self.isFree(top, top + h, left, left + w):
+                return top, left
+
+        # => crowded, so pick uniformly from every free position
+        return self.pickPosition(rng, self.freePositions(w, h, region))
+
+    # Picks uniformly from positions found by freePositions
+    # Returns (top, left) or None if there are none
+    def pickPosition(self, rng, positions):
+        total = positions.bit_count()
+        if total == 0:
+            return None
+        return divmod(nthSetBit(positions, rng.randrange(total)), self.stride)
+
+
+# Bits set where a run of at least n set bits starts in bits, counting every
+# spacing-th bit (1 for along a row, stride for down a column)
+def runStarts(bits, n, spacing):
+    covered = 1
+    while covered < n:
+        step = min(covered, n - covered)
+        bits = bits & (bits >> (step * spacing))
+        covered = covered + step
+    return bits
+
+
+# Position of the k-th (from 0) set bit in bits
+def nthSetBit(bits, k):
+    position = 0
+    width = bits.bit_length()
+    while width > 1:
+        half = width // 2
+        low = bits & ((1 << half) - 1)
+        lowCount = low.bit_count()
+        if k < lowCount:
+            bits = low
+            width = half
+        else:
+            k = k - lowCount
+            bits = bits >> half
+            position = position + half
+            width = width - half
+    return position
+
+
+
+################################################################################
+# Obstacles and targets
+################################################################################
+
+# Picks random obstacle dimensions (w, h) within obstacleDimensionRanges
+def randomObstacleSize(rng, obstacleDimensionRanges):
+    shortMin, shortMax, longMin, longMax = obstacleDimensionRanges
+    long = rng.randint(longMin, longMax)
+    short = rng.randint(shortMin, shortMax)
+    # Randomly pick rotation
+    if rng.randint(0, 1) == 0:
+        return long, short
+    return short, long
+
+
+# Places obstacleNumber non-overlapping obstacles right of leftLimit
+# Marks them in space and returns them as (top, bottom, left, right, grade)
+# Raises PlacementError if the level fills up first
+def placeObstacles(space, obstacleNumber, obstacleDimensionRanges, leftLimit,
+                   rng=random):
+    obstacles = []
+    shortMin, shortMax, longMin, longMax = obstacleDimensionRanges
+    for i in range(obstacleNumber):
+        position = None
+        # As a last resort try the smallest obstacles in both rotations
+        smallest = [(longMin, shortMin), (shortMin, longMin)]
+        for attempt in range(RESIZES + len(smallest)):
+            if attempt < RESIZES:
+                w, h = randomObstacleSize(rng, obstacleDimensionRanges)
+            else:
+                w, h = smallest[attempt - RESIZES]
+            region = (0, space.height - h, leftLimit, space.width - w)
+            position = space.randomFreePosition(rng, w, h, region)
+            if position is not None:
+                break
+        if position is None:
+            raise PlacementError("No room for obstacle %d of %d"
+                                 % (i + 1, obstacleNumber), obstacles)
+
+        top, left = position
+        space.fill(top, top + h, left, left + w)
+        grade = rng.randint(1, 3) # Randomly pick obstacle strength
+        obstacles.append((top, top + h, left, left + w, grade))
+    return obstacles
+
+
+# Places targetNumber targets right of leftLimit, that don't overlap the
+# obstacles marked in space or each other
+# Returns them as (x, y, radius), raises PlacementError if there isn't room
+def placeTargets(space, targetNumber, leftLimit, rng=random,
+                 sizeRange=TARGET_SIZE_RANGE):
+    targets = []
+    for i in range(targetNumber):
+        position = None
+        for attempt in range(RESIZES + 1):
+            if attempt < RESIZES:
+                size = rng.randint(*sizeRange)
+            else:
+                size = sizeRange[0] # As a last resort try the smallest size
+            position = randomTargetPosition(space, targets, size, leftLimit, rng)
+            if position is not None:
+                break
+        if position is None:
+            raise PlacementError("No room for target %d of %d"
+                                 % (i + 1, targetNumber), targets)
+        targets.append((position[0], position[1], size))
+    return targets
+
+
+# Picks a random centre for a target of radius size, or None if none are free
+# The square around the target must be clear of obstacles and the target
+# must not touch any other target
+def randomTargetPosition(space, targets, size, leftLimit, rng):
+    # Regions are for the top left corner of the square around the target
+    region = (0, space.height - 2 * size, leftLimit, space.width - 2 * size)
+    regionTop, regionBottom, regionLeft, regionRight = region
+
+    # Guess first, which is usually quicker
+    for i in range(ATTEMPTS):
+        if regionLeft > regionRight or regionTop > regionBottom:
+            break
+        x = rng.randint(regionLeft, regionRight) + size
+        y = rng.randint(regionTop, regionBottom) + size
+        if space.isFree(y - size, y + size, x - size, x + size) \
+        and not touchesTarget(targets, x, y, size):
+            return x, y
+
+    # => crowded, so search every position clear of obstacles, less the
+    # positions too close to other targets
+    positions = space.freePositions(2 * size, 2 * size, region)
+    for tx, ty, radius in targets:
+        if positions:
+            positions = positions & ~discMask(space, tx - size, ty - size,
+                                              radius + size)
+    position = space.pickPosition(rng, positions)
+    if position is None:
+        return None
+    top, left = position
+    return left + size, top + size
+
+
+# Bits for a disc of pixels (including its edge) in an Occupancy's layout
+def discMask(space, x, y, radius):
+    # Clip the disc where it hangs over the edges
+    if x - radius < 0 or x + radius > space.width or y - radius < 0:
+        return buildDisc(space, x, y, radius)
+
+    # Otherwise move a disc centred on (radius, radius) into place
+    disc = space.discs.get(radius)
+    if disc is None:
+        disc = buildDisc(space, radius, radius, radius)
+        space.discs[radius] = disc
+    bits = disc << ((y - radius) * space.stride + x - radius)
+    return bits & space.everything
+
+
+# Builds the bits for a disc one row at a time
+def buildDisc(space, x, y, radius):
+    bits = 0
+    for dy in range(-radius, radius + 1):
+        dx = math.isqrt(radius ** 2 - dy ** 2)
+        bits = bits | space.rectangleMask(y + dy, y + dy, x - dx, x + dx)
+    return bits
+
+
+# Whether a circle would touch any of a list of (x, y, radius) targets
+def touchesTarget(targets, x, y, size):
+    for tx, ty, radius in targets:
+        if (tx - x) ** 2 + (ty - y) ** 2 <= (radius + size) ** 2:
+            return True
+    return False
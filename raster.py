@@ -0,0 +1,692 @@
+import argparse
+import math
+import os
+import struct
+import sys
+import time
+import zlib
+from contextlib import contextmanager
+import levels
+import replay
+
+# Off-screen drawing
+#
+# A RasterWin is a window for graphics.py's shapes that is never shown. It
+# takes the same canvas calls a GraphWin gets from the shapes drawn on it
+# (create_rectangle, move, itemconfig, delete...), keeps the items, and
+# paints them into an RGB image in memory when asked. Nothing here uses Tk,
+# and graphics imports without it, so it works on machines where Tk can't
+# start or isn't installed, e.g. to make thumbnails of generated levels or
+# the frames of replayed games on a build server:
+#
+#   win = RasterWin("Level", level.width, level.height, scale=0.25)
+#   shapeGen.drawLevel(win, level)
+#   win.save("level.png")
+#
+# Only what the game draws is painted: rectangles, ovals and circles, lines
+# (with arrowheads) and polygons, text in a built-in 5x7 pixel font
+# whatever the face, and Entry boxes as a placeholder box showing the text
+# they had when drawn. Images aren't supported.
+#
+# Pictures are saved as binary PPM or PNG, picked by the file extension.
+# After recordFrames, every flush of the window saves a numbered frame (the
+# game flushes once a frame while a shot flies, see
+# physics.simulateProjectiles), so a shot can be saved as a sequence of
+# pictures, e.g. for ffmpeg -i frame-%06d.png.
+#
+# Running this file draws thumbnails of the levels in level packs and the
+# frames of recorded games (see replay.py).
+
+FRAME_NAME = "frame-%06d" # Numbered frame files, plus the extension
+ARROW_SHAPE = (8, 10, 3) # Tk's default arrowhead (see Frame.drawLine)
+FONT_SIZE = 12 # Text size when no font is given, as in graphics.py
+
+# Colours by name, those the game uses and a few more (Tk's values)
+# Anything else has to be given as #rgb or #rrggbb
+COLOURS = {
+    "black": "#000000", "white": "#FFFFFF", "red": "#FF0000",
+    "green": "#00FF00", "blue": "#0000FF", "yellow": "#FFFF00",
+    "cyan": "#00FFFF", "magenta": "#FF00FF", "orange": "#FFA500",
+    "gold": "#FFD700", "brown": "#A52A2A", "pink": "#FFC0CB",
+    "purple": "#A020F0", "gray": "#BEBEBE", "grey": "#BEBEBE",
+    "lightgray": "#D3D3D3", "lightgrey": "#D3D3D3",
+    "darkgray": "#A9A9A9", "darkgrey": "#A9A9A9",
+    "lightblue": "#ADD8E6", "darkblue": "#00008B",
+    "lightgreen": "#90EE90", "darkgreen": "#006400", "darkred": "#8B0000"}
+
+# 5x7 pixel font, each character's rows from top to bottom in hex, the
+# 0x10 bit being the left column. Characters not here are drawn as a box.
+FONT = {
+    " ": "00 00 00 00 00 00 00", "!": "04 04 04 04 00 00 04",
+    '"': "0A 0A 0A 00 00 00 00", "#": "0A 0A 1F 0A 1F 0A 0A",
+    "%": "18 19 02 04 08 13 03", "'": "0C 04 08 00 00 00 00",
+    "(": "02 04 08 08 08 04 02", ")": "08 04 02 02 02 04 08",
+    "*": "00 04 15 0E 15 04 00", "+": "00 04 04 1F 04 04 00",
+    ",": "00 00 00 00 0C 04 08", "-": "00 00 00 1F 00 00 00",
+    ".": "00 00 00 00 00 0C 0C", "/": "00 01 02 04 08 10 00",
+    "0": "0E 11 13 15 19 11 0E", "1": "04 0C 04 04 04 04 0E",
+    "2": "0E 11 01 02 04 08 1F", "3": "1F 02 04 02 01 11 0E",
+    "4": "02 06 0A 12 1F 02 02", "5": "1F 10 1E 01 01 11 0E",
+    "6": "06 08 10 1E 11 11 0E", "7": "1F 01 02 04 08 08 08",
+    "8": "0E 11 11 0E 11 11 0E", "9": "0E 11 11 0F 01 02 0C",
+    ":": "00 0C 0C 00 0C 0C 00", ";": "00 0C 0C 00 0C 04 08",
+    "<": "02 04 08 10 08 04 02", "=": "00 00 1F 00 1F 00 00",
+    ">": "08 04 02 01 02 04 08", "?": "0E 11 01 02 04 00 04",
+    "A": "0E 11 11 11 1F 11 11", "B": "1E 11 11 1E 11 11 1E",
+    "C": "0E 11 10 10 10 11 0E", "D": "1C 12 11 11 11 12 1C",
+    "E": "1F 10 10 1E 10 10 1F", "F": "1F 10 10 1E 10 10 10",
+    "G": "0E 11 10 17 11 11 0F", "H": "11 11 11 1F 11 11 11",
+    "I": "0E 04 04 04 04 04 0E", "J": "07 02 02 02 02 12 0C",
+    "K": "11 12 14 18 14 12 11", "L": "10 10 10 10 10 10 1F",
+    "M": "11 1B 15 15 11 11 11", "N": "11 11 19 15 13 11 11",
+    "O": "0E 11 11 11 11 11 0E", "P": "1E 11 11 1E 10 10 10",
+    "Q": "0E 11 11 11 15 12 0D", "R": "1E 11 11 1E 14 12 11",
+    "S": "0F 10 10 0E 01 01 1E", "T": "1F 04 04 04 04 04 04",
+    "U": "11 11 11 11 11 11 0E", "V": "11 11 11 11 11 0A 04",
+    "W": "11 11 11 15 15 15 0A", "X": "11 11 0A 04 0A 11 11",
+    "Y": "11 11 11 0A 04 04 04", "Z": "1F 01 02 04 08 10 1F",
+    "_": "00 00 00 00 00 00 1F",
+    "a": "00 00 0E 01 0F 11 0F", "b": "10 10 16 19 11 11 1E",
+    "c": "00 00 0E 10 10 11 0E", "d": "01 01 0D 13 11 11 0F",
+    "e": "00 00 0E 11 1F 10 0E", "f": "06 09 08 1C 08 08 08",
+    "g": "00 0F 11 11 0F 01 0E", "h": "10 10 16 19 11 11 11",
+    "i": "04 00 0C 04 04 04 0E", "j": "02 00 06 02 02 12 0C",
+    "k": "10 10 12 14 18 14 12", "l": "0C 04 04 04 04 04 0E",
+    "m": "00 00 1A 15 15 11 11", "n": "00 00 16 19 11 11 11",
+    "o": "00 00 0E 11 11 11 0E", "p": "00 00 1E 11 1E 10 10",
+    "q": "00 00 0D 13 0F 01 01", "r": "00 00 16 19 10 10 10",
+    "s": "00 00 0E 10 0E 01 1E", "t": "08 08 1C 08 08 09 06",
+    "u": "00 00 11 11 11 13 0D", "v": "00 00 11 11 11 0A 04",
+    "w": "00 00 11 11 15 15 0A", "x": "00 00 11 0A 04 0A 11",
+    "y": "00 00 11 11 0F 01 0E", "z": "00 00 1F 02 04 08 1F"}
+MISSING_GLYPH = "1F 11 11 11 11 11 1F"
+GLYPH_WIDTH = 5
+GLYPH_HEIGHT = 7
+GLYPH_ADVANCE = 6 # Font pixels from one character to the next
+LINE_ADVANCE = 9 # Font pixels from one line of text to the next
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+_glyphs = {} # Lit (column, row) pixels of each character, made when needed
+
+
+
+# The RGB value of a colour given as a name, #rgb or #rrggbb
+# Returns None for "" (no colour, as in Tk)
+def colourRGB(colour):
+    if not colour:
+        return None
+    colour = COLOURS.get(colour.lower().replace(" ", ""), colour)
+    if colour.startswith("#") and len(colour) == 4:
+        colour = "#" + "".join(digit * 2 for digit in colour[1:])
+    if colour.startswith("#") and len(colour) == 7:
+        try:
+            return bytes.fromhex(colour[1:])
+        except ValueError:
+            pass
+    raise ValueError("unknown colour %r" % colour)
+
+
+# The lit pixels of a character as a list of (column, row)
+def glyph(character):
+    pixels = _glyphs.get(character)
+    if pixels is None:
+        rows = bytes.fromhex(FONT.get(character, MISSING_GLYPH))
+        pixels = [(column, row) for row in range(GLYPH_HEIGHT)
+                  for column in range(GLYPH_WIDTH)
+                  if rows[row] & (0x10 >> column)]
+        _glyphs[character] = pixels
+    return pixels
+
+
+# The size and style of a Tk font description, e.g. ("helvetica", 12, "bold")
+def fontSize(font):
+    if isinstance(font, (tuple, list)) and len(font) > 1:
+        return abs(float(font[1])), " ".join(str(part) for part in font[2:])
+    return FONT_SIZE, ""
+
+
+# Window pixels per font pixel for text of a size in points, so the built
+# in font comes out about the height of Tk's
+def fontScale(size):
+    return size / 8
+
+
+
+################################################################################
+# Pictures
+################################################################################
+
+# An RGB picture, painted one span of a row at a time
+# Coordinates are pixels, with pixel (i, j) covering the point (i, j): a
+# shape covers the pixels whose point is inside it. pixels is the picture
+# as width * height RGB triples, row by row from the top.
+class Frame:
+
+    def __init__(self, width, height, background=b"\xff\xff\xff"):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(background * (width * height))
+        self.encoded = {} # Saved file contents, by format
+
+    # Paints pixels first to last - 1 of row y
+    def fillSpan(self, y, first, last, colour):
+        if y < 0 or y >= self.height:
+            return
+        first = max(first, 0)
+        last = min(last, self.width)
+        if first < last:
+            start = (y * self.width + first) * 3
+            self.pixels[start:start + (last - first) * 3] = colour * (last - first)
+
+    # Paints the rectangle x1 <= x < x2, y1 <= y < y2
+    def fillRectangle(self, x1, y1, x2, y2, colour):
+        first = math.ceil(min(x1, x2))
+        last = math.ceil(max(x1, x2))
+        for y in range(max(math.ceil(min(y1, y2)), 0),
+                       min(math.ceil(max(y1, y2)), self.height)):
+            self.fillSpan(y, first, last, colour)
+
+    # Paints the outline of the rectangle with corners x1,y1 and x2,y2, a
+    # band width wide centred on its edges
+    def outlineRectangle(self, x1, y1, x2, y2, width, colour):
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        half = width / 2
+        self.fillRectangle(x1 - half, y1 - half, x2 + half, y1 + half, colour)
+        self.fillRectangle(x1 - half, y2 - half, x2 + half, y2 + half, colour)
+        self.fillRectangle(x1 - half, y1 + half, x1 + half, y2 - half, colour)
+        self.fillRectangle(x2 - half, y1 + half, x2 + half, y2 - half, colour)
+
+    # Paints the oval inside the box with corners x1,y1 and x2,y2, filled
+    # with fill and/or outlined width wide with outline (either can be None)
+    def paintOval(self, x1, y1, x2, y2, fill, outline, width):
+        centreX = (x1 + x2) / 2
+        centreY = (y1 + y2) / 2
+        radiusX = abs(x2 - x1) / 2
+        radiusY = abs(y2 - y1) / 2
+        if fill:
+            for y, half in _ovalRows(centreX, centreY, radiusX, radiusY, self.height):
+                self.fillSpan(y, math.ceil(centreX - half),
+                              math.floor(centreX + half) + 1, fill)
+        if outline and width > 0:
+            # The rows of a ring, the outer oval less the inner one
+            inner = radiusX - width / 2, radiusY - width / 2
+            for y, half in _ovalRows(centreX, centreY, radiusX + width / 2,
+                                     radiusY + width / 2, self.height):
+                hole = None
+                if inner[0] > 0 and inner[1] > 0:
+                    hole = _ovalHalfWidth(inner[0], inner[1], y - centreY)
+                if hole is None:
+                    self.fillSpan(y, math.ceil(centreX - half),
+                                  math.floor(centreX + half) + 1, outline)
+                else:
+                    self.fillSpan(y, math.ceil(centreX - half),
+                                  math.ceil(centreX - hole), outline)
+                    self.fillSpan(y, math.floor(centreX + hole) + 1,
+                                  math.floor(centreX + half) + 1, outline)
+
+    # Paints the inside of a polygon, a list of (x, y) corners
+    def fillPolygon(self, points, colour):
+        if len(points) < 3:
+            return
+        edges = list(zip(points, points[1:] + points[:1]))
+        ys = [y for x, y in points]
+        for y in range(max(math.ceil(min(ys)), 0),
+                       min(math.ceil(max(ys)), self.height)):
+            crossings = sorted(x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+                               for (x1, y1), (x2, y2) in edges
+                               if y1 <= y < y2 or y2 <= y < y1)
+            for i in range(0, len(crossings) - 1, 2):
+                self.fillSpan(y, math.ceil(crossings[i]),
+                              math.ceil(crossings[i + 1]), colour)
+
+    # Paints a line through a list of (x, y) points, width wide, with an
+    # arrowhead at the "first", "last" or "both" ends (or "none"), shaped
+    # like Tk's: arrowShape is the distances along the line from the tip to
+    # the neck and to the trailing points, and how far the trailing points
+    # stand out from the side of the line
+    def drawLine(self, points, width, colour, arrow="none", arrowShape=ARROW_SHAPE):
+        points = list(points)
+        if len(points) < 2:
+            return
+        heads = []
+        if arrow in ("first", "both"):
+            heads.append(self._arrowhead(points, 0, 1, width, arrowShape))
+        if arrow in ("last", "both"):
+            heads.append(self._arrowhead(points, -1, -2, width, arrowShape))
+        half = max(width, 1) / 2
+        for (x1, y1), (x2, y2) in zip(points, points[1:]):
+            length = math.hypot(x2 - x1, y2 - y1)
+            if length == 0:
+                continue
+            # A band half wide either side of the segment
+            nx = -(y2 - y1) / length * half
+            ny = (x2 - x1) / length * half
+            self.fillPolygon([(x1 + nx, y1 + ny), (x2 + nx, y2 + ny),
+                              (x2 - nx, y2 - ny), (x1 - nx, y1 - ny)], colour)
+        for head in heads:
+            if head:
+                self.fillPolygon(head, colour)
+
+    def _arrowhead(self, points, tip, towards, width, arrowShape):
+        # Shortens the line to the arrowhead's neck, returns its corners
+        tipX, tipY = points[tip]
+        backX, backY = points[towards]
+        length = math.hypot(tipX - backX, tipY - backY)
+        if length == 0:
+            return None
+        neck, trailing, flare = arrowShape
+        ux = (tipX - backX) / length
+        uy = (tipY - backY) / length
+        side = width / 2 + flare
+        points[tip] = tipX - ux * neck, tipY - uy * neck
+        return [(tipX, tipY),
+                (tipX - ux * trailing - uy * side, tipY - uy * trailing + ux * side),
+                (tipX - ux * neck - uy * width / 2, tipY - uy * neck + ux * width / 2),
+                (tipX - ux * neck + uy * width / 2, tipY - uy * neck - ux * width / 2),
+                (tipX - ux * trailing + uy * side, tipY - uy * trailing - ux * side)]
+
+    # Paints text centred on x,y, each pixel of the font scale pixels
+    # square, with each line centred ("center"), or lined up on the
+    # "left" or "right". Bold text is painted twice, a pixel apart.
+    def drawText(self, x, y, text, scale, colour, justify="center", bold=False):
+        lines = str(text).split("\n")
+        widths = [(len(line) * GLYPH_ADVANCE - 1) * scale for line in lines]
+        blockWidth = max(widths)
+        top = round(y - (len(lines) * LINE_ADVANCE - 2) * scale / 2)
+        left = round(x - blockWidth / 2)
+        for number, line in enumerate(lines):
+            lineLeft = left
+            if justify == "center":
+                lineLeft = left + (blockWidth - widths[number]) // 2
+            elif justify == "right":
+                lineLeft = left + blockWidth - widths[number]
+            lineTop = top + number * LINE_ADVANCE * scale
+            for position, character in enumerate(line):
+                characterLeft = lineLeft + position * GLYPH_ADVANCE * scale
+                for column, row in glyph(character):
+                    pixelX = characterLeft + column * scale
+                    pixelY = lineTop + row * scale
+                    for offset in range(scale):
+                        self.fillSpan(pixelY + offset, pixelX,
+                                      pixelX + scale + bold, colour)
+
+    # The picture as a binary PPM file
+    def toPPM(self):
+        if "ppm" not in self.encoded:
+            self.encoded["ppm"] = b"P6\n%d %d\n255\n" % (self.width, self.height) \
+                                  + bytes(self.pixels)
+        return self.encoded["ppm"]
+
+    # The picture as a PNG file (8 bit RGB, no filtering)
+    def toPNG(self):
+        if "png" not in self.encoded:
+            rowLength = self.width * 3
+            pixels = self.pixels
+            raw = b"".join(b"\0" + pixels[start:start + rowLength]
+                           for start in range(0, len(pixels), rowLength))
+            self.encoded["png"] = PNG_SIGNATURE \
+                + _pngChunk(b"IHDR", struct.pack(">IIBBBBB", self.width,
+                                                 self.height, 8, 2, 0, 0, 0)) \
+                + _pngChunk(b"IDAT", zlib.compress(raw, 6)) \
+                + _pngChunk(b"IEND", b"")
+        return self.encoded["png"]
+
+    # Saves the picture to path, as PNG or PPM going by its extension
+    def save(self, path):
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".png":
+            data = self.toPNG()
+        elif extension in (".ppm", ".pnm"):
+            data = self.toPPM()
+        else:
+            raise ValueError("can't save pictures as %r" % extension)
+        with open(path, "wb") as file:
+            file.write(data)
+
+
+# The rows y of an oval and the half width of the oval on each
+def _ovalRows(centreX, centreY, radiusX, radiusY, height):
+    for y in range(max(math.ceil(centreY - radiusY), 0),
+                   min(math.floor(centreY + radiusY) + 1, height)):
+        half = _ovalHalfWidth(radiusX, radiusY, y - centreY)
+        if half is not None:
+            yield y, half
+
+
+# Half the width of an oval dy from its centre, None if it isn't that tall
+def _ovalHalfWidth(radiusX, radiusY, dy):
+    if radiusY <= 0 or abs(dy) > radiusY:
+        return None
+    return radiusX * math.sqrt(1 - (dy / radiusY) ** 2)
+
+
+def _pngChunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data \
+           + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+
+################################################################################
+# Windows
+################################################################################
+
+# A canvas item: its kind ("rectangle", "oval", "line", "polygon", "text"
+# or "entry"), screen coordinates as a flat list, and Tk style options
+class _Item:
+
+    def __init__(self, kind, coords, options):
+        self.kind = kind
+        self.coords = coords
+        self.options = options
+
+
+# A window drawn off-screen, see the top of the file
+# width and height are the window's size as the game sees it, scale the
+# size of the pictures made of it relative to that (e.g. 0.25 for a
+# thumbnail a quarter the size)
+class RasterWin:
+
+    def __init__(self, title="Graphics Window", width=200, height=200,
+                 autoflush=False, scale=1, background="white"):
+        self.title = title
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.background = background
+        self.items = {} # Drawn objects by item id, in drawing (z) order
+        self.autoflush = False # There's nothing to update on screen
+        self.trans = None
+        self.closed = False
+        self._canvasItems = {} # _Items by id, in drawing (z) order
+        self._nextId = 1
+        self._frame = None # The last picture made, until something changes
+        self.frameDirectory = None
+        self.frameFormat = "png"
+        self.frames = 0 # Frames saved since recordFrames
+
+    # GraphWin methods the game uses
+
+    def getWidth(self):
+        return self.width
+
+    def getHeight(self):
+        return self.height
+
+    def toScreen(self, x, y):
+        return x, y
+
+    def toWorld(self, x, y):
+        return x, y
+
+    def setBackground(self, colour):
+        self.background = colour
+        self._changed()
+
+    def close(self):
+        self.closed = True
+
+    def isClosed(self):
+        return self.closed
+
+    def isOpen(self):
+        return not self.closed
+
+    def update(self):
+        pass
+
+    # Saves a frame if frames are being recorded (see recordFrames)
+    def flush(self):
+        if self.frameDirectory is not None:
+            self.frames = self.frames + 1
+            self.save(os.path.join(self.frameDirectory,
+                                   FRAME_NAME % self.frames + "." + self.frameFormat))
+
+    @contextmanager
+    def batch(self):
+        yield
+
+    def addItem(self, item):
+        self.items[item.id] = item
+
+    def delItem(self, item):
+        del self.items[item.id]
+
+    # Canvas methods used by GraphicsObjects
+
+    def create_rectangle(self, *args, **kw):
+        return self._create("rectangle", args, kw)
+
+    def create_oval(self, *args, **kw):
+        return self._create("oval", args, kw)
+
+    def create_line(self, *args, **kw):
+        return self._create("line", args, kw)
+
+    def create_polygon(self, *args, **kw):
+        return self._create("polygon", args, kw)
+
+    def create_text(self, *args, **kw):
+        return self._create("text", args, kw)
+
+    # An Entry box's placeholder: a box width characters wide centred on
+    # x,y showing text
+    def create_entry(self, x, y, width, text, fill, textColour, font):
+        return self._create("entry", (x, y), {"width": width, "text": text,
+                                              "fill": fill, "textColour": textColour,
+                                              "font": font})
+
+    def _create(self, kind, args, kw):
+        args = list(args)
+        options = {}
+        if args and isinstance(args[-1], dict):
+            options.update(args.pop())
+        options.update(kw)
+        if len(args) == 1: # Coordinates given as a list
+            args = list(args[0])
+        itemId = self._nextId
+        self._nextId = itemId + 1
+        self._canvasItems[itemId] = _Item(kind, [float(a) for a in args], options)
+        self._changed()
+        return itemId
+
+    def delete(self, *itemIds):
+        for itemId in itemIds:
+            if itemId == "all":
+                self._canvasItems.clear()
+            else:
+                self._canvasItems.pop(itemId, None)
+        self._changed()
+
+    def move(self, itemId, dx, dy):
+        item = self._canvasItems[itemId]
+        item.coords = [c + (dy if i % 2 else dx) for i, c in enumerate(item.coords)]
+        self._changed()
+
+    def coords(self, itemId, *coords):
+        item = self._canvasItems[itemId]
+        if not coords:
+            return list(item.coords)
+        if len(coords) == 1:
+            coords = coords[0]
+        item.coords = [float(c) for c in coords]
+        self._changed()
+
+    def itemconfigure(self, itemId, cnf=None, **kw):
+        options = self._canvasItems[itemId].options
+        if cnf is None and not kw:
+            return dict(options)
+        options.update(cnf or {}, **kw)
+        self._changed()
+
+    itemconfig = itemconfigure
+
+    def _changed(self):
+        self._frame = None
+
+    # Pictures
+
+    # The window as it is now, as a Frame
+    # Don't change the Frame, the same one is returned until the window does
+    def render(self):
+        if self._frame is not None:
+            return self._frame
+        scale = self.scale
+        frame = Frame(max(round(self.width * scale), 1),
+                      max(round(self.height * scale), 1),
+                      colourRGB(self.background) or b"\xff\xff\xff")
+        for item in self._canvasItems.values():
+            options = item.options
+            if options.get("state") == "hidden":
+                continue
+            coords = [c * scale for c in item.coords]
+            width = float(options.get("width", 1)) * scale
+            kind = item.kind
+            if kind == "rectangle" or kind == "oval":
+                fill = colourRGB(options.get("fill", ""))
+                outline = colourRGB(options.get("outline", "black"))
+                if kind == "oval":
+                    frame.paintOval(*coords[:4], fill, outline, width)
+                else:
+                    if fill:
+                        frame.fillRectangle(*coords[:4], fill)
+                    if outline and width > 0:
+                        frame.outlineRectangle(*coords[:4], width, outline)
+            elif kind == "line":
+                colour = colourRGB(options.get("fill", "black"))
+                if colour:
+                    frame.drawLine(list(zip(coords[::2], coords[1::2])), width,
+                                   colour, options.get("arrow", "none"),
+                                   [d * scale for d in ARROW_SHAPE])
+            elif kind == "polygon":
+                points = list(zip(coords[::2], coords[1::2]))
+                fill = colourRGB(options.get("fill", "black"))
+                outline = colourRGB(options.get("outline", ""))
+                if fill:
+                    frame.fillPolygon(points, fill)
+                if outline and width > 0:
+                    frame.drawLine(points + points[:1], width, outline)
+            elif kind == "text":
+                colour = colourRGB(options.get("fill", "black"))
+                size, style = fontSize(options.get("font"))
+                if colour:
+                    frame.drawText(coords[0], coords[1], options.get("text", ""),
+                                   max(round(fontScale(size) * scale), 1), colour,
+                                   options.get("justify", "center"), "bold" in style)
+            elif kind == "entry":
+                size, style = fontSize(options["font"])
+                characters = fontScale(size) * scale
+                halfWidth = (options["width"] * GLYPH_ADVANCE * characters + 4 * scale) / 2
+                halfHeight = (LINE_ADVANCE * characters + 4 * scale) / 2
+                x, y = coords[:2]
+                fill = colourRGB(options["fill"])
+                if fill:
+                    frame.fillRectangle(x - halfWidth, y - halfHeight,
+                                        x + halfWidth, y + halfHeight, fill)
+                frame.outlineRectangle(x - halfWidth, y - halfHeight, x + halfWidth,
+                                       y + halfHeight, max(scale, 1), b"\0\0\0")
+                # Entry text starts at the left of the box
+                pixel = max(round(characters), 1)
+                text = str(options["text"])
+                textWidth = (len(text) * GLYPH_ADVANCE - 1) * pixel
+                frame.drawText(x - halfWidth + 2 * scale + textWidth / 2, y, text,
+                               pixel, colourRGB(options["textColour"]) or b"\0\0\0",
+                               "left", "bold" in style)
+        self._frame = frame
+        return frame
+
+    # Saves the window as it is now to path, as PNG or PPM going by its
+    # extension
+    def save(self, path):
+        self.render().save(path)
+
+    # Saves a frame to directory each time the window is flushed, named
+    # frame-000001.png and so on (format is "png" or "ppm")
+    def recordFrames(self, directory, format="png"):
+        os.makedirs(directory, exist_ok=True)
+        self.frameDirectory = directory
+        self.frameFormat = format
+        self.frames = 0
+
+    def stopRecordingFrames(self):
+        self.frameDirectory = None
+
+
+
+################################################################################
+# Thumbnails and replay frames
+################################################################################
+
+# Saves a picture of a level (a levels.Level) to path, at scale times its
+# size
+def levelThumbnail(level, path, scale=0.25):
+    import shapeGen
+    win = RasterWin("Level", level.width, level.height, scale=scale,
+                    background="lightblue")
+    shapeGen.drawLevel(win, level)
+    win.save(path)
+
+
+# Replays a recording (see replay.loadRecording), saving every frame drawn
+# to directory as pictures scale times the window size
+# Shots are played on a physics.SteadyClock, so drawing doesn't hold up the
+# game's frame timing and every shot gets the same frames however slow
+# drawing is, as fast as they can be drawn.
+# Returns the number of frames saved and the replay's Mismatches
+def replayFrames(recording, directory, scale=1, format="png"):
+    import physics
+    level = recording.level
+    win = RasterWin("PyBirds replay", level.width, level.height, scale=scale,
+                    background="lightblue")
+    win.recordFrames(directory, format)
+    mismatches = replay.replayRendered(recording, win, clock=physics.SteadyClock())
+    return win.frames, mismatches
+
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Draw level thumbnails and "
+                                     "replay frames without a display")
+    parser.add_argument("output", help="directory to save pictures to")
+    parser.add_argument("--levels", nargs="+", default=[], metavar="PACK",
+                        help="level packs to draw a thumbnail of every level of")
+    parser.add_argument("--replays", nargs="+", default=[], metavar="RECORDING",
+                        help="recordings to save the frames of, each to a "
+                             "directory of its own")
+    parser.add_argument("--scale", type=float,
+                        help="picture size relative to the window (default "
+                             "0.25 for thumbnails, 1 for frames)")
+    parser.add_argument("--format", choices=("png", "ppm"), default="png")
+    options = parser.parse_args(arguments)
+
+    os.makedirs(options.output, exist_ok=True)
+    started = time.perf_counter()
+    pictures = 0
+    for path in options.levels:
+        name = os.path.splitext(os.path.basename(path))[0]
+        with levels.LevelPack(path) as pack:
+            for number, level in enumerate(pack):
+                levelThumbnail(level, os.path.join(options.output, "%s-%d.%s"
+                                                   % (name, number, options.format)),
+                               options.scale or 0.25)
+                pictures = pictures + 1
+    failed = 0
+    for path in options.replays:
+        name = os.path.splitext(os.path.basename(path))[0]
+        frames, mismatches = replayFrames(replay.loadRecording(path),
+                                          os.path.join(options.output, name),
+                                          options.scale or 1, options.format)
+        pictures = pictures + frames
+        if mismatches:
+            failed = failed + 1
+            print("%s: %d mismatches" % (path, len(mismatches)))
+
+    seconds = time.perf_counter() - started
+    print("%d pictures in %.2fs (%.0f/s)" % (pictures, seconds,
+                                             pictures / seconds if seconds else 0))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import engine
+import levels
+
+# Shot replays
+#
+# A recording is everything needed to play a game again: the level, the
+# physics constants, the top of the catapult, and each click with what the
+# shot did. It is a file of JSON lines, one written as each shot ends, so a
+# game that crashes part way through still leaves every shot taken so far:
+#
+#   {"event": "game", "version": 2, "time": ..., "level": {...},
+#    "physicsConstants": [...], "start": [x, y], "projectiles": n}
+#   {"event": "shot", "time": ..., "click": [x, y], "results": [{...}, ...]}
+#
+# The level is levels.Level.toDict, including its seed when it has one.
+# projectiles is the number fired by each click (see engine.burstClicks). A
+# shot's time is the seconds since the game started that the player clicked.
+# It has a result for each projectile (see resultRecord), listing the
+# targets hit and obstacles damaged by their index in the level (one entry
+# per grade broken), along with the ticks, bounces, whether it left the play
+# area and where it ended up. Version 1 recordings, from before bursts, had
+# one projectile and a single "result".
+#
+# A recording is played back by firing each recorded click at the recorded
+# level again, either headless as fast as possible (replayHeadless) or drawn
+# in a window at the pace it was played (replayRendered), and checking every
+# shot still does exactly what it did. Running this file checks a corpus of
+# recordings in parallel, e.g.
+#   python replay.py recordings/*.jsonl
+#
+# The game records itself when ANGRYPYTHONS_RECORDINGS is set to a directory
+# (see enableFromEnvironment), one file per game.
+
+FORMAT_VERSION = 2
+
+directory = None # Where games are recorded to, or None when not recording
+
+
+
+# A recorded game, as loaded by loadRecording
+# shots are dicts with the time, click (x, y) and results of each shot
+class Recording:
+
+    def __init__(self, level, physicsConstants, start, shots=None, projectiles=1):
+        self.level = level
+        self.physicsConstants = tuple(physicsConstants)
+        self.start = tuple(start)
+        self.shots = shots if shots is not None else []
+        self.projectiles = projectiles
+
+    # Where each projectile fired by a click is launched towards
+    def launches(self, shot):
+        startX, startY = self.start
+        clickX, clickY = shot["click"]
+        return engine.burstClicks(startX, startY, clickX, clickY, self.projectiles)
+
+
+# A shot whose replay didn't do what was recorded
+class Mismatch:
+
+    def __init__(self, shot, field, recorded, replayed):
+        self.shot = shot # Number of the shot in the recording, from 0
+        self.field = field
+        self.recorded = recorded
+        self.replayed = replayed
+
+    def __str__(self):
+        return "shot %d %s: recorded %r, replayed %r" \
+               % (self.shot, self.field, self.recorded, self.replayed)
+
+
+# Records a game as it is played, to the file at path
+# level is the level as it was when the game started (see
+# levels.levelFromWorld), start is the top of the catapult as (x, y) and
+# projectiles the number fired by each click
+class GameRecorder:
+
+    def __init__(self, path, level, physicsConstants, start, projectiles=1):
+        self.path = path
+        self.started = time.monotonic()
+        self.write({"event": "game", "version": FORMAT_VERSION,
+                    "time": time.time(), "level": level.toDict(),
+                    "physicsConstants": list(physicsConstants),
+                    "start": list(start), "projectiles": projectiles}, "w")
+
+    # Called after each shot with where the player clicked and the
+    # engine.ShotResult of each projectile. clickTime is the
+    # time.monotonic() of the click.
+    def addShot(self, clickX, clickY, results, clickTime=None):
+        if clickTime is None:
+            clickTime = time.monotonic()
+        self.write({"event": "shot", "time": clickTime - self.started,
+                    "click": [clickX, clickY],
+                    "results": [resultRecord(result) for result in results]})
+
+    def write(self, record, mode="a"):
+        with open(self.path, mode) as file:
+            file.write(json.dumps(record) + "\n")
+
+
+# Plain data version of an engine.ShotResult, for comparing shots
+def resultRecord(result):
+    return {"targets": [target.index for target in result.hitTargets],
+            "obstacles": [obstacle.index for obstacle in result.destroyedObstacles],
+            "ticks": result.ticks,
+            "bounces": result.bounces,
+            "outOfBounds": result.outOfBounds,
+            "final": [result.finalX, result.finalY]}
+
+
+# The fields of a shot's recorded and replayed results that differ, as
+# Mismatches. Both are lists of result records, one per projectile.
+def compareResults(shot, recorded, replayed):
+    if len(recorded) != len(replayed):
+        return [Mismatch(shot, "projectiles", len(recorded), len(replayed))]
+    mismatches = []
+    for number, (before, after) in enumerate(zip(recorded, replayed)):
+        prefix = "projectile %d " % number if len(recorded) > 1 else ""
+        mismatches.extend(Mismatch(shot, prefix + field, before[field], after.get(field))
+                          for field in before if before[field] != after.get(field))
+    return mismatches
+
+
+# Reads a recording file
+# A game cut short (e.g. by a crash) loads with the shots it finished
+def loadRecording(path):
+    with open(path) as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    if not records or records[0].get("event") != "game":
+        raise ValueError("%s is not a recording" % path)
+    game = records[0]
+    if game["version"] not in (1, FORMAT_VERSION):
+        raise ValueError("Unsupported recording version %d" % game["version"])
+    shots = [record for record in records[1:] if record.get("event") == "shot"]
+    for shot in shots:
+        if "result" in shot: # Version 1
+            shot["results"] = [shot.pop("result")]
+    return Recording(levels.levelFromDict(game["level"]),
+                     game["physicsConstants"], game["start"], shots,
+                     game.get("projectiles", 1))
+
+
+
+################################################################################
+# Playback
+################################################################################
+
+# Replays a recording without drawing anything, as fast as possible
+# Returns a list of Mismatches, empty if every shot did what it did before
+def replayHeadless(recording):
+    world = recording.level.toWorld()
+    startX, startY = recording.start
+    mismatches = []
+    for number, shot in enumerate(recording.shots):
+        results = engine.runShots(world, startX, startY, recording.launches(shot),
+                                  recording.physicsConstants)
+        mismatches.extend(compareResults(number, shot["results"],
+                                         [resultRecord(r) for r in results]))
+    return mismatches
+
+
+# Replays a recording in a window, with each click made as long after the
+# start as it was in the game (speed > 1 plays the gaps between shots
+# faster). Shots themselves are drawn in real time, as in the game, or by
+# clock if given (see physics.simulateProjectiles).
+# Returns a list of Mismatches, like replayHeadless
+def replayRendered(recording, win=None, speed=1, clock=None):
+    # Only needed when drawing
+    from graphics import GraphWin, Point, Text
+    import physics
+    import shapeGen
+
+    level = recording.level
+    ownWindow = win is None
+    if ownWindow:
+        win = GraphWin("PyBirds replay", level.width, level.height,
+                       autoflush=False)
+    obstacles, targets = shapeGen.drawLevel(win, level)
+    world = physics.worldFromShapes(win, obstacles, targets)
+    start = Point(*recording.start)
+    win.flush()
+
+    clock = clock or physics.REAL_CLOCK
+    started = clock.now()
+    mismatches = []
+    for number, shot in enumerate(recording.shots):
+        wait = started + shot["time"] / speed - clock.now()
+        if wait > 0:
+            clock.sleep(wait)
+
+        crosshair = Text(Point(*shot["click"]), "X")
+        crosshair.setSize(10)
+        crosshair.setTextColor("blue")
+        crosshair.draw(win)
+        clicks = [Point(x, y) for x, y in recording.launches(shot)]
+        results = physics.simulateProjectiles(win, start, clicks, world,
+                                              recording.physicsConstants,
+                                              clock=clock)
+        mismatches.extend(compareResults(number, shot["results"],
+                                         [resultRecord(r) for r in results]))
+    if ownWindow:
+        win.close()
+    return mismatches
+
+
+# Worker process task: replays one recording file headless
+# Returns the path, number of shots and the mismatches (as strings)
+def replayFile(path):
+    recording = loadRecording(path)
+    return path, len(recording.shots), [str(m) for m in replayHeadless(recording)]
+
+
+# Replays recording files headless across worker processes
+# Yields (path, shots, mismatches) for each file as it finishes
+def replayFiles(paths, processes=None):
+    if processes == 1:
+        for path in paths:
+            yield replayFile(path)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        for outcome in pool.imap_unordered(replayFile, paths, chunksize=16):
+            yield outcome
+
+
+
+################################################################################
+# Recording games
+################################################################################
+
+# Turns recording on, games are saved to files in directory
+def enable(path):
+    global directory
+    os.makedirs(path, exist_ok=True)
+    directory = path
+
+
+def disable():
+    global directory
+    directory = None
+
+
+# Turns recording on if ANGRYPYTHONS_RECORDINGS is set to a directory
+def enableFromEnvironment():
+    path = os.environ.get("ANGRYPYTHONS_RECORDINGS")
+    if path:
+        enable(path)
+    return directory
+
+
+# Starts recording a game, if recording is on (otherwise returns None)
+# Each game gets its own file, named after when it started
+def startRecording(level, physicsConstants, start, projectiles=1):
+    if directory is None:
+        return None
+    name = "%s-%d.jsonl" % (time.strftime("%Y%m%d-%H%M%S"), os.getpid())
+    path = os.path.join(directory, name)
+    number = 1
+    while os.path.exists(path):
+        number = number + 1
+        path = os.path.join(directory, name.replace(".jsonl", "-%d.jsonl" % number))
+    return GameRecorder(path, level, physicsConstants, start, projectiles)
+
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Replay recorded games and "
+                                     "check every shot does what it did before")
+    parser.add_argument("recordings", nargs="+", help="recording files")
+    parser.add_argument("--render", action="store_true",
+                        help="draw each game at the pace it was played")
+    parser.add_argument("--speed", type=float, default=1,
+                        help="with --render, how much faster than recorded "
+                             "to make the clicks")
+    parser.add_argument("--jobs", type=int,
+                        help="worker processes (default one per CPU)")
+    options = parser.parse_args(arguments)
+
+    started = time.perf_counter()
+    games = shots = failed = 0
+    if options.render:
+        outcomes = ((path, len(recording.shots),
+                     [str(m) for m in replayRendered(recording, speed=options.speed)])
+                    for path, recording in ((path, loadRecording(path))
+                                            for path in options.recordings))
+    else:
+        outcomes = replayFiles(options.recordings, options.jobs)
+    for path, shotNumber, mismatches in outcomes:
+        games = games + 1
+        shots = shots + shotNumber
+        if mismatches:
+            failed = failed + 1
+            print("%s: %d mismatches" % (path, len(mismatches)))
+            for mismatch in mismatches:
+                print("    " + mismatch)
+
+    seconds = time.perf_counter() - started
+    print("%d games, %d shots replayed in %.2fs (%.0f shots/s), %d failed"
+          % (games, shots, seconds, shots / seconds if seconds else 0, failed))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
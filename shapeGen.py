@@ -1,5 +1,6 @@
 from graphics import *
 import physics
+import placement
 import random
 
 
@@ -48,6 +49,18 @@ def addGradedWall(win, obstacles, obstacleDimensions, grade):
     return obstacles
 
 
+# Draws a saved or generated level (see levels.Level)
+# Returns the drawn obstacles and targets
+def drawLevel(win, level):
+    obstacles = []
+    targets = []
+    with win.batch():
+        for top, bottom, left, right, grade in level.obstacles:
+            obstacles = addGradedWall(win, obstacles, [top, bottom, left, right], grade)
+        for x, y, size in level.targets:
+            targets = addTarget(win, targets, x, y, size)
+    return obstacles, targets
+
 
 
 ################################################################################
@@ -55,68 +68,35 @@ def addGradedWall(win, obstacles, obstacleDimensions, grade):
 ################################################################################
 
 # Procedurally generates a list of non-overlapping targets
-def genRandomTargets(win, targetNumber, obstacles):
+# Raises placement.PlacementError if there isn't room for them all
+# Pass a seeded random.Random as rng to generate the same targets every time
+def genRandomTargets(win, targetNumber, obstacles, rng=random):
+    # Mark where the obstacles are
+    space = placement.Occupancy(win.getWidth(), win.getHeight())
+    for obstacle in obstacles:
+        space.fill(*physics.determineRectangleBounds(obstacle))
+
     targets = []
-    startTime = time.clock() # For timeout
-    for i in range(targetNumber):
-        # Prevent overlap
-        collided = True # Ensure run once
-        while collided == True:
-            # Generate random size and position
-            size = random.randint(20, 40)
-            x = random.randint(win.getWidth() // 5 + size, win.getWidth() - size)
-            y = random.randint(size, win.getHeight()-size)
-
-            # Calculate bounding box
-            top = y - size
-            bottom = y + size
-            left = x - size
-            right = x + size
-            obstacleDimensions = top, bottom, left, right
-
-            #  Test for overlap
-            if circleOverlapsObstacle(Point(x, y), size, obstacles) \
-            or circleOverlapsTarget(Point(x, y), size, targets) \
-            or checkForObstacleOverlap(obstacleDimensions, obstacles):
-                collided = True
-                if time.clock() - startTime >= 30: #timeout
-                    return []
-            else:
-                collided = False
-
-        # => Successfully generated valid target parameters
-        targets = addTarget(win, targets, x, y, size)
+    circles = placement.placeTargets(space, targetNumber, win.getWidth() // 5, rng)
+    with win.batch():
+        for x, y, size in circles:
+            targets = addTarget(win, targets, x, y, size)
 
     # => Generated desired number of targets successfully
     return targets
 
 
 # Procedurally generates a list of non-overlapping obstacles
-def genRandomObstacles(win, obstacleNumber, obstacleDimensionRanges):
+# Raises placement.PlacementError if there isn't room for them all
+# Pass a seeded random.Random as rng to generate the same obstacles every time
+def genRandomObstacles(win, obstacleNumber, obstacleDimensionRanges, rng=random):
+    space = placement.Occupancy(win.getWidth(), win.getHeight())
     obstacles = []
-    startTime = time.clock() # For timeout
-    for i in range(obstacleNumber):
-        collided = True # Ensure run once
-        while collided == True:
-            # Randomly pick rotation
-            longSide = random.randint(0, 1)
-
-            # Generate random dimensions
-            obstacleDimensions = \
-            genTallOrWideRectangle(win, obstacleDimensionRanges, longSide)
-
-            # Test for overlap
-            if rectanglePointsInsideObstacle(obstacleDimensions, obstacles) \
-            or checkForObstacleOverlap(obstacleDimensions, obstacles):
-                collided = True
-                if time.clock() - startTime >= 30: #timeout
-                    return []
-            else:
-                collided = False
-
-        # => Successfully generated valid obstacle position & dimensions
-        grade = random.randint(1, 3) # Randomly pick obstacle strength
-        obstacles = addGradedWall(win, obstacles, obstacleDimensions, grade)
+    walls = placement.placeObstacles(space, obstacleNumber, obstacleDimensionRanges,
+                                     win.getWidth() // 5, rng)
+    with win.batch():
+        for top, bottom, left, right, grade in walls:
+            obstacles = addGradedWall(win, obstacles, [top, bottom, left, right], grade)
 
     # => Generated desired number of obstacles successfully
     return obstacles
@@ -149,11 +129,11 @@ def genTallOrWideRectangle(win, obstacleDimensionRanges, longSide):
 # of other rectangles
 def rectanglePointsInsideObstacle(obstacleDimensions, obstacles):
     top, bottom, left, right = obstacleDimensions
-    if physics.checkForCollisions(left, top, obstacles, []) != None \
-    or physics.checkForCollisions(left, bottom, obstacles, []) != None \
-    or physics.checkForCollisions(right, top, obstacles, []) != None \
-    or physics.checkForCollisions(right, bottom, obstacles, []):
-        return True
+    for obstacle in obstacles:
+        obTop, obBottom, obLeft, obRight = physics.determineRectangleBounds(obstacle)
+        for x, y in ((left, top), (left, bottom), (right, top), (right, bottom)):
+            if x >= obLeft and x <= obRight and y >= obTop and y <= obBottom:
+                return True
     return False
 
 
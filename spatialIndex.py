@@ -0,0 +1,99 @@
+# Uniform grid spatial index for collision queries
+#
+# Each shape is filed under every grid cell its bounding box touches, so a
+# point query only tests the few shapes in one cell instead of every shape in
+# the level. The shapes in a cell are kept sorted by priority, so the first
+# shape found containing the point is the same one a linear scan in priority
+# order would have found. Shapes can be added and removed one at a time
+# without rebuilding the grid.
+#
+# The grid only knows shapes' bounding boxes. It holds an int id for each
+# shape, lower ids having priority, and testing whether a point is really
+# inside a shape is left to the caller (see engine.World.collisionAt).
+
+import bisect
+
+
+
+class CollisionGrid:
+
+    def __init__(self, cellSize=64):
+        self.cellSize = cellSize
+        self.cells = {} # (column, row) -> [ids, lowest first]
+        self.count = 0
+
+    # The cells a box (top, bottom, left, right) touches
+    def cellsTouched(self, bounds):
+        top, bottom, left, right = bounds
+        cellSize = self.cellSize
+        for column in range(int(left // cellSize), int(right // cellSize) + 1):
+            for row in range(int(top // cellSize), int(bottom // cellSize) + 1):
+                yield column, row
+
+    # Files a shape's id under every cell its bounds touch
+    def add(self, shapeId, bounds):
+        for position in self.cellsTouched(bounds):
+            cell = self.cells.get(position)
+            if cell is None:
+                self.cells[position] = [shapeId]
+            else:
+                bisect.insort(cell, shapeId)
+        self.count = self.count + 1
+
+    # Removes a shape's id from every cell, bounds must be the same as when
+    # it was added
+    def remove(self, shapeId, bounds):
+        for position in self.cellsTouched(bounds):
+            cell = self.cells[position]
+            del cell[bisect.bisect_left(cell, shapeId)]
+        self.count = self.count - 1
+
+    # The ids filed in the cell containing the point x,y, in priority order
+    # These are the only shapes that can contain the point.
+    def candidates(self, x, y):
+        # Float cell coordinates hash the same as the ints used in add
+        return self.cells.get((x // self.cellSize, y // self.cellSize), ())
+
+    # Finds every id whose cells overlap a box, in priority order
+    def idsInBox(self, top, bottom, left, right):
+        found = set()
+        for position in self.cellsTouched((top, bottom, left, right)):
+            found.update(self.cells.get(position, ()))
+        return sorted(found)
+
+    # Number of shapes a query at x,y might have to test
+    def candidateCount(self, x, y):
+        return len(self.candidates(x, y))
+
+    def __len__(self):
+        return self.count
+
+
+# Finds the pairs of boxes (top, bottom, left, right) that overlap
+# Returns (i, j) pairs of indices into boxes, with i < j. The boxes are
+# filed in a grid of cellSize cells as they are looked at, so each is only
+# compared with those sharing a cell with it. Boxes can be put in groups
+# (groups[i] being box i's group) to leave out pairs in the same group,
+# which are then not compared at all.
+def overlappingPairs(boxes, cellSize, groups=None):
+    cells = {} # (column, row) -> {group: [box indices]}
+    pairs = []
+    for j, (top, bottom, left, right) in enumerate(boxes):
+        group = j if groups is None else groups[j]
+        compared = set()
+        for column in range(int(left // cellSize), int(right // cellSize) + 1):
+            for row in range(int(top // cellSize), int(bottom // cellSize) + 1):
+                cell = cells.setdefault((column, row), {})
+                for otherGroup, members in cell.items():
+                    if otherGroup == group:
+                        continue
+                    for i in members:
+                        if i in compared:
+                            continue
+                        compared.add(i)
+                        otherTop, otherBottom, otherLeft, otherRight = boxes[i]
+                        if left <= otherRight and otherLeft <= right \
+                        and top <= otherBottom and otherTop <= bottom:
+                            pairs.append((i, j))
+                cell.setdefault(group, []).append(j)
+    return pairs
@@ -0,0 +1,345 @@
+import math
+import engine
+
+# Continuous (swept) collision detection
+#
+# Between collisions the projectile follows an exact parabola, so instead of
+# sampling its position once per tick we can solve for the time it first
+# touches each shape. runShotSwept jumps straight from one collision to the
+# next, so nothing can be tunnelled through however fast the projectile is
+# going, and a shot costs one step per bounce rather than one per tick.
+#
+# Units match engine: positions are in pixels, time is in ticks and y
+# increases down the screen. Velocities here are in pixels per tick.
+
+SKIN = 1e-6 # Distance a bounced projectile is pushed away from the surface
+MAX_TIME = 1e6 # Ticks before giving up on a projectile that never lands
+
+
+
+################################################################################
+# Polynomial roots
+################################################################################
+
+# Evaluates a polynomial (coefficients from the highest power down)
+def evaluate(coefficients, x):
+    total = 0.0
+    for c in coefficients:
+        total = total * x + c
+    return total
+
+
+# Coefficients of the derivative of a polynomial
+def derivative(coefficients):
+    degree = len(coefficients) - 1
+    return [c * (degree - i) for i, c in enumerate(coefficients[:-1])]
+
+
+# Finds the real roots of a polynomial between lo and hi, in ascending order
+# Each root is isolated between the turning points of the polynomial (the
+# roots of its derivative) and then found by bisection
+def polynomialRoots(coefficients, lo, hi):
+    # Drop leading zero coefficients
+    i = 0
+    while i < len(coefficients) - 1 and coefficients[i] == 0:
+        i = i + 1
+    coefficients = coefficients[i:]
+    degree = len(coefficients) - 1
+
+    if degree < 1:
+        return []
+    if degree == 1:
+        root = -coefficients[1] / coefficients[0]
+        return [root] if lo <= root <= hi else []
+    if degree == 2:
+        return [root for root in quadraticRoots(*coefficients) if lo <= root <= hi]
+
+    # Split the range at each turning point, the polynomial is monotonic
+    # in each piece so has at most one root there
+    edges = [lo] + polynomialRoots(derivative(coefficients), lo, hi) + [hi]
+    roots = []
+    for a, b in zip(edges, edges[1:]):
+        fa = evaluate(coefficients, a)
+        fb = evaluate(coefficients, b)
+        if fa == 0:
+            if not roots or roots[-1] != a:
+                roots.append(a)
+        elif fa * fb < 0:
+            roots.append(bisect(coefficients, a, b, fa))
+    if evaluate(coefficients, hi) == 0 and (not roots or roots[-1] != hi):
+        roots.append(hi)
+    return roots
+
+
+# Solves a x^2 + b x + c = 0, returning the real roots in ascending order
+# Uses the form of the quadratic formula that avoids cancellation errors
+def quadraticRoots(a, b, c):
+    discriminant = b * b - 4 * a * c
+    if discriminant < 0:
+        return []
+    q = -0.5 * (b + math.copysign(math.sqrt(discriminant), b))
+    if q == 0:
+        return [0.0]
+    return sorted((q / a, c / q))
+
+
+# Finds the root of a polynomial between a and b, where it changes sign
+def bisect(coefficients, a, b, fa):
+    for i in range(100):
+        middle = (a + b) / 2
+        if middle == a or middle == b:
+            break
+        fm = evaluate(coefficients, middle)
+        if fm == 0:
+            return middle
+        if (fm < 0) == (fa < 0):
+            a, fa = middle, fm
+        else:
+            b = middle
+    return (a + b) / 2
+
+
+
+################################################################################
+# Time of impact
+################################################################################
+
+# A single parabolic arc: x = x0 + vx t, y = y0 + vy t + 0.5 a t^2
+class Arc:
+    __slots__ = ("x0", "y0", "vx", "vy", "a", "startTime", "endTime")
+
+    def __init__(self, x0, y0, vx, vy, a, startTime=0.0):
+        self.x0 = x0
+        self.y0 = y0
+        self.vx = vx
+        self.vy = vy
+        self.a = a
+        self.startTime = startTime
+        self.endTime = startTime
+
+    # Position t ticks after the arc started
+    def position(self, t):
+        return self.x0 + self.vx * t, self.y0 + self.vy * t + 0.5 * self.a * t * t
+
+    # Velocity t ticks after the arc started
+    def velocity(self, t):
+        return self.vx, self.vy + self.a * t
+
+    # Bounds (top, bottom, left, right) of the arc between times t1 and t2
+    def getBounds(self, t1, t2):
+        x1, y1 = self.position(t1)
+        x2, y2 = self.position(t2)
+        ys = [y1, y2]
+        if self.a != 0:
+            vertex = -self.vy / self.a
+            if t1 < vertex < t2:
+                ys.append(self.position(vertex)[1])
+        return min(ys), max(ys), min(x1, x2), max(x1, x2)
+
+
+# First time in (0, limit) that the arc crosses y = level while moving in
+# the given direction (1 for down, -1 for up), or None
+def crossHorizontal(arc, level, direction, limit):
+    roots = polynomialRoots([0.5 * arc.a, arc.vy, arc.y0 - level], 0, limit)
+    for t in roots:
+        if t > 0 and (arc.vy + arc.a * t) * direction > 0:
+            return t
+    return None
+
+
+# First time in (0, limit) that the arc crosses x = level while moving in
+# the given direction (1 for right, -1 for left), or None
+def crossVertical(arc, level, direction, limit):
+    if arc.vx * direction <= 0:
+        return None
+    t = (level - arc.x0) / arc.vx
+    if 0 < t < limit:
+        return t
+    return None
+
+
+# Time the projectile first enters a rectangle and the surface normal there
+# Returns None if it does not enter before limit
+def rectangleImpact(arc, obstacle, limit):
+    top, bottom, left, right = obstacle.getBounds()
+    best = None
+    normalX = normalY = 0
+
+    # Left and right faces
+    for level, direction, normal in ((left, 1, -1), (right, -1, 1)):
+        t = crossVertical(arc, level, direction, limit)
+        if t is not None:
+            y = arc.position(t)[1]
+            if top <= y <= bottom:
+                if best is None or t < best:
+                    best, normalX, normalY = t, normal, 0
+
+    # Top and bottom faces, a tie with a side face means a corner hit
+    for level, direction, normal in ((top, 1, -1), (bottom, -1, 1)):
+        t = crossHorizontal(arc, level, direction, limit)
+        if t is not None:
+            x = arc.position(t)[0]
+            if left <= x <= right:
+                if best is None or t < best:
+                    best, normalX, normalY = t, 0, normal
+                elif t == best:
+                    normalY = normal
+
+    if best is None:
+        return None
+    length = math.sqrt(normalX ** 2 + normalY ** 2)
+    return best, normalX / length, normalY / length
+
+
+# Time the projectile first enters a circle and the surface normal there
+# Returns None if it does not enter before limit
+def circleImpact(arc, target, limit):
+    dx = arc.x0 - target.x
+    dy = arc.y0 - target.y
+    h = 0.5 * arc.a
+    # Squared distance from the centre minus radius squared, as a quartic in t
+    coefficients = [h * h,
+                    2 * h * arc.vy,
+                    arc.vx ** 2 + arc.vy ** 2 + 2 * h * dy,
+                    2 * (dx * arc.vx + dy * arc.vy),
+                    dx * dx + dy * dy - target.radius ** 2]
+    slope = derivative(coefficients)
+    for t in polynomialRoots(coefficients, 0, limit):
+        # Only count the projectile moving into the circle
+        if t > 0 and evaluate(slope, t) < 0:
+            x, y = arc.position(t)
+            normalX = x - target.x
+            normalY = y - target.y
+            length = math.sqrt(normalX ** 2 + normalY ** 2)
+            return t, normalX / length, normalY / length
+    return None
+
+
+# Time the projectile leaves the play area (right, left or bottom edge)
+def exitTime(world, arc):
+    times = [MAX_TIME]
+    for level, direction in ((world.width, 1), (0, -1)):
+        t = crossVertical(arc, level, direction, MAX_TIME)
+        if t is not None:
+            times.append(t)
+    t = crossHorizontal(arc, world.height, 1, MAX_TIME)
+    if t is not None:
+        times.append(t)
+    return min(times)
+
+
+# Finds the first shape the arc hits before limit
+# Returns (time, shape, normalX, normalY) or None
+# The arc is followed in short pieces and only the shapes near each piece
+# (found using the world's collision grid) are tested. Shapes are tested in
+# the grid's priority order so exact ties go the same way as
+# engine.World.collisionAt.
+def firstImpact(world, arc, limit):
+    grid = world.grid
+    start = 0.0
+    while start < limit:
+        # Pieces are roughly two grid cells long
+        vx, vy = arc.velocity(start)
+        speed = max(abs(vx), abs(vy), 1e-9)
+        end = min(start + max(2 * grid.cellSize / speed, 1.0), limit)
+
+        best = None
+        top, bottom, left, right = arc.getBounds(start, end)
+        for shape in world.shapesInBox(top, bottom, left, right):
+            if type(shape) == engine.Target:
+                impact = circleImpact(arc, shape, end)
+            else:
+                impact = rectangleImpact(arc, shape, end)
+            if impact is not None and (best is None or impact[0] < best[0]):
+                best = impact[0], shape, impact[1], impact[2]
+                end = impact[0]
+        if best is not None:
+            return best
+        start = end
+    return None
+
+
+
+################################################################################
+# Shot simulation
+################################################################################
+
+# Reflects a velocity off a surface, the part along the normal bounces with
+# elasticity and the part along the surface is slowed by friction
+def reflect(vx, vy, normalX, normalY, friction, elasticity):
+    into = vx * normalX + vy * normalY
+    alongX = vx - into * normalX
+    alongY = vy - into * normalY
+    vx = alongX * (1 - friction) - into * elasticity * normalX
+    vy = alongY * (1 - friction) - into * elasticity * normalY
+    return vx, vy
+
+
+# Simulates a whole shot by jumping from one collision to the next
+# Takes the same arguments as engine.runShot and returns an engine.ShotResult
+# whose ticks is the (fractional) flight time. The world is changed by the
+# shot, pass world.copy() to keep the original. The arcs flown are kept in
+# result.arcs so the flight can be drawn or sampled afterwards.
+def runShotSwept(world, startX, startY, clickX, clickY, physicsConstants,
+                 maxBounces=1000):
+    shot = engine.Shot(startX, startY, clickX, clickY, physicsConstants)
+    ppm = engine.PIXELS_PER_METER
+    minVelocity = math.sqrt(engine.MIN_VELOCITY) / ppm
+
+    # Convert to pixels per tick, with y increasing downwards
+    arc = Arc(startX, startY, shot.Ux / ppm, -shot.Uy / ppm, shot.g / ppm)
+    arcs = []
+    outOfBounds = False
+
+    while shot.bounces < maxBounces:
+        limit = exitTime(world, arc)
+        impact = firstImpact(world, arc, limit)
+        if impact is None:
+            # => flies out of the play area
+            arc.endTime = arc.startTime + limit
+            shot.x, shot.y = arc.position(limit)
+            outOfBounds = limit < MAX_TIME
+            arcs.append(arc)
+            break
+
+        t, shape, normalX, normalY = impact
+        arc.endTime = arc.startTime + t
+        arcs.append(arc)
+        x, y = arc.position(t)
+        vx, vy = arc.velocity(t)
+        vx, vy = reflect(vx, vy, normalX, normalY,
+                         shot.friction, shot.elasticity)
+        shot.bounces = shot.bounces + 1
+        shot.x, shot.y = x, y
+
+        # Interact with object hit
+        if type(shape) == engine.Target: # If target then destroy
+            world.damage(shape)
+            shot.hitTargets.append(shape)
+        elif shot.canBreak:              # Otherwise try to damage obstacle
+            world.damage(shape)
+            shot.destroyedObstacles.append(shape)
+        shot.canBreak = False # Can only break on first collision
+
+        # End simulation if no movement
+        if abs(vx) < minVelocity and abs(vy) < minVelocity:
+            shot.stopped = True
+            break
+
+        # Start a new arc just off the surface
+        arc = Arc(x + normalX * SKIN, y + normalY * SKIN, vx, vy, arc.a,
+                  arc.endTime)
+
+    shot.ticks = arcs[-1].endTime if arcs else 0
+    result = engine.ShotResult(shot, outOfBounds)
+    result.arcs = arcs
+    return result
+
+
+# Position of a swept shot at a time (in ticks) after launch
+def positionAt(arcs, time):
+    for arc in arcs:
+        if time <= arc.endTime:
+            return arc.position(max(time - arc.startTime, 0))
+    arc = arcs[-1]
+    return arc.position(arc.endTime - arc.startTime)
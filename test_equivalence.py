@@ -0,0 +1,180 @@
+import math
+import random
+import pytest
+import atlas
+import batch
+import engine
+import levels
+import replay
+import sweep
+
+# Checks that the different ways of simulating a shot agree
+#
+# Several modules simulate the same physics another way, and rely on
+# matching engine's per-tick SUVAT simulation:
+#   batch     many shots at once with arrays
+#   sweep     exact arcs instead of ticks
+#   atlas     outcomes precomputed over a grid of clicks
+#   replay    shots rerun from a recorded game
+#   engine    stepped integrators, with air or without
+# These rerun those comparisons on generated levels:
+#
+#   python -m pytest -q test_equivalence.py
+
+PHYSICS_CONSTANTS = (90, 10, 0.15, 0.5, 9.8) # The game's default options
+WIDTH = 1200 # Window size the game uses
+HEIGHT = 500
+START = (WIDTH / 10, HEIGHT * 4 / 5) # Top of the catapult
+SHOTS = 60 # Shots compared per level
+SEEDS = (1, 2, 3) # Levels compared
+DRAG = 0.002 # Air for the integrator checks
+WIND = (-200, 0)
+ERROR_BOUND = 1.0 # Pixels an integrator's path may stray from the exact one
+
+
+
+# A generated level with the game's default options
+def gameLevel(seed):
+    return levels.generateLevel(WIDTH, HEIGHT, 3, 10, (10, 30, 70, 300), seed)
+
+
+# Random clicks in the firing region
+def clicks(number, seed=0):
+    rng = random.Random(seed)
+    return [(rng.uniform(0, START[0]), rng.uniform(0, HEIGHT)) for i in range(number)]
+
+
+# batch.simulateShots gives every shot the same outcome as engine.runShot
+@pytest.mark.parametrize("seed", SEEDS)
+def testBatchMatchesEngine(seed):
+    level = gameLevel(seed)
+    world = level.toWorld()
+    shots = clicks(SHOTS, seed)
+    offsets = [(x - START[0], y - START[1]) for x, y in shots]
+    result = batch.simulateShots(world, START, offsets, PHYSICS_CONSTANTS, 5000)
+    for i, (x, y) in enumerate(shots):
+        shot = engine.runShot(world.copy(), START[0], START[1], x, y,
+                              PHYSICS_CONSTANTS, 5000)
+        assert result.ticks[i] == shot.ticks
+        assert result.bounces[i] == shot.bounces
+        assert sorted(result.hitTargets[i].nonzero()[0]) \
+               == sorted(target.index for target in shot.hitTargets)
+        assert sorted(result.destroyedObstacles[i].nonzero()[0]) \
+               == sorted(set(obstacle.index for obstacle in shot.destroyedObstacles))
+        assert result.finalX[i] == pytest.approx(shot.finalX)
+        assert result.finalY[i] == pytest.approx(shot.finalY)
+
+
+# sweep's exact arcs pass through the same points as engine's ticks up to
+# the first thing the shot hits (engine leaves a shot at the catapult for
+# its first tick, so tick k is k - 1 ticks into the arc)
+@pytest.mark.parametrize("seed", SEEDS)
+def testSweepMatchesStepping(seed):
+    world = gameLevel(seed).toWorld()
+    for x, y in clicks(SHOTS, seed):
+        path = engine.arcToImpact(world, START[0], START[1], x, y, PHYSICS_CONSTANTS, 5000)
+        swept = sweep.runShotSwept(world.copy(), START[0], START[1], x, y,
+                                   PHYSICS_CONSTANTS)
+        for tick in range(1, len(path) - 1):
+            if tick - 1 > swept.arcs[0].endTime:
+                break
+            pathX, pathY = path[tick]
+            sweptX, sweptY = sweep.positionAt(swept.arcs, tick - 1)
+            assert sweptX == pytest.approx(pathX, abs=1e-6)
+            assert sweptY == pytest.approx(pathY, abs=1e-6)
+
+
+# An atlas's lookups give what engine does when clicking at each grid point
+def testAtlasMatchesEngine(tmp_path):
+    level = gameLevel(SEEDS[0])
+    path = str(tmp_path / "level.atlas")
+    with atlas.generateAtlas(path, level, START, PHYSICS_CONSTANTS, 13, 21,
+                             processes=1) as shotAtlas:
+        assert shotAtlas.complete()
+        for row in range(shotAtlas.rows):
+            for column in range(shotAtlas.columns):
+                x, y = shotAtlas.clickPosition(row, column)
+                outcome = shotAtlas.lookup(x, y)
+                world = level.toWorld()
+                impact = engine.arcToImpact(world, START[0], START[1], x, y,
+                                            PHYSICS_CONSTANTS, 2000)[-1]
+                hit = world.collisionAt(*impact)
+                shot = engine.runShot(world, START[0], START[1], x, y,
+                                      PHYSICS_CONSTANTS, 2000)
+                if hit is None:
+                    assert outcome["hitKind"] == atlas.NOTHING
+                elif type(hit) == engine.Target:
+                    assert outcome["hitKind"] == atlas.TARGET
+                    assert outcome["hitIndex"] == hit.index
+                else:
+                    assert outcome["hitKind"] == atlas.OBSTACLE
+                    assert outcome["hitIndex"] == hit.index
+                assert outcome["targets"] == len(shot.hitTargets)
+                assert outcome["bounces"] == shot.bounces
+
+
+# A recorded game replays exactly, every time
+def testReplayIsDeterministic(tmp_path):
+    level = gameLevel(SEEDS[0])
+    path = str(tmp_path / "game.jsonl")
+    recorder = replay.GameRecorder(path, level, PHYSICS_CONSTANTS, START, 3)
+    world = level.toWorld()
+    for x, y in clicks(10):
+        launches = engine.burstClicks(START[0], START[1], x, y, 3)
+        recorder.addShot(x, y, engine.runShots(world, START[0], START[1], launches,
+                                               PHYSICS_CONSTANTS))
+    recording = replay.loadRecording(path)
+    assert replay.replayHeadless(recording) == []
+    assert replay.replayHeadless(recording) == []
+
+
+# A level taken from a game in progress can be packed and read back
+def testLevelFromWorldRoundTrips():
+    world = gameLevel(SEEDS[0]).toWorld()
+    engine.runShot(world, START[0], START[1], 20, 300, PHYSICS_CONSTANTS, 2000)
+    level = levels.levelFromWorld(world, 7)
+    assert levels.unpackLevel(levels.packLevel(level), 0) == level
+
+
+# The furthest any shot's path with integrator strays from the exact one,
+# flying through an empty level (SUVAT without air, Verlet with tiny
+# substeps with it)
+def integratorError(integrator, air):
+    world = engine.World(WIDTH, HEIGHT)
+    if air:
+        exact = engine.VelocityVerlet(DRAG, WIND, 0.01)
+        exact.maxSubsteps = 10000
+    else:
+        exact = engine.ANALYTIC
+    error = 0
+    for x, y in clicks(8):
+        path = engine.arcToImpact(world, START[0], START[1], x, y,
+                                  PHYSICS_CONSTANTS, 500, integrator)
+        exactPath = engine.arcToImpact(world, START[0], START[1], x, y,
+                                       PHYSICS_CONSTANTS, 500, exact)
+        assert len(path) > 1
+        for (pathX, pathY), (exactX, exactY) in zip(path, exactPath):
+            error = max(error, math.sqrt((pathX - exactX) ** 2 + (pathY - exactY) ** 2))
+    return error
+
+
+# Each integrator stays within ERROR_BOUND with the substeps it is meant to
+# be used with, and Verlet matches SUVAT when there is no air
+@pytest.mark.parametrize("name, air, maxStep", [
+    ("analytic", False, None),
+    ("verlet", False, None),
+    ("euler", False, 1),
+    ("verlet", True, None),
+    ("euler", True, 1)])
+def testIntegratorErrorBound(name, air, maxStep):
+    drag, wind = (DRAG, WIND) if air else (0, (0, 0))
+    error = integratorError(engine.makeIntegrator(name, drag, wind, maxStep), air)
+    assert error <= ERROR_BOUND
+    if name == "verlet" and not air:
+        assert error < 1e-6
+
+
+# The analytic integrator can't be given air
+def testAnalyticRejectsDrag():
+    with pytest.raises(ValueError):
+        engine.makeIntegrator("analytic", DRAG, WIND)